@@ -0,0 +1,203 @@
+"""
+ALMACÉN DE BACKUPS DEDUPLICADO
+==============================
+En lugar de guardar una copia completa de inventario.db por backup, cada copia
+se corta en bloques de tamaño fijo que se guardan comprimidos y nombrados por
+su SHA-256 en backups/bloques/. Un backup es solo un manifiesto JSON
+(backups/inventario_<tipo>_<fecha>.json) con la lista ordenada de bloques.
+
+Los bloques están alineados a las páginas de SQLite: una escritura cambia unas
+pocas páginas, así que entre dos backups casi todos los bloques se repiten y
+solo se guardan los nuevos. El espacio en disco crece con lo que cambió, no
+con el tamaño total de la base.
+
+Los bloques que ya no referencia ningún manifiesto se borran con
+`recolectar_basura()` (después de limpiar backups antiguos).
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+import catalogo_backups
+import respaldo
+from base_datos import DB_FILE
+
+# Configuración
+TAMANO_BLOQUE = 64 * 1024      # 16 páginas de 4 KB
+NIVEL_COMPRESION = 6
+GRACIA_GC = 3600               # No borrar bloques recién escritos (backup en curso)
+CARPETA_BLOQUES = "bloques"
+
+
+def _carpeta_bloques(backup_dir):
+    return Path(backup_dir) / CARPETA_BLOQUES
+
+
+def _ruta_bloque(backup_dir, digest):
+    return _carpeta_bloques(backup_dir) / digest[:2] / digest
+
+
+def es_manifiesto_almacen(path):
+    """True si el archivo es un backup del almacén (manifiesto con bloques)"""
+    path = Path(path)
+    if path.suffix != '.json' or path.with_suffix('.db').exists():
+        return False
+    manifiesto = leer(path)
+    return bool(manifiesto and 'bloques' in manifiesto)
+
+
+def leer(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Manifiesto inválido {Path(path).name}: {e}")
+        return None
+
+
+def _guardar_bloques(backup_dir, archivo):
+    """Corta el archivo en bloques y guarda los que aún no existen.
+
+    Los que ya existen se reutilizan y su fecha se renueva: quedan dentro de
+    la gracia de recolectar_basura hasta que el manifiesto los referencie.
+
+    Devuelve (lista de digests, bloques nuevos, bytes nuevos comprimidos).
+    """
+    digests = []
+    nuevos = 0
+    bytes_nuevos = 0
+    with open(archivo, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b''):
+            digest = hashlib.sha256(bloque).hexdigest()
+            digests.append(digest)
+            ruta = _ruta_bloque(backup_dir, digest)
+            try:
+                # Reutilizado: renovar la fecha para que recolectar_basura no lo borre
+                # (puede no tener manifiesto que lo use hasta que este se escriba)
+                os.utime(ruta)
+                continue
+            except FileNotFoundError:
+                pass
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            comprimido = zlib.compress(bloque, NIVEL_COMPRESION)
+            tmp = ruta.with_name(ruta.name + '.tmp')
+            with open(tmp, 'wb') as destino:
+                destino.write(comprimido)
+            tmp.replace(ruta)
+            nuevos += 1
+            bytes_nuevos += len(comprimido)
+    return digests, nuevos, bytes_nuevos
+
+
+def crear_backup(manifiesto_path, db_file=DB_FILE, tipo="manual"):
+    """Copia consistente de la base (respaldo.crear_backup) guardada como bloques.
+
+    Devuelve el manifiesto (dict) escrito en `manifiesto_path`.
+    """
+    manifiesto_path = Path(manifiesto_path)
+    backup_dir = manifiesto_path.parent
+    inicio = time.perf_counter()
+
+    # La copia temporal queda en el mismo disco que el almacén
+    with tempfile.TemporaryDirectory(dir=backup_dir) as tmp:
+        copia = Path(tmp) / "copia.db"
+        manifiesto = respaldo.crear_backup(copia, db_file=db_file, tipo=tipo)
+        digests, nuevos, bytes_nuevos = _guardar_bloques(backup_dir, copia)
+
+    manifiesto.update({
+        'archivo': manifiesto_path.name,
+        'tamano_bloque': TAMANO_BLOQUE,
+        'bloques': digests,
+        'bloques_nuevos': nuevos,
+        'bytes_nuevos': bytes_nuevos,
+        'segundos': round(time.perf_counter() - inicio, 3)
+    })
+    tmp_manifiesto = manifiesto_path.with_name(manifiesto_path.name + '.tmp')
+    with open(tmp_manifiesto, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False)
+    tmp_manifiesto.replace(manifiesto_path)
+    catalogo_backups.registrar(backup_dir, catalogo_backups.entrada_desde_manifiesto(manifiesto))
+    return manifiesto
+
+
+def reconstruir(manifiesto_path, destino):
+    """Arma el archivo .db de un backup a partir de sus bloques y valida el SHA-256"""
+    manifiesto_path = Path(manifiesto_path)
+    manifiesto = leer(manifiesto_path)
+    if not manifiesto or 'bloques' not in manifiesto:
+        raise ValueError(f"{manifiesto_path.name} no es un backup del almacén")
+
+    h = hashlib.sha256()
+    with open(destino, 'wb') as f:
+        for digest in manifiesto['bloques']:
+            ruta = _ruta_bloque(manifiesto_path.parent, digest)
+            if not ruta.exists():
+                raise FileNotFoundError(f"Falta el bloque {digest[:12]} del backup {manifiesto_path.name}")
+            with open(ruta, 'rb') as bloque_f:
+                bloque = zlib.decompress(bloque_f.read())
+            h.update(bloque)
+            f.write(bloque)
+
+    if h.hexdigest() != manifiesto['sha256']:
+        raise ValueError(f"El backup reconstruido no coincide con el checksum de {manifiesto_path.name}")
+    return manifiesto
+
+
+def eliminar(manifiesto_path):
+    """Borra el manifiesto (los bloques se liberan en la próxima recolección)"""
+    manifiesto_path = Path(manifiesto_path)
+    manifiesto_path.unlink(missing_ok=True)
+    catalogo_backups.quitar(manifiesto_path.parent, manifiesto_path.name)
+
+
+def recolectar_basura(backup_dir, gracia=GRACIA_GC):
+    """Borra los bloques que no referencia ningún manifiesto.
+
+    Devuelve (bloques borrados, bytes liberados).
+    """
+    backup_dir = Path(backup_dir)
+    carpeta = _carpeta_bloques(backup_dir)
+    if not carpeta.exists():
+        return 0, 0
+
+    referenciados = set()
+    for path in backup_dir.glob("*.json"):
+        manifiesto = leer(path)
+        if manifiesto:
+            referenciados.update(manifiesto.get('bloques', []))
+
+    limite = time.time() - gracia
+    borrados = 0
+    liberados = 0
+    for ruta in carpeta.glob("*/*"):
+        if ruta.name in referenciados:
+            continue
+        stat = ruta.stat()
+        if stat.st_mtime > limite:
+            continue
+        ruta.unlink()
+        borrados += 1
+        liberados += stat.st_size
+
+    # Quitar subcarpetas que quedaron vacías
+    for sub in carpeta.iterdir():
+        if sub.is_dir() and not any(sub.iterdir()):
+            os.rmdir(sub)
+    return borrados, liberados
+
+
+def uso_disco(backup_dir):
+    """(tamaño lógico total de los backups, bytes ocupados por los bloques)"""
+    backup_dir = Path(backup_dir)
+    logico = 0
+    for path in backup_dir.glob("*.json"):
+        manifiesto = leer(path)
+        if manifiesto and 'bloques' in manifiesto:
+            logico += manifiesto.get('bytes', 0)
+    fisico = sum(p.stat().st_size for p in _carpeta_bloques(backup_dir).glob("*/*"))
+    return logico, fisico
@@ -1,79 +1,60 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-import sqlite3
 from pathlib import Path
 import plotly.express as px
 import plotly.graph_objects as go
-import shutil
 import json
 import base64
-import requests
+import time
+from sincronizacion import ColaSincronizacion, obtener_cliente_github
+import bitacora
+import datos_referencia
+import cache_tablas
+import base_datos
+import esquema
+import diario_cambios
+import almacen_backups
+import exportador
+import imagen_base
+import cache_dashboard
+import rankings_stock
+import rollups_movimientos
+import pronostico_stock
+import consumo_sitios
+from base_datos import DB_FILE
 
 
-DB_FILE = "inventario.db"
 BACKUP_DIR = Path("backups")
 BACKUP_DIR.mkdir(exist_ok=True)
 
 
 BACKUPS_DIR = Path("backups_sistema")
 BACKUPS_DIR.mkdir(exist_ok=True)
-ENTRADAS_PERSIST = BACKUPS_DIR / "entradas_persist.json"
-SALIDAS_PERSIST = BACKUPS_DIR / "salidas_persist.json"
 
 def init_database():
     """Inicializa la base de datos SQLite con las tablas necesarias"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Tabla de ENTRADAS
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS entradas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            orden_compra TEXT,
-            fecha TEXT,
-            codigo TEXT,
-            producto TEXT,
-            cantidad REAL,
-            um TEXT,
-            sistema TEXT,
-            almacen_salida TEXT,
-            fecha_envio TEXT,
-            responsable_envio TEXT,
-            almacen_recepcion TEXT,
-            fecha_recepcion TEXT,
-            responsable_recepcion TEXT,
-            creado_por TEXT,
-            fecha_creacion TEXT
-        )
-    ''')
-    
-    # Tabla de SALIDAS
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS salidas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nro_guia TEXT,
-            nro_tarea TEXT,
-            fecha TEXT,
-            cod_sitio TEXT,
-            sitio TEXT,
-            departamento TEXT,
-            codigo TEXT,
-            producto TEXT,
-            code_indra TEXT,
-            descripcion TEXT,
-            cantidad REAL,
-            um TEXT,
-            sistema TEXT,
-            creado_por TEXT,
-            fecha_creacion TEXT
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    # Tablas, migraciones pendientes (PRAGMA user_version), libro de stock y versiones
+    esquema.inicializar(base_datos.obtener_conexion())
 
 
+def restaurar_tabla_desde_persistencia(conn, tabla):
+    """Vuelca snapshot + bitácora en la tabla con executemany, conservando los ids.
+
+    El snapshot se lee por partes (no se carga entero) y las filas van al
+    esquema existente (AUTOINCREMENT, tipos, triggers); sqlite_sequence queda en
+    el id más alto, así los registros nuevos no reutilizan ids.
+    """
+    columnas = ['id'] + base_datos.COLUMNAS[tabla]
+    fechas = set(esquema.COLUMNAS_FECHA[tabla])
+    filas = (
+        tuple(esquema.fecha_iso(registro.get(col)) if col in fechas else registro.get(col) for col in columnas)
+        for registro in bitacora.iterar_registros(tabla)
+    )
+    cursor = conn.executemany(
+        f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})", filas
+    )
+    return cursor.rowcount
 
 def restaurar_desde_json_local():
     """Restaura datos desde JSON local al iniciar (si la BD está vacía)"""
@@ -82,7 +63,7 @@ def restaurar_desde_json_local():
         print("🔄 VERIFICANDO NECESIDAD DE RESTAURACIÓN")
         print("="*70)
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = base_datos.obtener_conexion()
         cursor = conn.cursor()
         
         # Verificar si la BD tiene datos
@@ -94,45 +75,47 @@ def restaurar_desde_json_local():
         
         print(f"📊 Registros en BD: {count_entradas_db} entradas, {count_salidas_db} salidas")
         
-        # Verificar si existen archivos JSON
-        tiene_json_entradas = ENTRADAS_PERSIST.exists()
-        tiene_json_salidas = SALIDAS_PERSIST.exists()
+        # Verificar si existen archivos de persistencia (snapshot JSON + bitácora)
+        tiene_json_entradas = bitacora.existe_persistencia('entradas')
+        tiene_json_salidas = bitacora.existe_persistencia('salidas')
         
         print(f"📁 Archivos JSON: entradas={tiene_json_entradas}, salidas={tiene_json_salidas}")
         
-        restaurado = False
+        # Solo las tablas vacías que tengan snapshot o bitácora
+        tablas = [tabla for tabla, vacia, tiene_json in (
+            ('entradas', count_entradas_db == 0, tiene_json_entradas),
+            ('salidas', count_salidas_db == 0, tiene_json_salidas)
+        ) if vacia and tiene_json]
         
-        # Restaurar ENTRADAS si la BD está vacía pero hay JSON
-        if count_entradas_db == 0 and tiene_json_entradas:
-            try:
-                with open(ENTRADAS_PERSIST, 'r', encoding='utf-8') as f:
-                    entradas_data = json.load(f)
-                
-                if entradas_data:
-                    print(f"🔄 Restaurando {len(entradas_data)} entradas desde JSON...")
-                    df = pd.DataFrame(entradas_data)
-                    df.to_sql('entradas', conn, if_exists='replace', index=False)
-                    print(f"✅ ENTRADAS RESTAURADAS: {len(entradas_data)} registros")
-                    restaurado = True
-            except Exception as e:
-                print(f"❌ Error restaurando entradas: {e}")
-        
-        # Restaurar SALIDAS si la BD está vacía pero hay JSON
-        if count_salidas_db == 0 and tiene_json_salidas:
-            try:
-                with open(SALIDAS_PERSIST, 'r', encoding='utf-8') as f:
-                    salidas_data = json.load(f)
-                
-                if salidas_data:
-                    print(f"🔄 Restaurando {len(salidas_data)} salidas desde JSON...")
-                    df = pd.DataFrame(salidas_data)
-                    df.to_sql('salidas', conn, if_exists='replace', index=False)
-                    print(f"✅ SALIDAS RESTAURADAS: {len(salidas_data)} registros")
-                    restaurado = True
-            except Exception as e:
-                print(f"❌ Error restaurando salidas: {e}")
-        
-        conn.close()
+        restaurado = False
+        if tablas:
+            inicio = time.perf_counter()
+            # Imagen binaria si existe; si no, snapshot JSON + bitácora
+            if bitacora.archivo_imagen().exists():
+                try:
+                    restauradas = imagen_base.restaurar(tablas)
+                except Exception as e:
+                    # Sin volver a los JSON: con imagen no están al día y las bitácoras ya
+                    # se vaciaron en ella, así que restaurar desde ahí perdería datos.
+                    # La base queda vacía para que nada reemplace la imagen.
+                    print(f"❌ IMAGEN NO UTILIZABLE, NO SE RESTAURA: {e}")
+                    st.session_state['imagen_no_utilizable'] = str(e)
+                    print("="*70)
+                    return False
+            else:
+                # Una sola transacción: si algo falla la base queda vacía y se reintenta al reiniciar
+                # El volcado es la base de la historia: no se anota fila por fila en el diario
+                with base_datos.transaccion() as conn, diario_cambios.sin_registrar(conn):
+                    restauradas = {tabla: restaurar_tabla_desde_persistencia(conn, tabla) for tabla in tablas}
+            segundos = time.perf_counter() - inicio
+            total = sum(restauradas.values())
+            for tabla, filas in restauradas.items():
+                print(f"✅ {tabla.upper()} RESTAURADAS: {filas} registros")
+            print(f"⏱️ Restauración: {total} registros en {segundos:.2f} s "
+                  f"({total / segundos if segundos else 0:,.0f} registros/s)")
+            restaurado = total > 0
+            if restaurado:
+                st.session_state['restauracion_inicio'] = (total, segundos)
         
         if restaurado:
             print("="*70)
@@ -153,29 +136,29 @@ def restaurar_desde_json_local():
 
 # ==================== FUNCIONES DE PERSISTENCIA Y GITHUB API ====================
 
-def guardar_a_json(df, archivo):
-    """Guarda DataFrame a JSON"""
+def obtener_config_github():
+    """Devuelve (token, repo, branch) desde los secrets, o None si no están configurados"""
     try:
-        data = df.to_dict('records')
-        with open(archivo, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error al guardar JSON: {e}")
-        return False
+        github_token = st.secrets.get("GITHUB_TOKEN")
+        github_repo = st.secrets.get("GITHUB_REPO")
+        github_branch = st.secrets.get("GITHUB_BRANCH", "main")
+    except Exception:
+        return None
+    
+    if not github_token or not github_repo:
+        return None
+    return github_token, github_repo, github_branch
 
 def commit_file_to_github(file_path, content, commit_message):
     """Hace commit de un archivo a GitHub usando la API"""
     try:
         print(f"🔄 Commit: {file_path}")
         
-        github_token = st.secrets.get("GITHUB_TOKEN")
-        github_repo = st.secrets.get("GITHUB_REPO")
-        github_branch = st.secrets.get("GITHUB_BRANCH", "main")
-        
-        if not github_token or not github_repo:
+        config = obtener_config_github()
+        if not config:
             print("⚠️ Secrets de GitHub no configurados")
             return False
+        github_token, github_repo, github_branch = config
         
         api_url = f"https://api.github.com/repos/{github_repo}/contents/{file_path}"
         headers = {
@@ -183,8 +166,11 @@ def commit_file_to_github(file_path, content, commit_message):
             "Accept": "application/vnd.github.v3+json"
         }
         
+        # Sesión compartida (reutiliza la conexión HTTPS entre llamadas)
+        session = obtener_cliente_github(*config).session
+        
         # Obtener SHA si existe
-        response = requests.get(api_url, headers=headers)
+        response = session.get(api_url, headers=headers, timeout=30)
         sha = None
         if response.status_code == 200:
             sha = response.json().get("sha")
@@ -202,7 +188,7 @@ def commit_file_to_github(file_path, content, commit_message):
         if sha:
             data["sha"] = sha
         
-        response = requests.put(api_url, headers=headers, json=data)
+        response = session.put(api_url, headers=headers, json=data, timeout=30)
         
         if response.status_code in [200, 201]:
             print(f"✅ Commit exitoso: {file_path}")
@@ -215,145 +201,189 @@ def commit_file_to_github(file_path, content, commit_message):
         print(f"❌ Error en commit: {e}")
         return False
 
+def formato_snapshot():
+    """Formato del snapshot de persistencia desde los secrets ("binario" por defecto)"""
+    try:
+        formato = st.secrets.get("SNAPSHOT_FORMATO", "binario")
+    except Exception:
+        return "binario"
+    if formato not in bitacora.FORMATOS_SNAPSHOT:
+        print(f"⚠️ SNAPSHOT_FORMATO desconocido: {formato}, se usa 'binario'")
+        return "binario"
+    return formato
+
 def sincronizar_github():
-    """Sincroniza archivos con GitHub"""
+    """Sincroniza archivos con GitHub (solo los que cambiaron)"""
     try:
-        entradas = cargar_entradas_db()
-        salidas = cargar_salidas_db()
+        # Integrar la bitácora en el snapshot (imagen binaria) cuando crece demasiado
+        con_json = formato_snapshot() == "ambos"
+        for tabla in bitacora.TABLAS:
+            bitacora.compactar_si_necesario(tabla, crear_imagen=imagen_base.crear, con_json=con_json)
         
-        # Guardar JSON localmente
-        guardar_a_json(entradas, ENTRADAS_PERSIST)
-        guardar_a_json(salidas, SALIDAS_PERSIST)
+        # Sin secrets solo se mantiene la copia local
+        config = obtener_config_github()
+        if not config:
+            return True
         
-        # Leer y subir a GitHub
-        with open(ENTRADAS_PERSIST, 'r', encoding='utf-8') as f:
-            entradas_json = f.read()
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        with open(SALIDAS_PERSIST, 'r', encoding='utf-8') as f:
-            salidas_json = f.read()
+        # Normalmente solo cambia la bitácora; el snapshot solo tras compactar
+        modificados = bitacora.archivos_modificados()
         
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Modo anterior: un commit por archivo con la Contents API
+        if st.secrets.get("GITHUB_SYNC_MODE", "git_data") == "contents":
+            exito = True
+            for path, contenido, digest in modificados:
+                if commit_file_to_github(
+                    f"backups_sistema/{path.name}",
+                    contenido,
+                    f"Auto-sync {path.stem} - {timestamp}"
+                ):
+                    bitacora.marcar_sincronizado(path, digest)
+                else:
+                    exito = False
+            return exito
         
-        commit_file_to_github(
-            "backups_sistema/entradas_persist.json",
-            entradas_json,
-            f"Auto-sync entradas - {timestamp}"
-        )
+        # Git Data API: todos los archivos en un solo commit
+        archivos = {f"backups_sistema/{path.name}": contenido for path, contenido, _ in modificados}
         
-        commit_file_to_github(
-            "backups_sistema/salidas_persist.json",
-            salidas_json,
-            f"Auto-sync salidas - {timestamp}"
-        )
+        # Opcional: incluir también el Excel completo en el mismo commit
+        if archivos and st.secrets.get("GITHUB_SYNC_EXCEL", False):
+            archivo_excel = exportar_excel_completo()
+            if archivo_excel:
+                archivos["backups_sistema/inventario_completo.xlsx"] = Path(archivo_excel).read_bytes()
+        
+        if archivos:
+            cliente = obtener_cliente_github(*config)
+            cliente.commit_archivos(archivos, f"Auto-sync - {timestamp}")
+            print(f"✅ Commit único con {len(archivos)} archivos")
+        
+        for path, _, digest in modificados:
+            bitacora.marcar_sincronizado(path, digest)
         
         return True
     except Exception as e:
         print(f"Error en sincronización: {e}")
         return False
 
+@st.cache_resource
+def obtener_cola_sincronizacion():
+    """Cola de sincronización única para todo el proceso (compartida entre sesiones)"""
+    return ColaSincronizacion(sincronizar_github)
+
+def obtener_cache_tabla(tabla):
+    """Caché de la tabla para esta sesión (se crea la primera vez)"""
+    clave = f"cache_{tabla}"
+    if clave not in st.session_state:
+        st.session_state[clave] = cache_tablas.CacheTabla(tabla, DB_FILE)
+    return st.session_state[clave]
+
 def cargar_entradas_db():
-    """Carga entradas desde la base de datos"""
+    """Carga entradas desde la base de datos (solo lee lo que cambió desde la última vez)"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query("SELECT * FROM entradas ORDER BY id DESC", conn)
-        conn.close()
-        return df
+        cache = obtener_cache_tabla('entradas')
+        cache.actualizar()
+        return cache.df
     except Exception as e:
         st.error(f"Error al cargar entradas: {e}")
         return pd.DataFrame()
 
 def cargar_salidas_db():
-    """Carga salidas desde la base de datos"""
+    """Carga salidas desde la base de datos (solo lee lo que cambió desde la última vez)"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query("SELECT * FROM salidas ORDER BY id DESC", conn)
-        conn.close()
-        return df
+        cache = obtener_cache_tabla('salidas')
+        cache.actualizar()
+        return cache.df
     except Exception as e:
         st.error(f"Error al cargar salidas: {e}")
         return pd.DataFrame()
 
+def _filtros_sql(tabla, filtros):
+    """Traduce los filtros de la lista a una cláusula WHERE con parámetros"""
+    condiciones = []
+    params = []
+    
+    if filtros.get('fecha_desde'):
+        condiciones.append("fecha >= ?")
+        params.append(str(filtros['fecha_desde']))
+    if filtros.get('fecha_hasta'):
+        condiciones.append("fecha <= ?")
+        params.append(str(filtros['fecha_hasta']))
+    if filtros.get('producto'):
+        condiciones.append("producto = ?")
+        params.append(filtros['producto'])
+    if filtros.get('documento'):
+        columna = 'nro_guia' if tabla == 'salidas' else 'orden_compra'
+        condiciones.append(f"{columna} LIKE ?")
+        params.append(f"{filtros['documento']}%")
+    if tabla == 'salidas' and filtros.get('sitio'):
+        condiciones.append("(sitio LIKE ? OR cod_sitio LIKE ?)")
+        params.extend([f"{filtros['sitio']}%"] * 2)
+    
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return where, params
+
+def contar_movimientos(tabla, filtros):
+    """Cuenta los registros de entradas/salidas que cumplen los filtros"""
+    try:
+        where, params = _filtros_sql(tabla, filtros)
+        conn = base_datos.obtener_conexion()
+        total = conn.execute(f"SELECT COUNT(*) FROM {tabla} {where}", params).fetchone()[0]
+        return total
+    except Exception as e:
+        st.error(f"Error al contar {tabla}: {e}")
+        return 0
+
+def consultar_movimientos(tabla, filtros, limite, offset):
+    """Devuelve una página de entradas/salidas filtrada y paginada en SQLite"""
+    try:
+        where, params = _filtros_sql(tabla, filtros)
+        conn = base_datos.obtener_conexion()
+        df = pd.read_sql_query(
+            f"SELECT * FROM {tabla} {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+            conn, params=params + [limite, offset]
+        )
+        return df
+    except Exception as e:
+        st.error(f"Error al consultar {tabla}: {e}")
+        return pd.DataFrame()
+
 def guardar_entrada_db(datos):
-    """Guarda una entrada en la base de datos"""
+    """Guarda una entrada en la base de datos y devuelve el registro creado (o False)"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO entradas (
-                orden_compra, fecha, codigo, producto, cantidad, um, sistema,
-                almacen_salida, fecha_envio, responsable_envio,
-                almacen_recepcion, fecha_recepcion, responsable_recepcion,
-                creado_por, fecha_creacion
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            datos.get('orden_compra', ''),
-            datos.get('fecha', ''),
-            datos.get('codigo', ''),
-            datos.get('producto', ''),
-            datos.get('cantidad', 0),
-            datos.get('um', ''),
-            datos.get('sistema', ''),
-            datos.get('almacen_salida', ''),
-            datos.get('fecha_envio', ''),
-            datos.get('responsable_envio', ''),
-            datos.get('almacen_recepcion', ''),
-            datos.get('fecha_recepcion', ''),
-            datos.get('responsable_recepcion', ''),
-            datos.get('creado_por', 'Usuario'),
-            obtener_hora_peru()
-        ))
+        # Inserción con la sentencia preparada, en una transacción de escritura
+        with base_datos.transaccion() as conn:
+            entrada_id = base_datos.insertar_movimiento(conn, 'entradas', {**datos, 'fecha_creacion': obtener_hora_peru()})
+            registro = base_datos.leer_registro(conn, 'entradas', entrada_id)
         
-        conn.commit()
-        conn.close()
+        # Registrar el cambio en la bitácora (una línea, no la tabla completa)
+        bitacora.registrar_insert('entradas', registro)
         
         # Backup automático
         backup_automatico()
-        # Sincronizar con GitHub
-        sincronizar_github()
-        return True
+        # Encolar sincronización con GitHub (se hace en segundo plano)
+        obtener_cola_sincronizacion().registrar('entradas', 'insert', entrada_id)
+        return registro
     except Exception as e:
         st.error(f"Error al guardar entrada: {e}")
         return False
 
 def guardar_salida_db(datos):
-    """Guarda una salida en la base de datos"""
+    """Guarda una salida en la base de datos y devuelve el registro creado (o False)"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO salidas (
-                nro_guia, nro_tarea, fecha, cod_sitio, sitio, departamento,
-                codigo, producto, code_indra, descripcion, cantidad, um, sistema,
-                creado_por, fecha_creacion
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            datos.get('nro_guia', ''),
-            datos.get('nro_tarea', ''),
-            datos.get('fecha', ''),
-            datos.get('cod_sitio', ''),
-            datos.get('sitio', ''),
-            datos.get('departamento', ''),
-            datos.get('codigo', ''),
-            datos.get('producto', ''),
-            datos.get('code_indra', ''),
-            datos.get('descripcion', ''),
-            datos.get('cantidad', 0),
-            datos.get('um', ''),
-            datos.get('sistema', ''),
-            datos.get('creado_por', 'Usuario'),
-            obtener_hora_peru()
-        ))
+        # Inserción con la sentencia preparada, en una transacción de escritura
+        with base_datos.transaccion() as conn:
+            salida_id = base_datos.insertar_movimiento(conn, 'salidas', {**datos, 'fecha_creacion': obtener_hora_peru()})
+            registro = base_datos.leer_registro(conn, 'salidas', salida_id)
         
-        conn.commit()
-        conn.close()
+        # Registrar el cambio en la bitácora (una línea, no la tabla completa)
+        bitacora.registrar_insert('salidas', registro)
         
         # Backup automático
         backup_automatico()
-        # Sincronizar con GitHub
-        sincronizar_github()
-        return True
+        # Encolar sincronización con GitHub (se hace en segundo plano)
+        obtener_cola_sincronizacion().registrar('salidas', 'insert', salida_id)
+        return registro
     except Exception as e:
         st.error(f"Error al guardar salida: {e}")
         return False
@@ -361,13 +391,11 @@ def guardar_salida_db(datos):
 def eliminar_entrada_db(entrada_id):
     """Elimina una entrada de la base de datos"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM entradas WHERE id = ?", (entrada_id,))
-        conn.commit()
-        conn.close()
+        with base_datos.transaccion() as conn:
+            conn.execute("DELETE FROM entradas WHERE id = ?", (entrada_id,))
+        bitacora.registrar_delete('entradas', entrada_id)
         backup_automatico()
-        sincronizar_github()
+        obtener_cola_sincronizacion().registrar('entradas', 'delete', entrada_id)
         return True
     except Exception as e:
         st.error(f"Error al eliminar entrada: {e}")
@@ -376,13 +404,11 @@ def eliminar_entrada_db(entrada_id):
 def eliminar_salida_db(salida_id):
     """Elimina una salida de la base de datos"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM salidas WHERE id = ?", (salida_id,))
-        conn.commit()
-        conn.close()
+        with base_datos.transaccion() as conn:
+            conn.execute("DELETE FROM salidas WHERE id = ?", (salida_id,))
+        bitacora.registrar_delete('salidas', salida_id)
         backup_automatico()
-        sincronizar_github()
+        obtener_cola_sincronizacion().registrar('salidas', 'delete', salida_id)
         return True
     except Exception as e:
         st.error(f"Error al eliminar salida: {e}")
@@ -398,15 +424,16 @@ def backup_automatico():
         # Si pasó más de 1 hora desde el último backup
         if ahora - ultimo_backup > 3600:  # 3600 segundos = 1 hora
             fecha = datetime.now().strftime('%Y%m%d_%H%M')
-            backup_file = BACKUP_DIR / f"inventario_auto_{fecha}.db"
-            shutil.copy2(DB_FILE, backup_file)
+            backup_file = BACKUP_DIR / f"inventario_auto_{fecha}.json"
+            almacen_backups.crear_backup(backup_file, tipo="auto")
             st.session_state.ultimo_backup_timestamp = ahora
             
-            # Limpiar backups antiguos (mantener últimos 50)
-            backups = sorted(BACKUP_DIR.glob("inventario_auto_*.db"))
+            # Limpiar backups antiguos (mantener últimos 50) y los bloques que ya no se usan
+            backups = sorted(BACKUP_DIR.glob("inventario_auto_*.json"))
             if len(backups) > 50:
                 for old_backup in backups[:-50]:
-                    old_backup.unlink()
+                    almacen_backups.eliminar(old_backup)
+                almacen_backups.recolectar_basura(BACKUP_DIR)
     except Exception as e:
         pass  # Silencioso para no molestar al usuario
 
@@ -414,58 +441,85 @@ def backup_manual():
     """Crea backup manual"""
     try:
         fecha = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = BACKUP_DIR / f"inventario_manual_{fecha}.db"
-        shutil.copy2(DB_FILE, backup_file)
+        backup_file = BACKUP_DIR / f"inventario_manual_{fecha}.json"
+        almacen_backups.crear_backup(backup_file, tipo="manual")
         return backup_file
     except Exception as e:
         st.error(f"Error al crear backup: {e}")
         return None
 
 def exportar_excel_completo():
-    """Exporta entradas y salidas en un solo Excel con 2 hojas"""
+    """Exporta entradas y salidas en un solo Excel con 2 hojas (reutiliza el último si no hubo cambios)"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        entradas = pd.read_sql_query("SELECT * FROM entradas", conn)
-        salidas = pd.read_sql_query("SELECT * FROM salidas", conn)
-        conn.close()
-        
-        EXPORTS_DIR = Path("exports")
-        EXPORTS_DIR.mkdir(exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = EXPORTS_DIR / f"inventario_completo_{timestamp}.xlsx"
-        
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-            # Hoja de Entradas
-            columnas_entradas = [
-                'orden_compra', 'fecha', 'codigo', 'producto', 'cantidad', 'um', 
-                'sistema', 'almacen_salida', 'fecha_envio', 'responsable_envio',
-                'almacen_recepcion', 'fecha_recepcion', 'responsable_recepcion'
-            ]
-            df_entradas = entradas[[col for col in columnas_entradas if col in entradas.columns]]
-            df_entradas.to_excel(writer, sheet_name='Entradas', index=False)
-            
-            # Hoja de Salidas
-            columnas_salidas = [
-                'nro_guia', 'nro_tarea', 'fecha', 'cod_sitio', 'sitio', 
-                'departamento', 'codigo', 'producto', 'code_indra', 'descripcion',
-                'cantidad', 'um', 'sistema'
-            ]
-            df_salidas = salidas[[col for col in columnas_salidas if col in salidas.columns]]
-            df_salidas.to_excel(writer, sheet_name='Salidas', index=False)
-        
-        return filename
+        return exportador.exportar_versionado('xlsx', DB_FILE, EXPORTS_DIR)['archivo']
     except Exception as e:
         st.error(f"Error al exportar: {e}")
         return None
 
+def iniciar_exportacion(formato='xlsx'):
+    """Entrega el archivo vigente al instante o lanza la exportación en segundo plano"""
+    st.session_state['exportacion'] = exportador.iniciar(formato, DB_FILE, EXPORTS_DIR)
+
+def descartar_exportacion():
+    """Olvida la exportación terminada: el archivo ya no se relee ni se envía en cada recarga"""
+    st.session_state.pop('exportacion', None)
+
+def mostrar_exportacion():
+    """Avance de la exportación en segundo plano o, si terminó, el botón de descarga (hasta descargarla)"""
+    trabajo = st.session_state.get('exportacion')
+    if trabajo is None:
+        return
+    if trabajo.en_curso():
+        _avance_exportacion(trabajo)
+        return
+    estado = trabajo.estado()
+    if estado['error']:
+        st.error(f"❌ Error al exportar: {estado['error']}")
+        return
+    resumen = estado['resumen']
+    archivo = resumen['archivo']
+    if archivo.exists():
+        with open(archivo, 'rb') as f:
+            st.download_button(
+                label=f"⬇️ Descargar {archivo.name}",
+                data=f,
+                file_name=archivo.name,
+                mime=exportador.tipo_mime(resumen['formato']),
+                on_click=descartar_exportacion,
+                use_container_width=True
+            )
+        total_registros = sum(resumen['filas'].values())
+        if resumen['desde_cache']:
+            st.success(f"✅ {total_registros} registros (sin cambios desde la última exportación)")
+        else:
+            st.success(f"✅ {total_registros} registros en {resumen['segundos']} s")
+
+@st.fragment(run_every=1)
+def _avance_exportacion(trabajo):
+    """Barra de avance; se refresca cada segundo solo mientras la exportación corre"""
+    estado = trabajo.estado()
+    if not estado['en_curso']:
+        # Una sola ejecución completa: el resultado se dibuja fuera del fragmento y deja de refrescarse
+        st.rerun()
+    st.progress(estado['fraccion'],
+                text=f"Exportando {estado['escritas']:,}/{estado['total']:,} filas ({estado['segundos']} s)")
+
 # ==================== FUNCIONES ORIGINALES ====================
 
+def actualizar_rankings():
+    """Carga Stock.xlsx en los rankings materializados si cambió desde la última carga"""
+    try:
+        version = st.session_state.stock_version
+        # Lectura primero: la transacción de escritura solo cuando hay algo que recargar
+        if rankings_stock.version_catalogo(base_datos.obtener_conexion()) != version:
+            with base_datos.transaccion() as conn:
+                rankings_stock.cargar_catalogo(conn, st.session_state.stock_data, version)
+    except Exception as e:
+        st.error(f"Error al actualizar los rankings de stock: {e}")
+
 def obtener_hora_peru():
     """Obtiene la hora actual de Perú (UTC-5)"""
-    utc_now = datetime.utcnow()
-    peru_time = utc_now - timedelta(hours=5)
-    return peru_time.strftime('%d/%m/%Y %I:%M %p')
+    return datetime.now(base_datos.ZONA_PERU).strftime('%d/%m/%Y %I:%M %p')
 
 # Configuración de la página
 st.set_page_config(
@@ -487,32 +541,24 @@ STOCK_FILE = DATA_DIR / "Stock.xlsx"
 DATA_DIR.mkdir(exist_ok=True)
 EXPORTS_DIR.mkdir(exist_ok=True)
 
-# Cargar datos desde DB
-if 'entradas' not in st.session_state:
-    st.session_state.entradas = cargar_entradas_db()
-
-if 'salidas' not in st.session_state:
-    st.session_state.salidas = cargar_salidas_db()
-
-# Cargar datos de SITES
-if 'sites_data' not in st.session_state:
-    if SITES_FILE.exists():
-        try:
-            st.session_state.sites_data = pd.read_excel(SITES_FILE, sheet_name='Site POP')
-        except ValueError:
-            st.session_state.sites_data = pd.read_excel(SITES_FILE, sheet_name=0)
-            st.warning("⚠️ No se encontró la hoja 'Site POP'. Se cargó la primera hoja.")
-    else:
-        st.session_state.sites_data = pd.DataFrame()
-        st.error("❌ No se encontró el archivo SITES.xlsx en la carpeta data/")
+# Cargar datos desde DB (la primera vez completo; después solo los cambios de otras sesiones)
+st.session_state.entradas = cargar_entradas_db()
+st.session_state.salidas = cargar_salidas_db()
+
+# Cargar datos de SITES (caché compartida por todas las sesiones; solo se relee si cambia el Excel)
+st.session_state.sites_data, st.session_state.sites_version, aviso_sites = \
+    datos_referencia.cargar_referencia(SITES_FILE, hoja='Site POP')
+if aviso_sites:
+    st.warning(f"⚠️ {aviso_sites}")
+if not SITES_FILE.exists():
+    st.error("❌ No se encontró el archivo SITES.xlsx en la carpeta data/")
 
 # Cargar datos de STOCK
-if 'stock_data' not in st.session_state:
-    if STOCK_FILE.exists():
-        st.session_state.stock_data = pd.read_excel(STOCK_FILE)
-    else:
-        st.session_state.stock_data = pd.DataFrame()
-        st.error("❌ No se encontró el archivo Stock.xlsx en la carpeta data/")
+st.session_state.stock_data, st.session_state.stock_version, _ = \
+    datos_referencia.cargar_referencia(STOCK_FILE)
+if not STOCK_FILE.exists():
+    st.error("❌ No se encontró el archivo Stock.xlsx en la carpeta data/")
+actualizar_rankings()
 
 def obtener_datos_producto(codigo_o_producto):
     """Obtiene datos del producto desde Stock.xlsx"""
@@ -520,13 +566,13 @@ def obtener_datos_producto(codigo_o_producto):
         return {}
     
     try:
-        producto = st.session_state.stock_data[
-            (st.session_state.stock_data['Codigo'].astype(str).str.upper() == str(codigo_o_producto).upper()) |
-            (st.session_state.stock_data['Producto'].astype(str).str.upper() == str(codigo_o_producto).upper())
-        ]
+        # Índice hash (Codigo / Producto) construido una vez por versión de Stock.xlsx
+        indice = datos_referencia.obtener_indice(
+            st.session_state.stock_data, st.session_state.stock_version, ['Codigo', 'Producto']
+        )
+        producto = datos_referencia.buscar_fila(st.session_state.stock_data, indice, codigo_o_producto)
         
-        if not producto.empty:
-            producto = producto.iloc[0]
+        if producto is not None:
             return {
                 'codigo': str(producto.get('Codigo', '')),
                 'producto': str(producto.get('Producto', '')),
@@ -545,13 +591,13 @@ def obtener_datos_site(nombre_site):
         return {}
     
     try:
-        site = st.session_state.sites_data[
-            (st.session_state.sites_data['Código'].astype(str).str.upper() == nombre_site.upper()) |
-            (st.session_state.sites_data['Nombre'].astype(str).str.upper() == nombre_site.upper())
-        ]
+        # Índice hash (Código / Nombre) construido una vez por versión de SITES.xlsx
+        indice = datos_referencia.obtener_indice(
+            st.session_state.sites_data, st.session_state.sites_version, ['Código', 'Nombre']
+        )
+        site = datos_referencia.buscar_fila(st.session_state.sites_data, indice, nombre_site)
         
-        if not site.empty:
-            site = site.iloc[0]
+        if site is not None:
             return {
                 'cod_sitio': str(site.get('Código', '')),
                 'sitio': str(site.get('Nombre', '')),
@@ -562,6 +608,18 @@ def obtener_datos_site(nombre_site):
     
     return {}
 
+def cargar_totales_stock():
+    """Carga los totales de entradas y salidas por código desde el libro de stock"""
+    try:
+        conn = base_datos.obtener_conexion()
+        df = pd.read_sql_query(
+            "SELECT codigo AS Codigo, total_entradas, total_salidas FROM stock_totales", conn
+        )
+        return df
+    except Exception as e:
+        st.error(f"Error al cargar totales de stock: {e}")
+        return pd.DataFrame(columns=['Codigo', 'total_entradas', 'total_salidas'])
+
 def calcular_stock_actual():
     """Calcula el stock actual de todos los productos"""
     if st.session_state.stock_data.empty:
@@ -569,23 +627,11 @@ def calcular_stock_actual():
     
     stock_df = st.session_state.stock_data.copy()
     
-    # Calcular total de entradas por producto
-    if not st.session_state.entradas.empty:
-        entradas_sum = st.session_state.entradas.groupby('codigo')['cantidad'].sum().reset_index()
-        entradas_sum.columns = ['Codigo', 'total_entradas']
-        stock_df = stock_df.merge(entradas_sum, on='Codigo', how='left')
-        stock_df['total_entradas'] = stock_df['total_entradas'].fillna(0)
-    else:
-        stock_df['total_entradas'] = 0
-    
-    # Calcular total de salidas por producto
-    if not st.session_state.salidas.empty:
-        salidas_sum = st.session_state.salidas.groupby('codigo')['cantidad'].sum().reset_index()
-        salidas_sum.columns = ['Codigo', 'total_salidas']
-        stock_df = stock_df.merge(salidas_sum, on='Codigo', how='left')
-        stock_df['total_salidas'] = stock_df['total_salidas'].fillna(0)
-    else:
-        stock_df['total_salidas'] = 0
+    # Totales por producto desde el libro de stock (O(productos), no O(movimientos))
+    totales = cargar_totales_stock()
+    stock_df = stock_df.merge(totales, on='Codigo', how='left')
+    stock_df['total_entradas'] = stock_df['total_entradas'].fillna(0)
+    stock_df['total_salidas'] = stock_df['total_salidas'].fillna(0)
     
     # Calcular stock actual
     stock_df['stock_actual'] = stock_df['Stock inicial'] + stock_df['total_entradas'] - stock_df['total_salidas']
@@ -600,33 +646,319 @@ def calcular_stock_actual():
 
 def crear_entrada(datos):
     """Crea un nuevo registro de entrada"""
-    if guardar_entrada_db(datos):
-        st.session_state.entradas = cargar_entradas_db()
+    registro = guardar_entrada_db(datos)
+    if registro:
+        # Aplicar la fila nueva en memoria en lugar de releer toda la tabla
+        cache = obtener_cache_tabla('entradas')
+        cache.aplicar_insert(registro)
+        st.session_state.entradas = cache.df
         return True
     return False
 
 def crear_salida(datos):
     """Crea un nuevo registro de salida"""
-    if guardar_salida_db(datos):
-        st.session_state.salidas = cargar_salidas_db()
+    registro = guardar_salida_db(datos)
+    if registro:
+        # Aplicar la fila nueva en memoria en lugar de releer toda la tabla
+        cache = obtener_cache_tabla('salidas')
+        cache.aplicar_insert(registro)
+        st.session_state.salidas = cache.df
         return True
     return False
 
 def eliminar_entrada(entrada_id):
     """Elimina un registro de entrada"""
     if eliminar_entrada_db(entrada_id):
-        st.session_state.entradas = cargar_entradas_db()
+        cache = obtener_cache_tabla('entradas')
+        cache.aplicar_delete(entrada_id)
+        st.session_state.entradas = cache.df
 
 def eliminar_salida(salida_id):
     """Elimina un registro de salida"""
     if eliminar_salida_db(salida_id):
-        st.session_state.salidas = cargar_salidas_db()
+        cache = obtener_cache_tabla('salidas')
+        cache.aplicar_delete(salida_id)
+        st.session_state.salidas = cache.df
+
+def version_dashboard():
+    """Versión de los datos del dashboard: contadores de movimientos + hash de Stock.xlsx"""
+    return cache_dashboard.version_datos(base_datos.obtener_conexion(), st.session_state.stock_version)
+
+def obtener_stock_actual(version=None):
+    """calcular_stock_actual() compartido entre sesiones mientras los datos no cambien"""
+    return cache_dashboard.obtener(('stock_actual',), version or version_dashboard(), calcular_stock_actual)
+
+def _figura_producto(prod_data, producto):
+    fig_prod = go.Figure()
+    fig_prod.add_trace(go.Bar(
+        name='Stock Inicial',
+        x=['Stock'],
+        y=[prod_data['Stock inicial']],
+        marker_color='lightblue'
+    ))
+    fig_prod.add_trace(go.Bar(
+        name='Entradas',
+        x=['Stock'],
+        y=[prod_data['total_entradas']],
+        marker_color='green'
+    ))
+    fig_prod.add_trace(go.Bar(
+        name='Salidas',
+        x=['Stock'],
+        y=[prod_data['total_salidas']],
+        marker_color='red'
+    ))
+    fig_prod.add_trace(go.Bar(
+        name='Stock Actual',
+        x=['Stock'],
+        y=[prod_data['stock_actual']],
+        marker_color='darkblue'
+    ))
+    fig_prod.update_layout(
+        title=f"Evolución de {producto}",
+        barmode='group',
+        yaxis_title=f"Cantidad ({prod_data['UM']})"
+    )
+    return fig_prod
+
+def _figura_stock_tiempo(prod_data, producto):
+    """Stock al cierre de cada día con movimientos (None si el producto no tiene movimientos con fecha)"""
+    serie = rollups_movimientos.stock_en_el_tiempo(
+        base_datos.obtener_conexion(), str(prod_data['Codigo']), float(prod_data['Stock inicial'])
+    )
+    if serie.empty:
+        return None
+    fig = px.line(
+        serie,
+        x='fecha',
+        y='stock',
+        title=f"Stock de {producto} a lo largo del tiempo",
+        labels={'fecha': 'Fecha', 'stock': f"Stock ({prod_data['UM']})"},
+        line_shape='hv',
+        markers=True
+    )
+    fig.add_hline(y=float(prod_data['Stock inicial']), line_dash='dot', annotation_text='Stock inicial')
+    return fig
+
+def _figura_tendencia(dimension, periodo, desde, hasta, columna, nombres):
+    """Cantidad por periodo de los valores con más movimiento en el rango (desde los acumulados)"""
+    conn = base_datos.obtener_conexion()
+    principales = rollups_movimientos.principales(conn, dimension, desde, hasta, k=TOP_TENDENCIAS, columna=columna)
+    if not principales:
+        return None
+    serie = rollups_movimientos.serie(conn, dimension, periodo, desde, hasta, valores=principales)
+    serie['serie'] = serie['valor'].map(lambda v: nombres.get(v, v) or '(sin dato)')
+    return px.line(
+        serie,
+        x='fecha',
+        y=columna,
+        color='serie',
+        title=f"{columna.capitalize()} por {'día' if periodo == 'dia' else 'semana'}",
+        labels={'fecha': 'Fecha', columna: 'Cantidad', 'serie': ''},
+        markers=periodo == 'semana'
+    )
+
+def _figura_top_stock():
+    top_stock = rankings_stock.top(base_datos.obtener_conexion(), 'stock_actual')
+    return px.bar(
+        top_stock,
+        x='stock_actual',
+        y='Producto',
+        orientation='h',
+        title="TOP 10 Stock Actual",
+        labels={'stock_actual': 'Cantidad', 'Producto': 'Producto'},
+        color='stock_actual',
+        color_continuous_scale='Blues'
+    )
+
+def _figura_top_salidas():
+    top_salidas = rankings_stock.top(base_datos.obtener_conexion(), 'total_salidas')
+    return px.bar(
+        top_salidas,
+        x='total_salidas',
+        y='Producto',
+        orientation='h',
+        title="TOP 10 Salidas",
+        labels={'total_salidas': 'Cantidad', 'Producto': 'Producto'},
+        color='total_salidas',
+        color_continuous_scale='Reds'
+    )
+
+def _figura_stock_critico():
+    """None si no hay productos con stock crítico"""
+    stock_critico = rankings_stock.criticos(base_datos.obtener_conexion())
+    if stock_critico.empty:
+        return None
+    return px.bar(
+        stock_critico,
+        x='stock_actual',
+        y='Producto',
+        orientation='h',
+        title="Productos con Stock Crítico",
+        labels={'stock_actual': 'Cantidad', 'Producto': 'Producto', 'umbral': 'Umbral'},
+        hover_data=['umbral'],
+        color='stock_actual',
+        color_continuous_scale='Oranges'
+    )
+
+def _figura_rotacion():
+    top_rotacion = rankings_stock.top(base_datos.obtener_conexion(), 'rotacion_inventario')
+    return px.bar(
+        top_rotacion,
+        x='rotacion_inventario',
+        y='Producto',
+        orientation='h',
+        title="Mayor Rotación",
+        labels={'rotacion_inventario': 'Índice de Rotación', 'Producto': 'Producto'},
+        color='rotacion_inventario',
+        color_continuous_scale='Greens'
+    )
+
+def _figura_inicial_vs_actual(stock_actual_df):
+    fig5 = go.Figure()
+    fig5.add_trace(go.Bar(
+        name='Stock Inicial',
+        x=stock_actual_df['Producto'].head(15),
+        y=stock_actual_df['Stock inicial'].head(15),
+        marker_color='lightblue'
+    ))
+    fig5.add_trace(go.Bar(
+        name='Stock Actual',
+        x=stock_actual_df['Producto'].head(15),
+        y=stock_actual_df['stock_actual'].head(15),
+        marker_color='darkblue'
+    ))
+    fig5.update_layout(
+        title="Comparación Stock Inicial vs Actual (Top 15 productos)",
+        barmode='group',
+        xaxis_title="Producto",
+        yaxis_title="Cantidad",
+        xaxis_tickangle=-45
+    )
+    return fig5
+
+def _figura_variacion(stock_actual_df):
+    stock_actual_df_sorted = stock_actual_df.sort_values('variacion_stock', ascending=False).head(15)
+    fig6 = px.bar(
+        stock_actual_df_sorted,
+        x='Producto',
+        y='variacion_stock',
+        title="Variación de Stock (Top 15)",
+        labels={'variacion_stock': 'Variación', 'Producto': 'Producto'},
+        color='variacion_stock',
+        color_continuous_scale='RdYlGn'
+    )
+    fig6.update_layout(xaxis_tickangle=-45)
+    return fig6
+
+def _figura_sistemas():
+    sistema_counts = rankings_stock.por_sistema(base_datos.obtener_conexion())
+    return px.pie(
+        sistema_counts,
+        values='stock_actual',
+        names='SISTEMA',
+        title="Stock Actual por Sistema"
+    )
+
+def _figura_ruptura(ranking):
+    fig = px.bar(
+        ranking,
+        x='dias_cobertura',
+        y='Producto',
+        orientation='h',
+        title="Días de Cobertura (los que se agotan antes)",
+        labels={'dias_cobertura': 'Días de cobertura', 'Producto': 'Producto', 'reponer': 'Reponer'},
+        hover_data=['consumo_diario', 'stock_actual', 'punto_reposicion'],
+        color='reponer',
+        color_discrete_map={True: 'crimson', False: 'steelblue'}
+    )
+    fig.update_layout(yaxis={'categoryorder': 'total descending'})
+    return fig
+
+def mostrar_ruptura_estimada(version):
+    """Ranking de productos por fecha estimada de ruptura según su consumo reciente"""
+    st.subheader("⏳ Ruptura Estimada")
+    col1, col2 = st.columns(2)
+    with col1:
+        ventana = st.selectbox("Consumo promedio de los últimos", [30, 60, 90, 180],
+                               index=2, format_func=lambda d: f"{d} días", key="pronostico_ventana")
+    with col2:
+        reposicion = st.number_input("Días de reposición", min_value=1, max_value=180,
+                                     value=pronostico_stock.DIAS_REPOSICION, key="pronostico_reposicion")
+    
+    hoy = datetime.now().date()
+    try:
+        pronostico = cache_dashboard.obtener(
+            ('pronostico', ventana, reposicion, hoy), version,
+            lambda: pronostico_stock.calcular(base_datos.obtener_conexion(), hoy, ventana, reposicion)
+        )
+    except Exception as e:
+        st.error(f"Error al calcular el pronóstico: {e}")
+        return
+    
+    ranking = pronostico_stock.ranking_ruptura(pronostico)
+    if ranking.empty:
+        st.info(f"No hubo salidas en los últimos {ventana} días.")
+        return
+    
+    st.caption(f"{int(pronostico['reponer'].sum())} productos en o bajo su punto de reposición")
+    st.plotly_chart(cache_dashboard.figura(('ruptura', ventana, reposicion, hoy), version,
+                                           lambda: _figura_ruptura(ranking)),
+                    use_container_width=True)
+    st.dataframe(
+        ranking[['Codigo', 'Producto', 'stock_actual', 'consumo_diario', 'dias_cobertura',
+                 'fecha_ruptura', 'punto_reposicion', 'reponer']],
+        hide_index=True, use_container_width=True,
+        column_config={
+            'stock_actual': 'Stock actual',
+            'consumo_diario': 'Consumo diario',
+            'dias_cobertura': 'Días de cobertura',
+            'fecha_ruptura': st.column_config.DateColumn('Ruptura estimada', format='DD/MM/YYYY'),
+            'punto_reposicion': 'Punto de reposición',
+            'reponer': 'Reponer'
+        }
+    )
+
+def mostrar_umbrales_criticos(stock_actual_df):
+    """Configuración del umbral de stock crítico por producto o por SISTEMA"""
+    with st.expander("⚙️ Umbrales de stock crítico"):
+        umbrales = rankings_stock.listar_umbrales(base_datos.obtener_conexion())
+        if not umbrales.empty:
+            st.dataframe(umbrales, hide_index=True, use_container_width=True)
+        
+        ambito = st.radio("Aplicar a", ["Producto", "SISTEMA"], horizontal=True, key="umbral_ambito")
+        if ambito == "Producto":
+            opciones = stock_actual_df['Codigo'].astype(str).tolist()
+            productos = dict(zip(opciones, stock_actual_df['Producto'].astype(str)))
+            valor = st.selectbox("Producto", opciones, format_func=lambda c: f"{c} - {productos[c]}", key="umbral_valor")
+        else:
+            valor = st.selectbox("SISTEMA", sorted(stock_actual_df['SISTEMA'].dropna().astype(str).unique()),
+                                 key="umbral_valor")
+        umbral = st.number_input("Umbral", min_value=0.0, value=float(rankings_stock.UMBRAL_CRITICO_DEFECTO),
+                                 step=10.0, key="umbral_cantidad")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            guardar = st.button("💾 Guardar umbral", use_container_width=True)
+        with col2:
+            quitar = st.button("🗑️ Quitar umbral", use_container_width=True)
+        if (guardar or quitar) and valor is not None:
+            try:
+                with base_datos.transaccion() as conn:
+                    rankings_stock.fijar_umbral(conn, 'codigo' if ambito == "Producto" else 'sistema',
+                                                valor, umbral if guardar else None)
+                st.success("✅ Umbral guardado" if guardar else "✅ Umbral quitado")
+                st.rerun()
+            except Exception as e:
+                st.error(f"Error al guardar el umbral: {e}")
 
 def mostrar_dashboard():
     """Muestra el dashboard con gráficos y análisis"""
     st.header("📊 Dashboard de Análisis de Stock")
     
-    stock_actual_df = calcular_stock_actual()
+    # Tabla de stock y figuras salen de la caché compartida mientras los datos no cambien
+    version = version_dashboard()
+    stock_actual_df = obtener_stock_actual(version)
     
     if stock_actual_df.empty:
         st.info("No hay datos de stock para mostrar.")
@@ -634,7 +966,7 @@ def mostrar_dashboard():
     
     # Selector de producto individual
     st.subheader("🔍 Análisis por Producto Individual")
-    productos_lista = stock_actual_df['Producto'].tolist()
+    productos_lista = cache_dashboard.obtener(('productos',), version, lambda: stock_actual_df['Producto'].tolist())
     producto_seleccionado = st.selectbox("Selecciona un producto:", productos_lista)
     
     if producto_seleccionado:
@@ -651,38 +983,18 @@ def mostrar_dashboard():
             st.metric("Stock Actual", f"{prod_data['stock_actual']:.2f} {prod_data['UM']}", 
                      delta=f"{prod_data['variacion_porcentaje']:.2f}%")
         
-        # Gráfico de evolución del producto seleccionado
-        fig_prod = go.Figure()
-        fig_prod.add_trace(go.Bar(
-            name='Stock Inicial',
-            x=['Stock'],
-            y=[prod_data['Stock inicial']],
-            marker_color='lightblue'
-        ))
-        fig_prod.add_trace(go.Bar(
-            name='Entradas',
-            x=['Stock'],
-            y=[prod_data['total_entradas']],
-            marker_color='green'
-        ))
-        fig_prod.add_trace(go.Bar(
-            name='Salidas',
-            x=['Stock'],
-            y=[prod_data['total_salidas']],
-            marker_color='red'
-        ))
-        fig_prod.add_trace(go.Bar(
-            name='Stock Actual',
-            x=['Stock'],
-            y=[prod_data['stock_actual']],
-            marker_color='darkblue'
-        ))
-        fig_prod.update_layout(
-            title=f"Evolución de {producto_seleccionado}",
-            barmode='group',
-            yaxis_title=f"Cantidad ({prod_data['UM']})"
+        # Gráficos del producto seleccionado (los únicos que dependen del selector)
+        st.plotly_chart(cache_dashboard.figura(
+            ('producto', producto_seleccionado), version,
+            lambda: _figura_producto(prod_data, producto_seleccionado)
+        ), use_container_width=True)
+        
+        fig_tiempo = cache_dashboard.figura(
+            ('stock_tiempo', producto_seleccionado), version,
+            lambda: _figura_stock_tiempo(prod_data, producto_seleccionado)
         )
-        st.plotly_chart(fig_prod, use_container_width=True)
+        if fig_tiempo is not None:
+            st.plotly_chart(fig_tiempo, use_container_width=True)
     
     st.markdown("---")
     
@@ -691,118 +1003,334 @@ def mostrar_dashboard():
     
     with col1:
         st.subheader("📈 TOP 10 Productos con Más Stock")
-        top_stock = stock_actual_df.nlargest(10, 'stock_actual')
-        fig1 = px.bar(
-            top_stock,
-            x='stock_actual',
-            y='Producto',
-            orientation='h',
-            title="TOP 10 Stock Actual",
-            labels={'stock_actual': 'Cantidad', 'Producto': 'Producto'},
-            color='stock_actual',
-            color_continuous_scale='Blues'
-        )
-        st.plotly_chart(fig1, use_container_width=True)
+        st.plotly_chart(cache_dashboard.figura(('top_stock',), version, _figura_top_stock),
+                        use_container_width=True)
     
     with col2:
         st.subheader("📉 TOP 10 Productos con Más Salidas")
-        top_salidas = stock_actual_df.nlargest(10, 'total_salidas')
-        fig2 = px.bar(
-            top_salidas,
-            x='total_salidas',
-            y='Producto',
-            orientation='h',
-            title="TOP 10 Salidas",
-            labels={'total_salidas': 'Cantidad', 'Producto': 'Producto'},
-            color='total_salidas',
-            color_continuous_scale='Reds'
-        )
-        st.plotly_chart(fig2, use_container_width=True)
+        st.plotly_chart(cache_dashboard.figura(('top_salidas',), version, _figura_top_salidas),
+                        use_container_width=True)
     
     col3, col4 = st.columns(2)
     
     with col3:
-        st.subheader("⚠️ Stock Crítico (Menor a 100)")
-        stock_critico = stock_actual_df[stock_actual_df['stock_actual'] < 100].nsmallest(10, 'stock_actual')
-        if not stock_critico.empty:
-            fig3 = px.bar(
-                stock_critico,
-                x='stock_actual',
-                y='Producto',
-                orientation='h',
-                title="Productos con Stock Crítico",
-                labels={'stock_actual': 'Cantidad', 'Producto': 'Producto'},
-                color='stock_actual',
-                color_continuous_scale='Oranges'
-            )
+        st.subheader("⚠️ Stock Crítico (Bajo su Umbral)")
+        fig3 = cache_dashboard.figura(('stock_critico',), version, _figura_stock_critico)
+        if fig3 is not None:
+            st.caption(f"{rankings_stock.contar_criticos(base_datos.obtener_conexion())} productos bajo su umbral "
+                       f"(por defecto {rankings_stock.UMBRAL_CRITICO_DEFECTO})")
             st.plotly_chart(fig3, use_container_width=True)
         else:
             st.success("✅ No hay productos con stock crítico")
+        mostrar_umbrales_criticos(stock_actual_df)
     
     with col4:
         st.subheader("🔄 TOP 10 Rotación de Inventario")
-        top_rotacion = stock_actual_df.nlargest(10, 'rotacion_inventario')
-        fig4 = px.bar(
-            top_rotacion,
-            x='rotacion_inventario',
-            y='Producto',
-            orientation='h',
-            title="Mayor Rotación",
-            labels={'rotacion_inventario': 'Índice de Rotación', 'Producto': 'Producto'},
-            color='rotacion_inventario',
-            color_continuous_scale='Greens'
-        )
-        st.plotly_chart(fig4, use_container_width=True)
+        st.plotly_chart(cache_dashboard.figura(('rotacion',), version, _figura_rotacion),
+                        use_container_width=True)
+    
+    mostrar_ruptura_estimada(version)
     
     # Stock Inicial vs Stock Actual
     st.subheader("📊 Stock Inicial vs Stock Actual por Producto")
-    fig5 = go.Figure()
-    fig5.add_trace(go.Bar(
-        name='Stock Inicial',
-        x=stock_actual_df['Producto'].head(15),
-        y=stock_actual_df['Stock inicial'].head(15),
-        marker_color='lightblue'
-    ))
-    fig5.add_trace(go.Bar(
-        name='Stock Actual',
-        x=stock_actual_df['Producto'].head(15),
-        y=stock_actual_df['stock_actual'].head(15),
-        marker_color='darkblue'
-    ))
-    fig5.update_layout(
-        title="Comparación Stock Inicial vs Actual (Top 15 productos)",
-        barmode='group',
-        xaxis_title="Producto",
-        yaxis_title="Cantidad",
-        xaxis_tickangle=-45
-    )
-    st.plotly_chart(fig5, use_container_width=True)
+    st.plotly_chart(cache_dashboard.figura(('inicial_vs_actual',), version,
+                                           lambda: _figura_inicial_vs_actual(stock_actual_df)),
+                    use_container_width=True)
     
     # Variación de Stock
     st.subheader("📉 Variación de Stock por Producto")
-    stock_actual_df_sorted = stock_actual_df.sort_values('variacion_stock', ascending=False).head(15)
-    fig6 = px.bar(
-        stock_actual_df_sorted,
-        x='Producto',
-        y='variacion_stock',
-        title="Variación de Stock (Top 15)",
-        labels={'variacion_stock': 'Variación', 'Producto': 'Producto'},
-        color='variacion_stock',
-        color_continuous_scale='RdYlGn'
-    )
-    fig6.update_layout(xaxis_tickangle=-45)
-    st.plotly_chart(fig6, use_container_width=True)
+    st.plotly_chart(cache_dashboard.figura(('variacion',), version, lambda: _figura_variacion(stock_actual_df)),
+                    use_container_width=True)
     
     # Distribución por Sistema
     st.subheader("🗂️ Distribución por Sistema")
-    sistema_counts = stock_actual_df.groupby('SISTEMA')['stock_actual'].sum().reset_index()
-    fig7 = px.pie(
-        sistema_counts,
-        values='stock_actual',
-        names='SISTEMA',
-        title="Stock Actual por Sistema"
+    st.plotly_chart(cache_dashboard.figura(('sistemas',), version, _figura_sistemas),
+                    use_container_width=True)
+
+TOP_TENDENCIAS = 8
+DIMENSIONES_TENDENCIA = {"Producto": 'codigo', "SISTEMA": 'sistema', "Departamento": 'departamento'}
+
+def mostrar_tendencias():
+    """Consumo a lo largo del tiempo desde los acumulados diarios/semanales"""
+    st.header("📈 Tendencias de Movimientos")
+    
+    conn = base_datos.obtener_conexion()
+    primero, ultimo = rollups_movimientos.rango_fechas(conn)
+    if primero is None:
+        st.info("No hay movimientos con fecha para mostrar.")
+        return
+    primero = datetime.strptime(primero, '%Y-%m-%d').date()
+    ultimo = datetime.strptime(ultimo, '%Y-%m-%d').date()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        rango = st.date_input("Rango de fechas", value=(max(primero, ultimo - timedelta(days=90)), ultimo),
+                              min_value=primero, max_value=ultimo, key="tendencias_rango")
+    with col2:
+        periodo = st.radio("Agrupar por", ["Día", "Semana"], horizontal=True, key="tendencias_periodo")
+    with col3:
+        dimension = st.selectbox("Desglose", list(DIMENSIONES_TENDENCIA), key="tendencias_dimension")
+    with col4:
+        columna = st.radio("Movimiento", ["salidas", "entradas"], horizontal=True, key="tendencias_columna",
+                           format_func=str.capitalize)
+    
+    if not (isinstance(rango, (tuple, list)) and len(rango) == 2):
+        st.info("Selecciona la fecha final del rango.")
+        return
+    desde, hasta = rango[0].isoformat(), rango[1].isoformat()
+    dimension = DIMENSIONES_TENDENCIA[dimension]
+    if dimension == 'departamento' and columna == 'entradas':
+        st.info("Las entradas no tienen departamento.")
+        return
+    
+    # Nombres de producto para la leyenda
+    nombres = {}
+    if dimension == 'codigo' and not st.session_state.stock_data.empty:
+        nombres = dict(zip(st.session_state.stock_data['Codigo'].astype(str),
+                           st.session_state.stock_data['Producto'].astype(str)))
+    
+    version = version_dashboard()
+    fig = cache_dashboard.figura(
+        ('tendencia', dimension, 'dia' if periodo == "Día" else 'semana', desde, hasta, columna), version,
+        lambda: _figura_tendencia(dimension, 'dia' if periodo == "Día" else 'semana', desde, hasta, columna, nombres)
+    )
+    if fig is None:
+        st.info("No hay movimientos en el rango seleccionado.")
+        return
+    st.caption(f"Los {TOP_TENDENCIAS} con más {columna} en el rango")
+    st.plotly_chart(fig, use_container_width=True)
+
+def _figura_top_sitios(departamento):
+    """TOP de sitios por cantidad despachada (de todos o de un departamento)"""
+    top = consumo_sitios.top_sitios(base_datos.obtener_conexion(), departamento)
+    if top.empty:
+        return None
+    top['etiqueta'] = top['cod_sitio'] + ' - ' + top['sitio'].fillna('')
+    return px.bar(
+        top,
+        x='cantidad',
+        y='etiqueta',
+        orientation='h',
+        title=f"TOP {consumo_sitios.TOP_SITIOS} Sitios por Cantidad" + (f" ({departamento or consumo_sitios.SIN_DATO})" if departamento is not None else ""),
+        labels={'cantidad': 'Cantidad', 'etiqueta': 'Sitio', 'departamento': 'Departamento'},
+        hover_data=['departamento', 'salidas'],
+        color='cantidad',
+        color_continuous_scale='Oranges'
+    ).update_yaxes(categoryorder='total ascending')
+
+def _figura_mapa(largo, columnas, titulo, etiqueta_x):
+    """Mapa de calor departamento × `columnas` a partir de la tabla en formato largo"""
+    if largo.empty:
+        return None
+    tabla = largo.pivot_table(index='departamento', columns=columnas, values='cantidad', aggfunc='sum', fill_value=0)
+    tabla = tabla.loc[tabla.sum(axis=1).sort_values(ascending=False).index]
+    return px.imshow(
+        tabla,
+        aspect='auto',
+        color_continuous_scale='YlOrRd',
+        title=titulo,
+        labels={'x': etiqueta_x, 'y': 'Departamento', 'color': 'Cantidad'}
+    ).update_layout(height=max(400, 22 * len(tabla)))
+
+def _figura_productos_sitio(productos, sitio):
+    return px.bar(
+        productos.head(consumo_sitios.TOP_SITIOS),
+        x='cantidad',
+        y='producto',
+        orientation='h',
+        title=f"Productos despachados a {sitio}",
+        labels={'cantidad': 'Cantidad', 'producto': 'Producto', 'sistema': 'SISTEMA'},
+        color='sistema'
+    ).update_yaxes(categoryorder='total ascending')
+
+def mostrar_sitios():
+    """Consumo por departamento y sitio desde los agregados de consumo_sitios"""
+    st.header("📍 Consumo por Sitio y Departamento")
+    
+    conn = base_datos.obtener_conexion()
+    version = version_dashboard()
+    departamentos = cache_dashboard.obtener(('sitios', 'departamentos'), version,
+                                            lambda: consumo_sitios.por_departamento(conn))
+    if departamentos.empty:
+        st.info("No hay salidas registradas")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("🗺️ Departamentos", len(departamentos))
+    with col2:
+        st.metric("📍 Sitios con salidas", f"{int(departamentos['sitios'].sum()):,}")
+    with col3:
+        st.metric("📤 Cantidad despachada", f"{departamentos['cantidad'].sum():,.2f}")
+    
+    # TOP sitios (general o de un departamento)
+    filtro = st.selectbox("Departamento para el TOP de sitios", ["Todos"] + departamentos['departamento'].tolist(),
+                          key="sitios_top_departamento")
+    departamento_top = None if filtro == "Todos" else (
+        '' if filtro == consumo_sitios.SIN_DATO else filtro)
+    fig = cache_dashboard.figura(('sitios', 'top', departamento_top), version,
+                                 lambda: _figura_top_sitios(departamento_top))
+    if fig is not None:
+        st.plotly_chart(fig, use_container_width=True)
+    
+    # Mapas de calor por departamento
+    st.markdown("---")
+    st.subheader("🌡️ Consumo por Departamento")
+    tab1, tab2, tab3 = st.tabs(["Por SISTEMA", "Por mes", "Tabla"])
+    with tab1:
+        fig = cache_dashboard.figura(('sitios', 'mapa_sistemas'), version, lambda: _figura_mapa(
+            consumo_sitios.mapa_sistemas(conn), 'sistema', "Cantidad por Departamento y SISTEMA", 'SISTEMA'))
+        if fig is not None:
+            st.plotly_chart(fig, use_container_width=True)
+    with tab2:
+        fig = cache_dashboard.figura(('sitios', 'mapa_meses'), version, lambda: _figura_mapa(
+            consumo_sitios.mapa_meses(conn), 'mes',
+            f"Cantidad por Departamento y Mes (últimos {consumo_sitios.MESES_MAPA})", 'Mes'))
+        if fig is not None:
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No hay salidas con fecha para mostrar.")
+    with tab3:
+        st.dataframe(departamentos, use_container_width=True, hide_index=True)
+    
+    # Drill-down: departamento -> sitio -> producto
+    st.markdown("---")
+    st.subheader("🔍 Detalle por Sitio")
+    col1, col2 = st.columns(2)
+    with col1:
+        elegido = st.selectbox("Departamento", departamentos['departamento'].tolist(), key="sitios_departamento")
+    departamento = '' if elegido == consumo_sitios.SIN_DATO else elegido
+    sitios = cache_dashboard.obtener(('sitios', 'de_departamento', departamento), version,
+                                     lambda: consumo_sitios.top_sitios(conn, departamento, k=None))
+    with col2:
+        opciones = sitios['cod_sitio'].tolist()
+        nombres = dict(zip(sitios['cod_sitio'], sitios['sitio'].fillna('')))
+        cod_sitio = st.selectbox(f"Sitio ({len(opciones)}, de mayor a menor consumo)", opciones,
+                                 format_func=lambda c: f"{c} - {nombres.get(c, '')}", key="sitios_sitio")
+    if cod_sitio is None:
+        return
+    
+    clave_sitio = '' if cod_sitio == consumo_sitios.SIN_DATO else cod_sitio
+    productos = cache_dashboard.obtener(('sitios', 'productos', departamento, clave_sitio), version,
+                                        lambda: consumo_sitios.productos_sitio(conn, departamento, clave_sitio))
+    if productos.empty:
+        st.info("El sitio no tiene salidas")
+        return
+    productos = productos.assign(producto=productos['producto'].fillna(productos['codigo']))
+    
+    nombre_sitio = f"{cod_sitio} - {nombres.get(cod_sitio, '')}"
+    fig = cache_dashboard.figura(('sitios', 'productos', departamento, clave_sitio), version,
+                                 lambda: _figura_productos_sitio(productos, nombre_sitio))
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(productos, use_container_width=True, hide_index=True)
+
+def _descartar_seleccion(tabla):
+    """Cambia la clave de la tabla de la lista: la próxima ejecución la muestra sin filas seleccionadas"""
+    clave_nonce = f"{tabla}_seleccion_nonce"
+    anterior = st.session_state.get(clave_nonce, 0)
+    for clave in [c for c in st.session_state if str(c).startswith(f"{tabla}_tabla_") and str(c).endswith(f"_{anterior}")]:
+        del st.session_state[clave]
+    st.session_state[clave_nonce] = anterior + 1
+
+def mostrar_lista_movimientos(tabla):
+    """Lista paginada de entradas o salidas, con filtros aplicados en SQLite"""
+    es_salida = tabla == 'salidas'
+    
+    # Filtros
+    with st.expander("🔎 Filtros"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            usar_fechas = st.checkbox("Filtrar por fecha", key=f"{tabla}_filtro_usar_fechas")
+            hoy = datetime.now().date()
+            rango = st.date_input("Rango de fechas", value=(hoy - timedelta(days=30), hoy),
+                                  key=f"{tabla}_filtro_fechas", disabled=not usar_fechas)
+        with col2:
+            opciones_productos = [""] + st.session_state.stock_data['Producto'].tolist() if not st.session_state.stock_data.empty else [""]
+            producto = st.selectbox("Producto", opciones_productos, key=f"{tabla}_filtro_producto")
+        with col3:
+            documento = st.text_input("N° Guía" if es_salida else "Orden de Compra",
+                                      placeholder="Empieza con...", key=f"{tabla}_filtro_documento")
+            sitio = st.text_input("Sitio o código de sitio", placeholder="Empieza con...",
+                                  key=f"{tabla}_filtro_sitio") if es_salida else ""
+    
+    filtros = {'producto': producto, 'documento': documento.strip(), 'sitio': sitio.strip()}
+    if usar_fechas and isinstance(rango, (tuple, list)) and len(rango) == 2:
+        filtros['fecha_desde'], filtros['fecha_hasta'] = rango
+    
+    # La selección de la tabla son posiciones de fila: si cambian los filtros
+    # apuntarían a otros registros, así que se descarta
+    if st.session_state.get(f"{tabla}_filtros_seleccion") != filtros:
+        st.session_state[f"{tabla}_filtros_seleccion"] = filtros
+        _descartar_seleccion(tabla)
+    
+    mensaje = st.session_state.pop(f"{tabla}_mensaje_eliminacion", None)
+    if mensaje:
+        st.success(mensaje)
+    
+    # Paginación
+    col_tam, col_info = st.columns([1, 3])
+    with col_tam:
+        por_pagina = st.selectbox("Registros por página", [25, 50, 100], key=f"{tabla}_por_pagina")
+    
+    total = contar_movimientos(tabla, filtros)
+    if total == 0:
+        hay_filtros = any(filtros.values())
+        st.info("No hay registros que coincidan con los filtros." if hay_filtros
+                else f"No hay {tabla} registradas aún.")
+        return
+    
+    total_paginas = (total + por_pagina - 1) // por_pagina
+    clave_pagina = f"{tabla}_pagina"
+    pagina = min(max(st.session_state.get(clave_pagina, 1), 1), total_paginas)
+    st.session_state[clave_pagina] = pagina
+    
+    with col_info:
+        st.caption(f"{total} registros · Página {pagina} de {total_paginas}")
+    
+    df = consultar_movimientos(tabla, filtros, por_pagina, (pagina - 1) * por_pagina)
+    
+    if es_salida:
+        columnas = ['id', 'nro_guia', 'nro_tarea', 'fecha', 'cod_sitio', 'sitio', 'departamento',
+                    'codigo', 'producto', 'code_indra', 'descripcion', 'cantidad', 'um', 'sistema']
+    else:
+        columnas = ['id', 'orden_compra', 'fecha', 'codigo', 'producto', 'cantidad', 'um', 'sistema',
+                    'almacen_salida', 'fecha_envio', 'responsable_envio',
+                    'almacen_recepcion', 'fecha_recepcion', 'responsable_recepcion']
+    df = df[[col for col in columnas if col in df.columns]]
+    
+    # Tabla compacta con selección de filas para eliminar
+    seleccion = st.dataframe(
+        df,
+        use_container_width=True,
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="multi-row",
+        key=f"{tabla}_tabla_{pagina}_{por_pagina}_{st.session_state.get(f'{tabla}_seleccion_nonce', 0)}"
     )
-    st.plotly_chart(fig7, use_container_width=True)
+    ids_seleccionados = df.iloc[seleccion.selection.rows]['id'].tolist() if seleccion else []
+    
+    col_ant, col_sig, col_del = st.columns([1, 1, 2])
+    with col_ant:
+        if st.button("◀ Anterior", key=f"{tabla}_anterior", disabled=pagina <= 1, use_container_width=True):
+            st.session_state[clave_pagina] = pagina - 1
+            st.rerun()
+    with col_sig:
+        if st.button("Siguiente ▶", key=f"{tabla}_siguiente", disabled=pagina >= total_paginas, use_container_width=True):
+            st.session_state[clave_pagina] = pagina + 1
+            st.rerun()
+    with col_del:
+        if st.button(f"🗑️ Eliminar seleccionados ({len(ids_seleccionados)})", key=f"{tabla}_eliminar",
+                     disabled=not ids_seleccionados, use_container_width=True):
+            for registro_id in ids_seleccionados:
+                if es_salida:
+                    eliminar_salida(int(registro_id))
+                else:
+                    eliminar_entrada(int(registro_id))
+            # Las filas de abajo suben a las posiciones seleccionadas: limpiar la selección
+            _descartar_seleccion(tabla)
+            st.session_state[f"{tabla}_mensaje_eliminacion"] = (
+                f"✅ {len(ids_seleccionados)} registros eliminados de la base de datos")
+            st.rerun()
 
 def main():
     # Título principal
@@ -813,7 +1341,7 @@ def main():
     st.sidebar.title("📋 Navegación")
     pagina = st.sidebar.radio(
         "Selecciona una página:",
-        ["🏠 Panel Principal", "📊 Dashboard", "📥 Entradas", "📤 Salidas"]
+        ["🏠 Panel Principal", "📊 Dashboard", "📈 Tendencias", "📍 Sitios", "📥 Entradas", "📤 Salidas"]
     )
     
     # Sistema de Backups en sidebar
@@ -835,46 +1363,49 @@ def main():
     
     with col2:
         if st.button("📥 Export Excel", use_container_width=True):
-            with st.spinner("Exportando..."):
-                archivo = exportar_excel_completo()
-                if archivo:
-                    with open(archivo, 'rb') as f:
-                        st.sidebar.download_button(
-                            label="⬇️ Descargar",
-                            data=f,
-                            file_name=archivo.name,
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
-                    st.sidebar.success(f"✅ Excel generado")
-    
-    # Botón de exportación completa
+            iniciar_exportacion('xlsx')
+    
+    # Estado de la sincronización con GitHub
     st.sidebar.markdown("---")
-    if st.sidebar.button("📥 Exportar TODO a Excel", type="primary", use_container_width=True):
-        try:
-            archivo = exportar_excel_completo()
-            if archivo:
-                with open(archivo, 'rb') as f:
-                    st.sidebar.download_button(
-                        label="⬇️ Descargar Excel Completo",
-                        data=f,
-                        file_name=archivo.name,
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        use_container_width=True
-                    )
-                total_registros = total_entradas + total_salidas
-                st.sidebar.success(f"✅ Excel con {total_registros} registros")
-        except Exception as e:
-            st.sidebar.error(f"❌ Error: {str(e)}")
+    st.sidebar.subheader("☁️ Sincronización GitHub")
+    estado_sync = obtener_cola_sincronizacion().estado()
+    if estado_sync['sincronizando']:
+        st.sidebar.info("🔄 Sincronizando...")
+    elif estado_sync['ultimo_error']:
+        proximo = estado_sync['proximo_intento']
+        reintento = f"\n- Reintento: {proximo.strftime('%H:%M:%S')}" if proximo else ""
+        st.sidebar.warning(f"⚠️ **Error de sincronización** (intento {estado_sync['intentos']})\n"
+                           f"- {estado_sync['ultimo_error'][:100]}{reintento}")
+    elif estado_sync['pendientes']:
+        st.sidebar.info(f"⏳ {estado_sync['pendientes']} cambios pendientes de sincronizar")
+    else:
+        st.sidebar.success("✅ Todo sincronizado")
+    if estado_sync['ultimo_exito']:
+        st.sidebar.caption(f"Última sincronización: {estado_sync['ultimo_exito'].strftime('%d/%m/%Y %H:%M:%S')}")
+    if estado_sync['pendientes'] and st.sidebar.button("🔄 Sincronizar ahora", use_container_width=True):
+        obtener_cola_sincronizacion().forzar()
+        st.sidebar.info("Sincronización solicitada")
+    
+    # Exportación completa (en segundo plano, con avance)
+    st.sidebar.markdown("---")
+    formatos = {"Excel (.xlsx)": 'xlsx', "CSV (.zip, más rápido)": 'csv'}
+    if exportador.hay_parquet():
+        formatos["Parquet (.zip)"] = 'parquet'
+    formato_export = st.sidebar.selectbox("Formato de exportación", list(formatos))
+    if st.sidebar.button("📥 Exportar TODO", type="primary", use_container_width=True):
+        iniciar_exportacion(formatos[formato_export])
+    with st.sidebar:
+        mostrar_exportacion()
     
     # Panel Principal
     if pagina == "🏠 Panel Principal":
         st.header("📊 Resumen General")
         
         # Calcular métricas
-        stock_actual_df = calcular_stock_actual()
-        total_entradas_cant = st.session_state.entradas['cantidad'].sum() if not st.session_state.entradas.empty else 0
-        total_salidas_cant = st.session_state.salidas['cantidad'].sum() if not st.session_state.salidas.empty else 0
+        stock_actual_df = obtener_stock_actual()
+        totales = cargar_totales_stock()
+        total_entradas_cant = totales['total_entradas'].sum() if not totales.empty else 0
+        total_salidas_cant = totales['total_salidas'].sum() if not totales.empty else 0
         stock_total_inicial = stock_actual_df['Stock inicial'].sum() if not stock_actual_df.empty else 0
         stock_total_actual = stock_actual_df['stock_actual'].sum() if not stock_actual_df.empty else 0
         
@@ -916,6 +1447,14 @@ def main():
     elif pagina == "📊 Dashboard":
         mostrar_dashboard()
     
+    # Tendencias
+    elif pagina == "📈 Tendencias":
+        mostrar_tendencias()
+    
+    # Consumo por sitio
+    elif pagina == "📍 Sitios":
+        mostrar_sitios()
+    
     # Página de Entradas
     elif pagina == "📥 Entradas":
         st.header("📥 Gestión de Entradas")
@@ -939,16 +1478,11 @@ def main():
                 producto_seleccionado = st.selectbox("Producto *", opciones_productos, key=f"entrada_producto_{form_key}")
                 
                 if producto_seleccionado:
-                    # Buscar el código correspondiente
-                    fila = st.session_state.stock_data[st.session_state.stock_data['Producto'] == producto_seleccionado]
-                    if not fila.empty:
-                        codigo_auto = fila.iloc[0]['Codigo']
-                        um_auto = fila.iloc[0]['UM']
-                        sistema_auto = fila.iloc[0]['SISTEMA']
-                    else:
-                        codigo_auto = ''
-                        um_auto = ''
-                        sistema_auto = ''
+                    # Buscar el código correspondiente (índice hash)
+                    datos_producto = obtener_datos_producto(producto_seleccionado)
+                    codigo_auto = datos_producto.get('codigo', '')
+                    um_auto = datos_producto.get('um', '')
+                    sistema_auto = datos_producto.get('sistema', '')
                 else:
                     codigo_auto = ''
                     um_auto = ''
@@ -1012,36 +1546,7 @@ def main():
         
         with tab2:
             st.subheader("📋 Lista de Entradas Registradas")
-            
-            if st.session_state.entradas.empty:
-                st.info("No hay entradas registradas aún.")
-            else:
-                for idx, entrada in st.session_state.entradas.iterrows():
-                    with st.expander(f"📦 OC: {entrada['orden_compra']} - {entrada['producto']} - Cantidad: {entrada['cantidad']} {entrada['um']}"):
-                        col1, col2, col3 = st.columns(3)
-                        
-                        with col1:
-                            st.write(f"**Fecha:** {entrada.get('fecha', 'N/A')}")
-                            st.write(f"**Código:** {entrada.get('codigo', 'N/A')}")
-                            st.write(f"**Producto:** {entrada.get('producto', 'N/A')}")
-                            st.write(f"**Cantidad:** {entrada.get('cantidad', 'N/A')} {entrada.get('um', '')}")
-                        
-                        with col2:
-                            st.write(f"**Sistema:** {entrada.get('sistema', 'N/A')}")
-                            st.write(f"**Almacén Salida:** {entrada.get('almacen_salida', 'N/A')}")
-                            st.write(f"**Fecha Envío:** {entrada.get('fecha_envio', 'N/A')}")
-                            st.write(f"**Responsable Envío:** {entrada.get('responsable_envio', 'N/A')}")
-                        
-                        with col3:
-                            st.write(f"**Almacén Recepción:** {entrada.get('almacen_recepcion', 'N/A')}")
-                            st.write(f"**Fecha Recepción:** {entrada.get('fecha_recepcion', 'N/A')}")
-                            st.write(f"**Responsable Recepción:** {entrada.get('responsable_recepcion', 'N/A')}")
-                        
-                        # Clave única con idx y fecha para evitar duplicados
-                        if st.button(f"🗑️ Eliminar", key=f"del_ent_{entrada['id']}_{idx}_{entrada.get('fecha', '')}"):
-                            eliminar_entrada(entrada['id'])
-                            st.success("✅ Entrada eliminada de la base de datos")
-                            st.rerun()
+            mostrar_lista_movimientos('entradas')
     
     # Página de Salidas
     elif pagina == "📤 Salidas":
@@ -1093,16 +1598,11 @@ def main():
                 producto_salida_seleccionado = st.selectbox("Producto *", opciones_productos, key=f"salida_producto_{form_key}")
                 
                 if producto_salida_seleccionado:
-                    # Buscar el código correspondiente
-                    fila = st.session_state.stock_data[st.session_state.stock_data['Producto'] == producto_salida_seleccionado]
-                    if not fila.empty:
-                        codigo_salida_auto = fila.iloc[0]['Codigo']
-                        um_salida_auto = fila.iloc[0]['UM']
-                        sistema_salida_auto = fila.iloc[0]['SISTEMA']
-                    else:
-                        codigo_salida_auto = ''
-                        um_salida_auto = ''
-                        sistema_salida_auto = ''
+                    # Buscar el código correspondiente (índice hash)
+                    datos_producto = obtener_datos_producto(producto_salida_seleccionado)
+                    codigo_salida_auto = datos_producto.get('codigo', '')
+                    um_salida_auto = datos_producto.get('um', '')
+                    sistema_salida_auto = datos_producto.get('sistema', '')
                 else:
                     codigo_salida_auto = ''
                     um_salida_auto = ''
@@ -1161,38 +1661,7 @@ def main():
         
         with tab2:
             st.subheader("📋 Lista de Salidas Registradas")
-            
-            if st.session_state.salidas.empty:
-                st.info("No hay salidas registradas aún.")
-            else:
-                for idx, salida in st.session_state.salidas.iterrows():
-                    with st.expander(f"📤 Guía: {salida['nro_guia']} - {salida['producto']} - Sitio: {salida['sitio']} - Cantidad: {salida['cantidad']} {salida['um']}"):
-                        col1, col2, col3 = st.columns(3)
-                        
-                        with col1:
-                            st.write(f"**N° Guía:** {salida.get('nro_guia', 'N/A')}")
-                            st.write(f"**N° Tarea:** {salida.get('nro_tarea', 'N/A')}")
-                            st.write(f"**Fecha:** {salida.get('fecha', 'N/A')}")
-                            st.write(f"**Cod Sitio:** {salida.get('cod_sitio', 'N/A')}")
-                            st.write(f"**Sitio:** {salida.get('sitio', 'N/A')}")
-                        
-                        with col2:
-                            st.write(f"**Departamento:** {salida.get('departamento', 'N/A')}")
-                            st.write(f"**Código:** {salida.get('codigo', 'N/A')}")
-                            st.write(f"**Producto:** {salida.get('producto', 'N/A')}")
-                            st.write(f"**CODE INDRA:** {salida.get('code_indra', 'N/A')}")
-                            st.write(f"**Descripción:** {salida.get('descripcion', 'N/A')}")
-                        
-                        with col3:
-                            st.write(f"**Cantidad:** {salida.get('cantidad', 'N/A')} {salida.get('um', '')}")
-                            st.write(f"**UM:** {salida.get('um', 'N/A')}")
-                            st.write(f"**Sistema:** {salida.get('sistema', 'N/A')}")
-                        
-                        # Clave única con idx y fecha para evitar duplicados
-                        if st.button(f"🗑️ Eliminar", key=f"del_sal_{salida['id']}_{idx}_{salida.get('fecha', '')}"):
-                            eliminar_salida(salida['id'])
-                            st.success("✅ Salida eliminada de la base de datos")
-                            st.rerun()
+            mostrar_lista_movimientos('salidas')
 
 if __name__ == "__main__":
     # Inicializar BD
@@ -1200,6 +1669,15 @@ if __name__ == "__main__":
     
     # RESTAURAR DATOS desde JSON si la BD está vacía
     restaurar_desde_json_local()
+    if 'imagen_no_utilizable' in st.session_state:
+        # Sin detenerse aquí, los movimientos nuevos entrarían en una base incompleta
+        st.error(f"❌ No se pudo restaurar la base desde la imagen ({st.session_state.pop('imagen_no_utilizable')}). "
+                 "La aplicación queda detenida para no perder datos: sigue el plan de emergencia de "
+                 "RECUPERACION_EMERGENCIA.md.")
+        st.stop()
+    if 'restauracion_inicio' in st.session_state:
+        total, segundos = st.session_state.pop('restauracion_inicio')
+        st.toast(f"♻️ Base restaurada desde el respaldo: {total} registros en {segundos:.1f} s")
     
     # Ejecutar aplicación
     main()
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+CONEXIONES A LA BASE DE DATOS (inventario.db)
+=============================================
+Capa común de acceso a SQLite para app.py, gestionar_backups.py e importar_datos.py.
+
+- Journal WAL: los lectores no bloquean al escritor ni viceversa.
+- synchronous=NORMAL, caché de páginas más grande y busy_timeout para que dos
+  sesiones escribiendo a la vez esperen su turno en lugar de fallar con
+  "database is locked".
+- Una conexión reutilizable por hilo (cada sesión de Streamlit corre en su hilo),
+  con las sentencias de inserción fijas para que SQLite las tenga preparadas
+  en la caché de sentencias de la conexión.
+- Las escrituras usan BEGIN IMMEDIATE: el bloqueo de escritura se toma al inicio
+  de la transacción y no al promover una lectura, que es cuando busy_timeout
+  no puede ayudar.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta, timezone
+from pathlib import Path
+
+# Configuración
+DB_FILE = "inventario.db"
+BUSY_TIMEOUT_MS = 10000
+CACHE_SIZE_KB = 20000
+REINTENTOS_BLOQUEO = 3
+ZONA_PERU = timezone(timedelta(hours=-5))     # Hora de Perú (UTC-5), la que muestra la app
+
+COLUMNAS_ENTRADAS = [
+    'orden_compra', 'fecha', 'codigo', 'producto', 'cantidad', 'um', 'sistema',
+    'almacen_salida', 'fecha_envio', 'responsable_envio',
+    'almacen_recepcion', 'fecha_recepcion', 'responsable_recepcion',
+    'creado_por', 'fecha_creacion'
+]
+
+COLUMNAS_SALIDAS = [
+    'nro_guia', 'nro_tarea', 'fecha', 'cod_sitio', 'sitio', 'departamento',
+    'codigo', 'producto', 'code_indra', 'descripcion', 'cantidad', 'um', 'sistema',
+    'creado_por', 'fecha_creacion'
+]
+
+COLUMNAS = {'entradas': COLUMNAS_ENTRADAS, 'salidas': COLUMNAS_SALIDAS}
+
+# Sentencias fijas: al reutilizar la conexión, SQLite no vuelve a compilarlas
+SQL_INSERT = {
+    tabla: f"INSERT INTO {tabla} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+    for tabla, cols in COLUMNAS.items()
+}
+
+VALORES_POR_DEFECTO = {'cantidad': 0, 'creado_por': 'Usuario'}
+
+_local = threading.local()
+
+
+def conectar(db_file=DB_FILE):
+    """Abre una conexión nueva con WAL y los pragmas de rendimiento"""
+    conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           cached_statements=256)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def obtener_conexion(db_file=DB_FILE):
+    """Conexión reutilizable del hilo actual (no cerrarla: la administra el pool)"""
+    conexiones = getattr(_local, 'conexiones', None)
+    if conexiones is None:
+        conexiones = _local.conexiones = {}
+    clave = str(Path(db_file).resolve())
+    conn = conexiones.get(clave)
+    if conn is None:
+        conn = conexiones[clave] = conectar(db_file)
+    return conn
+
+
+def cerrar_conexiones():
+    """Cierra las conexiones del hilo actual (p. ej. antes de reemplazar el archivo)"""
+    conexiones = getattr(_local, 'conexiones', None) or {}
+    for conn in conexiones.values():
+        conn.close()
+    conexiones.clear()
+
+
+@contextmanager
+def transaccion(db_file=DB_FILE):
+    """Transacción de escritura (BEGIN IMMEDIATE) con commit/rollback automático"""
+    conn = obtener_conexion(db_file)
+    for intento in range(REINTENTOS_BLOQUEO):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            break
+        except sqlite3.OperationalError as e:
+            # busy_timeout ya esperó; un par de reintentos más antes de rendirse
+            if 'locked' not in str(e) or intento == REINTENTOS_BLOQUEO - 1:
+                raise
+            time.sleep(0.1 * (intento + 1))
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def insertar_movimiento(conn, tabla, datos):
+    """Inserta una entrada o salida con la sentencia preparada y devuelve su id"""
+    valores = tuple(datos.get(col, VALORES_POR_DEFECTO.get(col, '')) for col in COLUMNAS[tabla])
+    return conn.execute(SQL_INSERT[tabla], valores).lastrowid
+
+
+def leer_registro(conn, tabla, registro_id):
+    """Lee un registro por id como diccionario (None si no existe)"""
+    cursor = conn.execute(f"SELECT * FROM {tabla} WHERE id = ?", (registro_id,))
+    fila = cursor.fetchone()
+    if fila is None:
+        return None
+    columnas = [d[0] for d in cursor.description]
+    return dict(zip(columnas, fila))
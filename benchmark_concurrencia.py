@@ -0,0 +1,130 @@
+"""
+BENCHMARK DE CONCURRENCIA (SALIDAS SIMULTÁNEAS)
+===============================================
+Simula N operadores registrando salidas al mismo tiempo sobre una base
+temporal y compara dos modos de acceso:
+
+- legacy: una conexión nueva por operación, journal por defecto (como antes)
+- wal:    capa base_datos (WAL, conexión por hilo, BEGIN IMMEDIATE)
+
+Reporta throughput, latencia p50/p95 y cuántas operaciones fallaron con
+"database is locked". No toca inventario.db.
+
+USO:
+  python benchmark_concurrencia.py                       # 8 operadores x 200 salidas
+  python benchmark_concurrencia.py --operadores 16 --salidas 500
+"""
+
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import base_datos
+import esquema
+
+def preparar_base(db_file, wal):
+    """Crea la base de prueba con las mismas tablas y triggers que la app"""
+    conn = base_datos.conectar(db_file) if wal else sqlite3.connect(db_file)
+    esquema.inicializar(conn)
+    conn.close()
+
+
+def datos_salida(operador, n):
+    return {
+        'nro_guia': f"G-{operador}-{n}", 'nro_tarea': f"T-{n}", 'fecha': '01/01/2025',
+        'cod_sitio': f"S{n % 50:03}", 'sitio': 'Sitio prueba', 'departamento': 'LIMA',
+        'codigo': f"P{n % 200:04}", 'producto': 'Producto prueba', 'code_indra': '',
+        'descripcion': '', 'cantidad': 1,
+        'um': 'UND', 'sistema': 'RAN', 'creado_por': f"operador{operador}",
+        'fecha_creacion': '01/01/2025 10:00 AM'
+    }
+
+
+def salida_legacy(db_file, datos):
+    """Como lo hacía app.py: conectar, insertar, commit y cerrar"""
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.execute(base_datos.SQL_INSERT['salidas'],
+                     tuple(datos[col] for col in base_datos.COLUMNAS_SALIDAS))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def salida_wal(db_file, datos):
+    with base_datos.transaccion(db_file) as conn:
+        base_datos.insertar_movimiento(conn, 'salidas', datos)
+
+
+def operador(numero, salidas, db_file, funcion, latencias, errores, barrera):
+    barrera.wait()
+    for n in range(salidas):
+        inicio = time.perf_counter()
+        try:
+            funcion(db_file, datos_salida(numero, n))
+            latencias.append(time.perf_counter() - inicio)
+        except sqlite3.OperationalError as e:
+            errores.append(str(e))
+    if funcion is salida_wal:
+        base_datos.cerrar_conexiones()
+
+
+def ejecutar(modo, operadores, salidas, directorio):
+    db_file = str(Path(directorio) / f"benchmark_{modo}.db")
+    wal = modo == 'wal'
+    preparar_base(db_file, wal)
+    funcion = salida_wal if wal else salida_legacy
+
+    latencias, errores = [], []
+    barrera = threading.Barrier(operadores + 1)
+    hilos = [threading.Thread(target=operador,
+                              args=(i, salidas, db_file, funcion, latencias, errores, barrera))
+             for i in range(operadores)]
+    for hilo in hilos:
+        hilo.start()
+    barrera.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    conn = sqlite3.connect(db_file)
+    guardadas = conn.execute("SELECT COUNT(*) FROM salidas").fetchone()[0]
+    conn.close()
+
+    latencias.sort()
+    return {
+        'modo': modo,
+        'guardadas': guardadas,
+        'errores': len(errores),
+        'duracion': duracion,
+        'por_segundo': guardadas / duracion if duracion else 0,
+        'p50': statistics.median(latencias) * 1000 if latencias else 0,
+        'p95': latencias[int(len(latencias) * 0.95) - 1] * 1000 if latencias else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de salidas concurrentes')
+    parser.add_argument('--operadores', type=int, default=8, help='Hilos escribiendo a la vez')
+    parser.add_argument('--salidas', type=int, default=200, help='Salidas por operador')
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.operadores} operadores x {args.salidas} salidas")
+    print("=" * 70)
+    with tempfile.TemporaryDirectory() as directorio:
+        for modo in ('legacy', 'wal'):
+            r = ejecutar(modo, args.operadores, args.salidas, directorio)
+            print(f"{r['modo']:>7}: {r['guardadas']:6} guardadas en {r['duracion']:6.2f}s "
+                  f"({r['por_segundo']:7.1f}/s) | p50 {r['p50']:6.2f} ms | p95 {r['p95']:7.2f} ms "
+                  f"| bloqueos {r['errores']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
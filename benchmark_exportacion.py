@@ -0,0 +1,142 @@
+"""
+BENCHMARK DE EXPORTACIÓN
+========================
+Genera una base temporal con N salidas (por defecto 1.000.000) y mide cada
+forma de exportarla:
+
+- legacy:  pd.read_sql_query de las tablas completas + pd.ExcelWriter (como antes)
+- xlsx:    exportador por tramos con openpyxl write_only
+- csv:     exportador por tramos a .zip con CSV
+- parquet: exportador por tramos a .zip con Parquet (si pyarrow está instalado)
+
+Cada modo corre en un proceso aparte para medir su pico de memoria (RSS
+máximo). No toca inventario.db.
+
+USO:
+  python benchmark_exportacion.py                         # 1.000.000 salidas, todos los modos
+  python benchmark_exportacion.py --salidas 200000 --modos xlsx csv
+  python benchmark_exportacion.py --sin-legacy            # el modo legacy tarda mucho con 1M
+"""
+
+import argparse
+import multiprocessing
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import esquema
+import exportador
+
+try:
+    import resource
+except ImportError:  # Windows: sin medición de memoria
+    resource = None
+
+MODOS = ['legacy', 'xlsx', 'csv', 'parquet']
+
+
+def generar_base(db_file, salidas, entradas):
+    """Base con las tablas de la app (sin triggers: solo interesa la lectura)"""
+    conn = sqlite3.connect(db_file)
+    conn.executescript(esquema.ESQUEMA_TABLAS)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executemany(
+        "INSERT INTO entradas (orden_compra, fecha, codigo, producto, cantidad, um, sistema, "
+        "almacen_salida, fecha_envio, responsable_envio, almacen_recepcion, fecha_recepcion, "
+        "responsable_recepcion, creado_por, fecha_creacion) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((f"OC-{n}", f"2025-{n % 12 + 1:02}-{n % 28 + 1:02}", f"P{n % 2000:04}", f"Producto {n % 2000}",
+          float(n % 100 + 1), 'UND', 'RAN', 'Lima', None, None, 'Central', None, None, 'benchmark', None)
+         for n in range(entradas))
+    )
+    conn.executemany(
+        "INSERT INTO salidas (nro_guia, nro_tarea, fecha, cod_sitio, sitio, departamento, codigo, producto, "
+        "code_indra, descripcion, cantidad, um, sistema, creado_por, fecha_creacion) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((f"G-{n}", f"T-{n}", f"2025-{n % 12 + 1:02}-{n % 28 + 1:02}", f"S{n % 3000:04}", f"Sitio {n % 3000}",
+          'LIMA', f"P{n % 2000:04}", f"Producto {n % 2000}", '', '', float(n % 5 + 1), 'UND', 'RAN',
+          'benchmark', None)
+         for n in range(salidas))
+    )
+    conn.commit()
+    conn.close()
+
+
+def exportar_legacy(db_file, destino):
+    """Como lo hacían exportar_excel_completo y GestorBackups.exportar_excel"""
+    conn = sqlite3.connect(db_file)
+    entradas = pd.read_sql_query("SELECT * FROM entradas", conn)
+    salidas = pd.read_sql_query("SELECT * FROM salidas", conn)
+    conn.close()
+    with pd.ExcelWriter(destino, engine='openpyxl') as writer:
+        entradas[exportador.COLUMNAS_EXPORTACION['entradas']].to_excel(writer, sheet_name='Entradas', index=False)
+        salidas[exportador.COLUMNAS_EXPORTACION['salidas']].to_excel(writer, sheet_name='Salidas', index=False)
+
+
+def _medir(modo, db_file, directorio, cola):
+    destino = Path(directorio) / f"export_{modo}{exportador.FORMATOS.get(modo, ('.xlsx',))[0]}"
+    inicio = time.perf_counter()
+    try:
+        if modo == 'legacy':
+            exportar_legacy(db_file, destino)
+        else:
+            exportador.exportar(destino, modo, db_file)
+        error = None
+    except Exception as e:
+        error = str(e)
+    duracion = time.perf_counter() - inicio
+    pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None
+    cola.put({
+        'modo': modo,
+        'segundos': duracion,
+        'pico_mb': pico_mb,
+        'mb_archivo': destino.stat().st_size / (1024 * 1024) if destino.exists() else 0,
+        'error': error
+    })
+
+
+def ejecutar(modo, db_file, directorio):
+    cola = multiprocessing.Queue()
+    proceso = multiprocessing.Process(target=_medir, args=(modo, db_file, directorio, cola))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de exportación a Excel/CSV/Parquet')
+    parser.add_argument('--salidas', type=int, default=1_000_000, help='Filas de salidas a generar')
+    parser.add_argument('--entradas', type=int, default=50_000, help='Filas de entradas a generar')
+    parser.add_argument('--modos', nargs='+', choices=MODOS, default=MODOS, help='Modos a medir')
+    parser.add_argument('--sin-legacy', action='store_true', help='Omitir el modo legacy')
+    args = parser.parse_args()
+
+    modos = [m for m in args.modos if not (m == 'legacy' and args.sin_legacy)]
+    if 'parquet' in modos and not exportador.hay_parquet():
+        print("⚠️  pyarrow no está instalado: se omite parquet")
+        modos.remove('parquet')
+
+    with tempfile.TemporaryDirectory() as directorio:
+        db_file = str(Path(directorio) / "benchmark_export.db")
+        inicio = time.perf_counter()
+        generar_base(db_file, args.salidas, args.entradas)
+        print(f"🧪 Base de prueba: {args.entradas} entradas + {args.salidas} salidas "
+              f"({time.perf_counter() - inicio:.1f}s)")
+        print("=" * 70)
+        for modo in modos:
+            r = ejecutar(modo, db_file, directorio)
+            if r['error']:
+                print(f"{r['modo']:>8}: ❌ {r['error']}")
+                continue
+            pico = f"{r['pico_mb']:8.1f} MB" if r['pico_mb'] is not None else "       n/d"
+            print(f"{r['modo']:>8}: {r['segundos']:7.1f}s | pico de memoria {pico} "
+                  f"| archivo {r['mb_archivo']:7.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+BITÁCORA DE CAMBIOS (PERSISTENCIA INCREMENTAL)
+==============================================
+Cada alta o baja se agrega como una línea JSON a backups_sistema/<tabla>_cambios.jsonl,
+así el costo de guardar es proporcional al cambio y no al tamaño de la tabla.
+
+Cada cierto número de cambios la bitácora se compacta: se reproduce sobre el
+snapshot (<tabla>_persist.json) y se vacía. Restaurar = snapshot + bitácora.
+La reproducción es idempotente (altas por id, bajas de ids inexistentes se ignoran),
+por lo que un corte entre escribir el snapshot y vaciar la bitácora no pierde datos.
+
+Formato del snapshot (secret SNAPSHOT_FORMATO):
+- "binario" (por defecto): la compactación escribe una imagen comprimida de la
+  base (inventario_imagen.bin, ver imagen_base.py) y vacía las bitácoras de
+  todas las tablas. Los <tabla>_persist.json dejan de actualizarse.
+- "ambos": además de la imagen se reescriben los JSON (legibles a mano).
+Al restaurar se usa la imagen si existe y es válida; si no, los JSON.
+"""
+
+import hashlib
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+# Configuración
+BACKUPS_DIR = Path("backups_sistema")
+UMBRAL_COMPACTACION = 500    # Cambios en la bitácora antes de compactar
+FORMATOS_SNAPSHOT = ("binario", "ambos")
+TAMANO_LECTURA = 1024 * 1024 # Caracteres por lectura al recorrer el snapshot
+TABLAS = ('entradas', 'salidas')
+
+_lock = threading.Lock()
+_hash_sincronizado = {}
+
+
+def archivo_snapshot(tabla):
+    """Ruta del snapshot completo de la tabla"""
+    return BACKUPS_DIR / f"{tabla}_persist.json"
+
+
+def archivo_imagen():
+    """Ruta de la imagen comprimida de la base (snapshot binario de todas las tablas)"""
+    return BACKUPS_DIR / "inventario_imagen.bin"
+
+
+def archivo_bitacora(tabla):
+    """Ruta de la bitácora de cambios de la tabla"""
+    return BACKUPS_DIR / f"{tabla}_cambios.jsonl"
+
+
+def _agregar(tabla, cambio):
+    BACKUPS_DIR.mkdir(exist_ok=True)
+    cambio['ts'] = datetime.now().isoformat(timespec='seconds')
+    linea = json.dumps(cambio, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        with open(archivo_bitacora(tabla), 'a', encoding='utf-8') as f:
+            f.write(linea)
+
+
+def registrar_insert(tabla, registro):
+    """Agrega a la bitácora el registro completo recién insertado"""
+    _agregar(tabla, {'op': 'insert', 'row': dict(registro)})
+
+
+def registrar_delete(tabla, registro_id):
+    """Agrega a la bitácora la eliminación de un id"""
+    _agregar(tabla, {'op': 'delete', 'id': int(registro_id)})
+
+
+def leer_bitacora(tabla):
+    """Lee los cambios de la bitácora (ignora una última línea truncada)"""
+    path = archivo_bitacora(tabla)
+    if not path.exists():
+        return []
+    cambios = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                cambios.append(json.loads(linea))
+            except json.JSONDecodeError:
+                print(f"⚠️ Línea inválida en {path.name}, se ignora")
+    return cambios
+
+
+def leer_snapshot(tabla):
+    """Lee el snapshot completo de la tabla (lista de registros)"""
+    path = archivo_snapshot(tabla)
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f) or []
+
+
+def reproducir(registros, cambios):
+    """Aplica una lista de cambios sobre una lista de registros y devuelve el resultado"""
+    por_id = {int(r['id']): r for r in registros if r.get('id') is not None}
+    sin_id = [r for r in registros if r.get('id') is None]
+    for cambio in cambios:
+        if cambio.get('op') == 'insert':
+            fila = cambio['row']
+            por_id[int(fila['id'])] = fila
+        elif cambio.get('op') == 'delete':
+            por_id.pop(int(cambio['id']), None)
+    # Mismo orden que cargar_*_db(): id descendente
+    return [por_id[i] for i in sorted(por_id, reverse=True)] + sin_id
+
+
+def cargar_registros(tabla):
+    """Estado actual de la tabla según snapshot + bitácora"""
+    with _lock:
+        return reproducir(leer_snapshot(tabla), leer_bitacora(tabla))
+
+
+def _objetos_json(path, tamano=TAMANO_LECTURA):
+    """Recorre un arreglo JSON `[{...}, {...}]` objeto por objeto sin cargarlo entero"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(tamano)
+        pos = 0
+        fin_archivo = not buffer
+        en_arreglo = False
+        while True:
+            # Saltar espacios y separadores; leer más si se acabó el buffer
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                if fin_archivo:
+                    return
+                buffer = f.read(tamano)
+                pos = 0
+                fin_archivo = not buffer
+                continue
+            if not en_arreglo:
+                if buffer.startswith('null', pos):
+                    return
+                if buffer[pos] != '[':
+                    raise ValueError(f"{Path(path).name} no es un arreglo JSON")
+                en_arreglo = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                objeto, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if fin_archivo:
+                    raise
+                # Objeto cortado al final del buffer: conservar el resto y leer más
+                mas = f.read(tamano)
+                fin_archivo = not mas
+                buffer = buffer[pos:] + mas
+                pos = 0
+                continue
+            yield objeto
+
+
+def iterar_registros(tabla):
+    """Igual que cargar_registros() pero de a un registro, leyendo el snapshot por partes.
+
+    La bitácora (pequeña) se lee primero; las filas del snapshot que ella borra
+    o reemplaza se saltan. Sin orden garantizado: pensado para volcar a la base.
+    """
+    with _lock:
+        cambios = leer_bitacora(tabla)
+    insertados = {}
+    borrados = set()
+    for cambio in cambios:
+        if cambio.get('op') == 'insert':
+            registro_id = int(cambio['row']['id'])
+            insertados[registro_id] = cambio['row']
+            borrados.discard(registro_id)
+        elif cambio.get('op') == 'delete':
+            registro_id = int(cambio['id'])
+            insertados.pop(registro_id, None)
+            borrados.add(registro_id)
+
+    sin_id = []
+    path = archivo_snapshot(tabla)
+    if path.exists():
+        for registro in _objetos_json(path):
+            if registro.get('id') is None:
+                sin_id.append(registro)
+                continue
+            registro_id = int(registro['id'])
+            if registro_id not in borrados and registro_id not in insertados:
+                yield registro
+    yield from insertados.values()
+    # Al final, como en reproducir(): reciben ids nuevos después de los existentes
+    yield from sin_id
+
+
+def existe_persistencia(tabla):
+    """True si hay imagen, snapshot o bitácora para la tabla"""
+    return archivo_imagen().exists() or archivo_snapshot(tabla).exists() or archivo_bitacora(tabla).exists()
+
+
+def _escribir_snapshot(tabla, registros):
+    snapshot = archivo_snapshot(tabla)
+    tmp = snapshot.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(registros, f, ensure_ascii=False, indent=2)
+    tmp.replace(snapshot)
+
+
+def _vaciar_bitacora(tabla):
+    with open(archivo_bitacora(tabla), 'w', encoding='utf-8'):
+        pass
+
+
+def compactar(tabla):
+    """Integra la bitácora en el snapshot y la vacía"""
+    with _lock:
+        cambios = leer_bitacora(tabla)
+        if not cambios and archivo_snapshot(tabla).exists():
+            return False
+        registros = reproducir(leer_snapshot(tabla), cambios)
+        _escribir_snapshot(tabla, registros)
+
+        # Vaciar la bitácora (si se corta aquí, reproducirla de nuevo es inocuo)
+        _vaciar_bitacora(tabla)
+
+    print(f"🗜️ Bitácora de {tabla} compactada: {len(cambios)} cambios, {len(registros)} registros")
+    return True
+
+
+def compactar_en_imagen(crear_imagen, con_json=False):
+    """Escribe la imagen de la base con `crear_imagen(path)` y vacía todas las bitácoras.
+
+    El lock se toma antes de la copia: un cambio confirmado en la base después
+    de la foto todavía no pudo escribir su línea, así que queda en la bitácora.
+    """
+    with _lock:
+        cambios = {tabla: leer_bitacora(tabla) for tabla in TABLAS}
+        if con_json:
+            for tabla in TABLAS:
+                _escribir_snapshot(tabla, reproducir(leer_snapshot(tabla), cambios[tabla]))
+        cabecera = crear_imagen(archivo_imagen())
+        for tabla in TABLAS:
+            _vaciar_bitacora(tabla)
+
+    print(f"🗜️ Bitácoras compactadas en la imagen: {sum(len(c) for c in cambios.values())} cambios, "
+          f"{archivo_imagen().stat().st_size / 1024:.0f} KB comprimidos ({cabecera['filas']})")
+    return True
+
+
+def compactar_si_necesario(tabla, umbral=UMBRAL_COMPACTACION, crear_imagen=None, con_json=False):
+    """Compacta la bitácora si superó el umbral de cambios.
+
+    Con `crear_imagen` el snapshot es la imagen binaria de la base; la primera
+    vez se crea aunque la bitácora no haya llegado al umbral.
+    """
+    if crear_imagen is not None and not archivo_imagen().exists():
+        return compactar_en_imagen(crear_imagen, con_json)
+    path = archivo_bitacora(tabla)
+    if not path.exists():
+        return False
+    with open(path, 'rb') as f:
+        lineas = sum(1 for _ in f)
+    if lineas < umbral:
+        return False
+    if crear_imagen is not None:
+        return compactar_en_imagen(crear_imagen, con_json)
+    return compactar(tabla)
+
+
+# ==================== CONTROL DE SINCRONIZACIÓN ====================
+
+def archivos_modificados():
+    """Archivos de persistencia cuyo contenido cambió desde la última sincronización.
+
+    Devuelve una lista de (path, contenido, hash). En una sincronización normal solo
+    cambia la bitácora (pequeña); el snapshot o la imagen solo se suben tras una compactación.
+    """
+    modificados = []
+    rutas = [archivo_imagen()] + [path for tabla in TABLAS for path in (archivo_snapshot(tabla), archivo_bitacora(tabla))]
+    with _lock:
+        for path in rutas:
+            if not path.exists():
+                continue
+            contenido = path.read_bytes()
+            # Mismo hash que usa Git para el blob, comparable con el SHA remoto
+            digest = hashlib.sha1(b"blob %d\0" % len(contenido) + contenido).hexdigest()
+            if _hash_sincronizado.get(str(path)) != digest:
+                modificados.append((path, contenido, digest))
+    return modificados
+
+
+def marcar_sincronizado(path, digest):
+    """Registra que el contenido con ese hash ya está en GitHub"""
+    _hash_sincronizado[str(path)] = digest
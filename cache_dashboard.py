@@ -0,0 +1,67 @@
+"""
+CACHÉ DEL DASHBOARD
+===================
+Caché a nivel de proceso, compartida por todas las sesiones de Streamlit, para
+lo que el dashboard calcula a partir de los datos: la tabla de stock actual y
+las figuras de Plotly ya serializadas a JSON.
+
+Cada entrada se guarda con la versión de los datos con que se construyó
+(contadores de `version_tablas` más el hash de Stock.xlsx). Mientras la versión
+no cambie, una nueva ejecución del script solo lee la entrada: cambiar el
+producto del selector no vuelve a armar los gráficos generales.
+
+Los valores son compartidos entre sesiones: no deben modificarse en su lugar.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+# Configuración
+MAX_ENTRADAS = 256    # Figuras por producto incluidas; se descartan las menos usadas
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def version_datos(conn, *extra):
+    """Versión de los datos: contadores por tabla y generación de la base, más `extra`"""
+    filas = conn.execute("SELECT tabla, version FROM version_tablas ORDER BY tabla").fetchall()
+    return tuple(filas) + extra
+
+
+def obtener(clave, version, construir):
+    """Valor cacheado para `clave` si se construyó con `version`; si no, `construir()`.
+
+    La construcción corre fuera del lock: dos sesiones pueden calcular la misma
+    entrada a la vez, pero ninguna espera a la otra.
+    """
+    with _lock:
+        entrada = _cache.get(clave)
+        if entrada and entrada[0] == version:
+            _cache.move_to_end(clave)
+            return entrada[1]
+
+    valor = construir()
+    with _lock:
+        _cache[clave] = (version, valor)
+        _cache.move_to_end(clave)
+        while len(_cache) > MAX_ENTRADAS:
+            _cache.popitem(last=False)
+    return valor
+
+
+def figura(clave, version, construir):
+    """Figura de Plotly lista para st.plotly_chart (dict), o None si `construir` devuelve None.
+
+    Se guarda el JSON de la figura: entregarla es un json.loads, sin volver a
+    pasar por plotly.express.
+    """
+    spec = obtener(('figura',) + tuple(clave), version,
+                   lambda: _serializar(construir()))
+    return json.loads(spec) if spec is not None else None
+
+
+def _serializar(fig):
+    return fig.to_json() if fig is not None else None
+
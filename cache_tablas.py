@@ -0,0 +1,153 @@
+"""
+CACHÉ EN MEMORIA DE ENTRADAS/SALIDAS
+====================================
+Cada sesión guarda su DataFrame de entradas y salidas y lo actualiza por deltas
+en lugar de releer la tabla completa después de cada cambio.
+
+La base de datos lleva un contador de versión por tabla (`version_tablas`) y un
+registro de ids borrados o modificados (`registros_modificados`), ambos
+mantenidos por triggers. Con eso una sesión sabe si su copia está vieja y trae
+solo las filas con id > último visto más las que cambiaron desde su versión.
+
+La fila especial 'generacion' cambia cada vez que el contenido de la base se
+reemplaza (restauración de un backup): las cachés la comparan y, si cambió,
+recargan todo en lugar de aplicar deltas de otra historia.
+"""
+
+import pandas as pd
+
+import base_datos
+
+ESQUEMA_VERSIONES = '''
+    CREATE TABLE IF NOT EXISTS version_tablas (
+        tabla TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO version_tablas (tabla, version) VALUES ('entradas', 0), ('salidas', 0);
+    INSERT OR IGNORE INTO version_tablas (tabla, version) VALUES ('generacion', abs(random()));
+
+    CREATE TABLE IF NOT EXISTS registros_modificados (
+        tabla TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        version INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_registros_modificados ON registros_modificados (tabla, version);
+'''
+
+TRIGGERS_TABLA = '''
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_insert AFTER INSERT ON {tabla} BEGIN
+        UPDATE version_tablas SET version = version + 1 WHERE tabla = '{tabla}';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_delete AFTER DELETE ON {tabla} BEGIN
+        UPDATE version_tablas SET version = version + 1 WHERE tabla = '{tabla}';
+        INSERT INTO registros_modificados (tabla, id, version)
+        SELECT '{tabla}', OLD.id, version FROM version_tablas WHERE tabla = '{tabla}';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_update AFTER UPDATE ON {tabla} BEGIN
+        UPDATE version_tablas SET version = version + 1 WHERE tabla = '{tabla}';
+        INSERT INTO registros_modificados (tabla, id, version)
+        SELECT '{tabla}', OLD.id, version FROM version_tablas WHERE tabla = '{tabla}';
+    END;
+'''
+
+TABLAS = ('entradas', 'salidas')
+
+
+def instalar(conn):
+    """Crea las tablas de control de versión y sus triggers"""
+    conn.executescript(ESQUEMA_VERSIONES)
+    for tabla in TABLAS:
+        conn.executescript(TRIGGERS_TABLA.format(tabla=tabla))
+
+
+def version_actual(conn, tabla):
+    """Contador de cambios de la tabla (sube con cada alta, baja o modificación)"""
+    fila = conn.execute("SELECT version FROM version_tablas WHERE tabla = ?", (tabla,)).fetchone()
+    return fila[0] if fila else 0
+
+
+def nueva_generacion(conn):
+    """Marca la base como reemplazada: todas las cachés harán una recarga completa"""
+    conn.execute("DELETE FROM registros_modificados")
+    conn.execute("INSERT OR REPLACE INTO version_tablas (tabla, version) VALUES ('generacion', abs(random()))")
+
+
+class CacheTabla:
+    """DataFrame de una tabla en memoria (orden id descendente), actualizado por deltas"""
+
+    def __init__(self, tabla, db_file):
+        self.tabla = tabla
+        self.db_file = db_file
+        self.df = None
+        self.version = -1
+        self.generacion = None
+        self.max_id = 0
+
+    def _recargar(self, conn, version, generacion):
+        self.df = pd.read_sql_query(f"SELECT * FROM {self.tabla} ORDER BY id DESC", conn)
+        self.max_id = int(self.df['id'].max()) if not self.df.empty else 0
+        self.version = version
+        self.generacion = generacion
+
+    def actualizar(self):
+        """Trae de la base solo lo que cambió desde la última versión vista.
+
+        Devuelve True si la copia en memoria cambió.
+        """
+        conn = base_datos.obtener_conexion(self.db_file)
+        version = version_actual(conn, self.tabla)
+        generacion = version_actual(conn, 'generacion')
+        if self.df is None or generacion != self.generacion or version < self.version:
+            # Primera carga, o la base fue reemplazada (p. ej. restauración)
+            self._recargar(conn, version, generacion)
+            return True
+        if version == self.version:
+            return False
+
+        modificados = [fila[0] for fila in conn.execute(
+            "SELECT DISTINCT id FROM registros_modificados WHERE tabla = ? AND version > ?",
+            (self.tabla, self.version)
+        )]
+        nuevos = pd.read_sql_query(
+            f"SELECT * FROM {self.tabla} WHERE id > ? ORDER BY id DESC", conn, params=(self.max_id,)
+        )
+        releidos = pd.DataFrame()
+        if modificados:
+            marcas = ','.join('?' * len(modificados))
+            releidos = pd.read_sql_query(
+                f"SELECT * FROM {self.tabla} WHERE id IN ({marcas})", conn, params=modificados
+            )
+
+        quitar = set(modificados) | set(nuevos['id'].tolist())
+        df = self.df[~self.df['id'].isin(quitar)] if quitar else self.df
+        partes = [p for p in (nuevos, releidos, df) if not p.empty]
+        df = pd.concat(partes, ignore_index=True) if partes else self.df.iloc[0:0]
+        if not releidos.empty:
+            df = df.sort_values('id', ascending=False, ignore_index=True)
+
+        self.df = df
+        if not nuevos.empty:
+            self.max_id = max(self.max_id, int(nuevos['id'].max()))
+        self.version = version
+        return True
+
+    def aplicar_insert(self, registro):
+        """Agrega en memoria la fila recién insertada (sin releer la tabla).
+
+        No mueve max_id: otra sesión pudo insertar ids menores que esta caché
+        todavía no trajo. El próximo actualizar() vuelve a leer esta fila y la
+        reemplaza en lugar de duplicarla.
+        """
+        if self.df is None:
+            return
+        fila = pd.DataFrame([registro])
+        self.df = pd.concat([fila, self.df[self.df['id'] != registro['id']]], ignore_index=True) \
+            if not self.df.empty else fila
+
+    def aplicar_delete(self, registro_id):
+        """Quita en memoria la fila eliminada (sin releer la tabla)"""
+        if self.df is None or self.df.empty:
+            return
+        self.df = self.df[self.df['id'] != registro_id].reset_index(drop=True)
@@ -0,0 +1,209 @@
+"""
+CATÁLOGO DE BACKUPS
+===================
+Índice persistente (backups/catalogo.db, SQLite) con un registro por backup:
+tipo, fecha, tamaño, conteo de filas y checksum. Se llena al crear cada backup,
+así que listar, filtrar por fecha o tipo y decidir qué limpiar no necesita
+abrir ni hacer stat() de cada archivo.
+
+Si el catálogo no existe o quedó desfasado (archivos copiados o borrados a
+mano), `reindexar()` lo reconstruye leyendo los manifiestos y, para las copias
+.db del formato anterior, abriéndolas una sola vez.
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+# Configuración
+ARCHIVO_CATALOGO = "catalogo.db"
+
+ESQUEMA_CATALOGO = '''
+    CREATE TABLE IF NOT EXISTS backups (
+        nombre TEXT PRIMARY KEY,
+        formato TEXT NOT NULL,          -- 'almacen' (manifiesto + bloques) o 'db' (copia completa)
+        tipo TEXT NOT NULL,
+        fecha TEXT NOT NULL,            -- ISO, ordenable como texto
+        bytes INTEGER NOT NULL DEFAULT 0,
+        bytes_nuevos INTEGER,
+        entradas INTEGER,
+        salidas INTEGER,
+        sha256 TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_backups_fecha ON backups (fecha);
+    CREATE INDEX IF NOT EXISTS idx_backups_tipo ON backups (tipo, fecha);
+'''
+
+COLUMNAS = ['nombre', 'formato', 'tipo', 'fecha', 'bytes', 'bytes_nuevos', 'entradas', 'salidas', 'sha256']
+
+
+def _conectar(backup_dir):
+    conn = sqlite3.connect(Path(backup_dir) / ARCHIVO_CATALOGO, timeout=10)
+    conn.executescript(ESQUEMA_CATALOGO)
+    return conn
+
+
+def existe(backup_dir):
+    return (Path(backup_dir) / ARCHIVO_CATALOGO).exists()
+
+
+def _tipo_desde_nombre(nombre):
+    # inventario_<tipo>_<AAAAMMDD>_<HHMM[SS]>.ext
+    partes = Path(nombre).stem.split('_')
+    return '_'.join(partes[1:-2]) or 'desconocido'
+
+
+def _fecha_desde_nombre(path):
+    partes = Path(path).stem.split('_')
+    for formato in ('%Y%m%d_%H%M%S', '%Y%m%d_%H%M'):
+        try:
+            return datetime.strptime('_'.join(partes[-2:]), formato).isoformat(timespec='seconds')
+        except ValueError:
+            continue
+    return datetime.fromtimestamp(Path(path).stat().st_mtime).isoformat(timespec='seconds')
+
+
+def entrada_desde_manifiesto(manifiesto, formato='almacen'):
+    filas = manifiesto.get('filas', {})
+    return {
+        'nombre': manifiesto['archivo'],
+        'formato': formato,
+        'tipo': manifiesto.get('tipo') or _tipo_desde_nombre(manifiesto['archivo']),
+        'fecha': manifiesto['fecha'],
+        'bytes': manifiesto.get('bytes', 0),
+        'bytes_nuevos': manifiesto.get('bytes_nuevos'),
+        'entradas': filas.get('entradas'),
+        'salidas': filas.get('salidas'),
+        'sha256': manifiesto.get('sha256')
+    }
+
+
+def registrar(backup_dir, entrada):
+    """Agrega o reemplaza el registro de un backup"""
+    if not existe(backup_dir):
+        # Primer uso: indexar también los backups que ya estaban en la carpeta
+        reindexar(backup_dir)
+        return
+    conn = _conectar(backup_dir)
+    try:
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO backups ({', '.join(COLUMNAS)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNAS))})",
+                tuple(entrada.get(col) for col in COLUMNAS)
+            )
+    finally:
+        conn.close()
+
+
+def quitar(backup_dir, nombre):
+    conn = _conectar(backup_dir)
+    try:
+        with conn:
+            conn.execute("DELETE FROM backups WHERE nombre = ?", (nombre,))
+    finally:
+        conn.close()
+
+
+def listar(backup_dir, tipo=None, desde=None, hasta=None):
+    """Backups del catálogo, más reciente primero, con filtros opcionales.
+
+    `desde`/`hasta` son fechas (date o texto ISO); `hasta` incluye todo ese día.
+    """
+    if not existe(backup_dir):
+        reindexar(backup_dir)
+
+    condiciones = []
+    params = []
+    if tipo:
+        condiciones.append("tipo = ?")
+        params.append(tipo)
+    if desde:
+        condiciones.append("fecha >= ?")
+        params.append(str(desde))
+    if hasta:
+        condiciones.append("fecha < ?")
+        params.append(f"{hasta}T99")
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+    conn = _conectar(backup_dir)
+    try:
+        filas = conn.execute(
+            f"SELECT {', '.join(COLUMNAS)} FROM backups {where} ORDER BY fecha DESC, nombre DESC", params
+        ).fetchall()
+    finally:
+        conn.close()
+
+    backups = []
+    for fila in filas:
+        entrada = dict(zip(COLUMNAS, fila))
+        entrada['path'] = Path(backup_dir) / entrada['nombre']
+        entrada['fecha'] = datetime.fromisoformat(entrada['fecha'])
+        backups.append(entrada)
+    return backups
+
+
+def reindexar(backup_dir):
+    """Reconstruye el catálogo desde los archivos de la carpeta; devuelve cuántos registró"""
+    backup_dir = Path(backup_dir)
+    entradas = []
+
+    for path in backup_dir.glob("inventario_*.json"):
+        if path.with_suffix('.db').exists():
+            continue  # Manifiesto de una copia .db: se registra con la copia
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifiesto = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Manifiesto inválido {path.name}: {e}")
+            continue
+        if 'bloques' in manifiesto:
+            manifiesto['archivo'] = path.name
+            entradas.append(entrada_desde_manifiesto(manifiesto))
+
+    for path in backup_dir.glob("inventario_*.db"):
+        entradas.append(_entrada_copia_db(path))
+
+    conn = _conectar(backup_dir)
+    try:
+        with conn:
+            conn.execute("DELETE FROM backups")
+            conn.executemany(
+                f"INSERT INTO backups ({', '.join(COLUMNAS)}) VALUES ({', '.join('?' * len(COLUMNAS))})",
+                [tuple(e.get(col) for col in COLUMNAS) for e in entradas]
+            )
+    finally:
+        conn.close()
+    return len(entradas)
+
+
+def _entrada_copia_db(path):
+    """Registro de una copia .db completa (usa su manifiesto si lo tiene)"""
+    manifiesto_path = path.with_suffix('.json')
+    if manifiesto_path.exists():
+        try:
+            with open(manifiesto_path, 'r', encoding='utf-8') as f:
+                manifiesto = json.load(f)
+            manifiesto['archivo'] = path.name
+            return entrada_desde_manifiesto(manifiesto, formato='db')
+        except Exception:
+            pass
+
+    entrada = {
+        'nombre': path.name,
+        'formato': 'db',
+        'tipo': _tipo_desde_nombre(path.name),
+        'fecha': _fecha_desde_nombre(path),
+        'bytes': path.stat().st_size
+    }
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            entrada['entradas'] = conn.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+            entrada['salidas'] = conn.execute("SELECT COUNT(*) FROM salidas").fetchone()[0]
+        finally:
+            conn.close()
+    except Exception:
+        print(f"⚠️  No se pudo leer el contenido de {path.name}")
+    return entrada
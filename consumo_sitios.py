@@ -0,0 +1,185 @@
+"""
+CONSUMO POR DEPARTAMENTO Y SITIO
+================================
+Tabla `consumo_sitios` con la cantidad despachada y el número de salidas por
+(departamento, código de sitio, código de producto), mantenida por triggers
+sobre `salidas` en la misma transacción que cada alta, baja o modificación.
+
+Su clave primaria es el camino del drill-down (departamento -> sitio ->
+producto), así cada nivel se lee con un rango del índice y el total por
+departamento o por sitio sale de un GROUP BY sobre esta tabla, no sobre las
+salidas. Solo existen las combinaciones con movimientos: nunca se arma la
+matriz completa sitios × productos.
+
+USO:
+  python consumo_sitios.py --reconstruir    # Recalcula la tabla desde las salidas
+"""
+
+import argparse
+import sys
+
+import pandas as pd
+
+import base_datos
+from base_datos import DB_FILE
+
+# Configuración
+TOP_SITIOS = 15
+MESES_MAPA = 12
+SIN_DATO = '(sin dato)'
+
+ESQUEMA_CONSUMO = '''
+    CREATE TABLE IF NOT EXISTS consumo_sitios (
+        departamento TEXT NOT NULL,
+        cod_sitio TEXT NOT NULL,
+        codigo TEXT NOT NULL,
+        sitio TEXT,
+        cantidad REAL NOT NULL DEFAULT 0,
+        salidas INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (departamento, cod_sitio, codigo)
+    ) WITHOUT ROWID
+'''
+
+
+def _sumar(fila, signo):
+    return f'''
+        INSERT INTO consumo_sitios (departamento, cod_sitio, codigo, sitio, cantidad, salidas)
+        VALUES (COALESCE({fila}.departamento, ''), COALESCE({fila}.cod_sitio, ''), COALESCE({fila}.codigo, ''),
+                {fila}.sitio, {signo}COALESCE({fila}.cantidad, 0), {signo}1)
+        ON CONFLICT(departamento, cod_sitio, codigo) DO UPDATE SET
+            cantidad = cantidad + excluded.cantidad,
+            salidas = salidas + excluded.salidas,
+            sitio = COALESCE(excluded.sitio, sitio);
+    '''
+
+
+TRIGGERS_CONSUMO = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_salidas_sitios_insert AFTER INSERT ON salidas BEGIN
+        {_sumar('NEW', '')}
+    END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_salidas_sitios_delete AFTER DELETE ON salidas BEGIN
+        {_sumar('OLD', '-')}
+    END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_salidas_sitios_update
+    AFTER UPDATE OF departamento, cod_sitio, sitio, codigo, cantidad ON salidas BEGIN
+        {_sumar('OLD', '-')}
+        {_sumar('NEW', '')}
+    END''',
+]
+
+
+def instalar(conn):
+    """Crea la tabla y los triggers (migración 8, que además la llena con reconstruir).
+
+    Sentencia por sentencia: sirve dentro de la transacción de la migración.
+    """
+    for sentencia in [ESQUEMA_CONSUMO] + TRIGGERS_CONSUMO:
+        conn.execute(sentencia)
+
+
+def reconstruir(conn):
+    """Recalcula la tabla completa agrupando las salidas"""
+    conn.execute("SAVEPOINT reconstruir_consumo")
+    try:
+        conn.execute("DELETE FROM consumo_sitios")
+        conn.execute('''
+            INSERT INTO consumo_sitios (departamento, cod_sitio, codigo, sitio, cantidad, salidas)
+            SELECT COALESCE(departamento, ''), COALESCE(cod_sitio, ''), COALESCE(codigo, ''),
+                   MAX(sitio), SUM(COALESCE(cantidad, 0)), COUNT(*)
+            FROM salidas GROUP BY 1, 2, 3
+        ''')
+    except Exception:
+        conn.execute("ROLLBACK TO reconstruir_consumo")
+        raise
+    finally:
+        conn.execute("RELEASE reconstruir_consumo")
+    return conn.execute("SELECT COUNT(*) FROM consumo_sitios").fetchone()[0]
+
+
+# ==================== CONSULTAS ====================
+
+def _etiquetar(df, columnas):
+    for col in columnas:
+        df[col] = df[col].replace('', SIN_DATO)
+    return df
+
+
+def por_departamento(conn):
+    """Cantidad, salidas y sitios distintos por departamento"""
+    df = pd.read_sql_query('''
+        SELECT departamento, SUM(cantidad) AS cantidad, SUM(salidas) AS salidas,
+               COUNT(DISTINCT cod_sitio) AS sitios
+        FROM consumo_sitios GROUP BY departamento HAVING SUM(salidas) > 0 ORDER BY cantidad DESC
+    ''', conn)
+    return _etiquetar(df, ['departamento'])
+
+
+def top_sitios(conn, departamento=None, k=TOP_SITIOS):
+    """Los k sitios con más cantidad despachada (de todos o de un departamento; k=None, todos)"""
+    where, params = ("WHERE departamento = ?", [departamento]) if departamento is not None else ("", [])
+    df = pd.read_sql_query(f'''
+        SELECT cod_sitio, MAX(sitio) AS sitio, departamento, SUM(cantidad) AS cantidad, SUM(salidas) AS salidas
+        FROM consumo_sitios {where}
+        GROUP BY departamento, cod_sitio HAVING SUM(salidas) > 0
+        ORDER BY cantidad DESC LIMIT ?
+    ''', conn, params=params + [-1 if k is None else k])
+    return _etiquetar(df, ['cod_sitio', 'departamento'])
+
+
+def productos_sitio(conn, departamento, cod_sitio):
+    """Productos despachados a un sitio, con su nombre y SISTEMA del catálogo"""
+    df = pd.read_sql_query('''
+        SELECT c.codigo, r.producto, r.sistema, c.cantidad, c.salidas
+        FROM consumo_sitios c LEFT JOIN ranking_stock r ON r.codigo = c.codigo
+        WHERE c.departamento = ? AND c.cod_sitio = ? AND c.salidas > 0
+        ORDER BY c.cantidad DESC
+    ''', conn, params=(departamento, cod_sitio))
+    return df
+
+
+def mapa_sistemas(conn):
+    """Cantidad por departamento × SISTEMA (formato largo, para un mapa de calor)"""
+    df = pd.read_sql_query('''
+        SELECT c.departamento, COALESCE(r.sistema, '') AS sistema, SUM(c.cantidad) AS cantidad
+        FROM consumo_sitios c LEFT JOIN ranking_stock r ON r.codigo = c.codigo
+        GROUP BY 1, 2 HAVING SUM(c.salidas) > 0
+    ''', conn)
+    return _etiquetar(df, ['departamento', 'sistema'])
+
+
+def mapa_meses(conn, meses=MESES_MAPA):
+    """Salidas por departamento × mes de los últimos `meses`, desde los acumulados diarios"""
+    df = pd.read_sql_query('''
+        SELECT valor AS departamento, substr(fecha, 1, 7) AS mes, SUM(salidas) AS cantidad
+        FROM rollup_movimientos
+        WHERE periodo = 'dia' AND dimension = 'departamento'
+          AND fecha >= (SELECT date(MAX(fecha), 'start of month', ?) FROM rollup_movimientos
+                        WHERE periodo = 'dia' AND dimension = 'departamento')
+        GROUP BY 1, 2
+    ''', conn, params=(f"-{meses - 1} months",))
+    return _etiquetar(df, ['departamento'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Consumo por departamento y sitio')
+    parser.add_argument('--reconstruir', action='store_true', help='Recalcular la tabla desde las salidas')
+    args = parser.parse_args()
+
+    if not args.reconstruir:
+        parser.print_help()
+        return 0
+
+    conn = base_datos.conectar(DB_FILE)
+    try:
+        instalar(conn)
+        filas = reconstruir(conn)
+        print(f"✅ Consumo por sitio reconstruido: {filas} combinaciones departamento/sitio/producto")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
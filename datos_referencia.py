@@ -0,0 +1,159 @@
+"""
+DATOS DE REFERENCIA COMPARTIDOS (SITES.xlsx / Stock.xlsx)
+=========================================================
+Caché a nivel de proceso para los Excel de referencia: todas las sesiones de
+Streamlit comparten el mismo DataFrame en memoria.
+
+Cada Excel tiene además un sidecar binario (pickle) en cache_referencia/ que se
+regenera solo cuando cambia el contenido del .xlsx, así un proceso nuevo no
+vuelve a parsear el libro con openpyxl.
+
+Validación: primero mtime + tamaño (un stat); si cambiaron, se compara el hash
+del archivo contra el del sidecar antes de volver a leer el Excel.
+
+Para búsquedas por código o nombre hay índices hash (valor en mayúsculas ->
+fila) que se construyen una sola vez por versión del archivo.
+"""
+
+import hashlib
+import pickle
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+# Configuración
+CACHE_DIR = Path("cache_referencia")
+FORMATO_SIDECAR = 1
+
+_cache = {}
+_indices = {}
+_lock = threading.Lock()
+
+
+def _hash_archivo(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _ruta_sidecar(path, hoja):
+    nombre_hoja = str(hoja).replace(' ', '_')
+    return CACHE_DIR / f"{Path(path).stem}__{nombre_hoja}.pkl"
+
+
+def _leer_sidecar(sidecar, hash_xlsx):
+    """Devuelve (df, aviso) del sidecar si corresponde a ese hash, o None"""
+    if not sidecar.exists():
+        return None
+    try:
+        with open(sidecar, 'rb') as f:
+            contenido = pickle.load(f)
+        if contenido.get('formato') == FORMATO_SIDECAR and contenido.get('hash') == hash_xlsx:
+            return contenido['df'], contenido.get('aviso')
+    except Exception as e:
+        print(f"⚠️ Sidecar inválido {sidecar.name}: {e}")
+    return None
+
+
+def _escribir_sidecar(sidecar, hash_xlsx, df, aviso):
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        tmp = sidecar.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump({'formato': FORMATO_SIDECAR, 'hash': hash_xlsx, 'df': df, 'aviso': aviso},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(sidecar)
+    except Exception as e:
+        print(f"⚠️ No se pudo escribir el sidecar {sidecar.name}: {e}")
+
+
+def _leer_excel(path, hoja):
+    """Lee la hoja pedida; si no existe, la primera hoja con un aviso"""
+    try:
+        return pd.read_excel(path, sheet_name=hoja), None
+    except ValueError:
+        if hoja == 0:
+            raise
+        df = pd.read_excel(path, sheet_name=0)
+        return df, f"No se encontró la hoja '{hoja}'. Se cargó la primera hoja."
+
+
+def cargar_referencia(path, hoja=0):
+    """Carga un Excel de referencia desde la caché compartida.
+
+    Devuelve (df, version, aviso). `version` es el hash del archivo y sirve como
+    clave para estructuras derivadas (índices, gráficos). El DataFrame es
+    compartido entre sesiones: no debe modificarse en su lugar.
+    """
+    path = Path(path)
+    if not path.exists():
+        return pd.DataFrame(), None, None
+
+    stat = path.stat()
+    clave = (str(path.resolve()), str(hoja))
+
+    with _lock:
+        entrada = _cache.get(clave)
+        if entrada and entrada['mtime'] == stat.st_mtime_ns and entrada['size'] == stat.st_size:
+            return entrada['df'], entrada['version'], entrada['aviso']
+
+        hash_xlsx = _hash_archivo(path)
+        if entrada and entrada['version'] == hash_xlsx:
+            # Solo cambió el mtime (p. ej. checkout); el contenido es el mismo
+            entrada['mtime'], entrada['size'] = stat.st_mtime_ns, stat.st_size
+            return entrada['df'], entrada['version'], entrada['aviso']
+
+        sidecar = _ruta_sidecar(path, hoja)
+        leido = _leer_sidecar(sidecar, hash_xlsx)
+        if leido is None:
+            print(f"📄 Leyendo {path.name} (hoja {hoja!r}) y regenerando caché binaria...")
+            df, aviso = _leer_excel(path, hoja)
+            _escribir_sidecar(sidecar, hash_xlsx, df, aviso)
+        else:
+            df, aviso = leido
+
+        _cache[clave] = {
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'version': hash_xlsx,
+            'df': df,
+            'aviso': aviso
+        }
+        return df, hash_xlsx, aviso
+
+
+# ==================== ÍNDICES DE BÚSQUEDA ====================
+
+def obtener_indice(df, version, columnas):
+    """Índice {columna: {VALOR_EN_MAYÚSCULAS: posición de la primera fila}}.
+
+    Se construye una vez por versión del archivo y se comparte entre sesiones.
+    """
+    clave = tuple(columnas)
+    with _lock:
+        entrada = _indices.get(clave)
+        if entrada and entrada[0] == version:
+            return entrada[1]
+
+        indice = {}
+        for col in columnas:
+            if col not in df.columns:
+                continue
+            valores = df[col].astype(str).str.upper().tolist()
+            # Recorrido inverso: ante duplicados queda la primera fila (como .iloc[0])
+            indice[col] = dict(zip(reversed(valores), range(len(valores) - 1, -1, -1)))
+
+        _indices[clave] = (version, indice)
+        return indice
+
+
+def buscar_fila(df, indice, valor):
+    """Primera fila cuyo valor (sin distinguir mayúsculas) coincide en alguna columna indexada"""
+    valor = str(valor).upper()
+    posiciones = [pos for pos in (idx.get(valor) for idx in indice.values()) if pos is not None]
+    if not posiciones:
+        return None
+    return df.iloc[min(posiciones)]
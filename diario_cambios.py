@@ -0,0 +1,277 @@
+"""
+DIARIO DE CAMBIOS Y RESTAURACIÓN A UN MOMENTO DADO
+==================================================
+Tabla `diario_cambios` dentro de inventario.db, llenada por triggers: cada
+alta, baja o modificación de entradas/salidas queda registrada con su fecha y
+hora y la fila completa (JSON), en la misma transacción que el cambio.
+
+Para volver la base al estado de un minuto cualquiera:
+1. Se toma el backup más reciente anterior a ese momento (el catálogo lo ubica).
+2. Se reconstruye en un archivo temporal; su diario llega hasta el cambio N.
+3. Se reproducen sobre él los cambios N+1 ... del diario de la base actual que
+   ocurrieron hasta el momento pedido.
+
+El trabajo es proporcional a los cambios reproducidos, no al tamaño de la base,
+y ya no hacen falta copias completas frecuentes: basta un backup base cada
+tanto más el diario.
+
+El diario guarda la hora en UTC (sufijo 'Z'), independiente de la zona del
+servidor. El momento pedido se interpreta en hora de Perú, la misma que usa
+la app (base_datos.ZONA_PERU), y se convierte antes de compararlo.
+"""
+
+import json
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import almacen_backups
+import base_datos
+import cache_tablas
+import catalogo_backups
+import respaldo
+from base_datos import COLUMNAS, DB_FILE, ZONA_PERU
+
+ESQUEMA_DIARIO = '''
+    CREATE TABLE IF NOT EXISTS diario_cambios (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        momento TEXT NOT NULL,
+        tabla TEXT NOT NULL,
+        operacion TEXT NOT NULL,
+        registro_id INTEGER NOT NULL,
+        datos TEXT
+    )
+'''
+
+# Hora UTC con milisegundos, ISO con sufijo 'Z' (ordenable como texto)
+FORMATO_MOMENTO = '%Y-%m-%dT%H:%M:%fZ'
+MOMENTO_SQL = f"strftime('{FORMATO_MOMENTO}', 'now')"
+
+FORMATOS_MOMENTO = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d']
+
+
+def _triggers(tabla):
+    fila_nueva = ', '.join(f"'{col}', NEW.{col}" for col in COLUMNAS[tabla])
+    insertar = "INSERT INTO diario_cambios (momento, tabla, operacion, registro_id, datos)"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabla}_diario_insert AFTER INSERT ON {tabla} BEGIN "
+        f"{insertar} VALUES ({MOMENTO_SQL}, '{tabla}', 'insert', NEW.id, json_object({fila_nueva})); END",
+
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabla}_diario_update AFTER UPDATE ON {tabla} BEGIN "
+        f"{insertar} VALUES ({MOMENTO_SQL}, '{tabla}', 'update', NEW.id, json_object({fila_nueva})); END",
+
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabla}_diario_delete AFTER DELETE ON {tabla} BEGIN "
+        f"{insertar} VALUES ({MOMENTO_SQL}, '{tabla}', 'delete', OLD.id, NULL); END",
+    ]
+
+
+def instalar(conn):
+    """Crea la tabla del diario y sus triggers (sentencia por sentencia: sirve dentro de una migración)"""
+    conn.execute(ESQUEMA_DIARIO)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_diario_momento ON diario_cambios (momento)")
+    for tabla in COLUMNAS:
+        for sentencia in _triggers(tabla):
+            conn.execute(sentencia)
+
+
+def pasar_a_utc(conn):
+    """Convierte a UTC los momentos guardados en hora local del servidor (sin sufijo 'Z').
+
+    Diarios anteriores a la migración 9 y backups hechos antes de ella. Las
+    filas ya convertidas no se tocan, así que se puede llamar más de una vez.
+    """
+    return conn.execute(
+        f"UPDATE diario_cambios SET momento = strftime('{FORMATO_MOMENTO}', momento, 'utc') "
+        "WHERE momento NOT LIKE '%Z'"
+    ).rowcount
+
+
+def actualizar(conn):
+    """Reinstala los triggers con la hora en UTC y convierte el diario existente (migración 9)"""
+    _quitar_triggers(conn)
+    instalar(conn)
+    return pasar_a_utc(conn)
+
+
+def _quitar_triggers(conn):
+    for tabla in COLUMNAS:
+        for operacion in ('insert', 'update', 'delete'):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_{tabla}_diario_{operacion}")
+
+
+@contextmanager
+def sin_registrar(conn):
+    """Dentro de una transacción: los cambios no se anotan en el diario.
+
+    Para volcados masivos que son la base de la historia (p. ej. restaurar la
+    base vacía desde el snapshot). Los triggers se quitan y reponen en la misma
+    transacción, así ninguna otra conexión los ve ausentes.
+    """
+    _quitar_triggers(conn)
+    try:
+        yield
+    finally:
+        instalar(conn)
+
+
+def posicion(conn):
+    """(último seq, su momento) del diario; (0, None) si está vacío, None si la base no tiene diario"""
+    try:
+        fila = conn.execute("SELECT seq, momento FROM diario_cambios ORDER BY seq DESC LIMIT 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return (fila[0], fila[1]) if fila else (0, None)
+
+
+def podar(conn, hasta_seq):
+    """Borra del diario los cambios anteriores a `hasta_seq` (ya cubiertos por el backup más antiguo)"""
+    return conn.execute("DELETE FROM diario_cambios WHERE seq < ?", (hasta_seq,)).rowcount
+
+
+def interpretar_momento(texto):
+    """'2026-02-04 15:30' -> datetime en hora de Perú (acepta también segundos, 'T' o solo la fecha)"""
+    for formato in FORMATOS_MOMENTO:
+        try:
+            return datetime.strptime(texto.strip(), formato)
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha no reconocida: {texto!r}. Usa AAAA-MM-DD HH:MM")
+
+
+def _en_utc(momento):
+    """Momento en hora de Perú (sin zona) -> texto ISO UTC, comparable con el diario"""
+    utc = momento.replace(tzinfo=ZONA_PERU).astimezone(timezone.utc)
+    return utc.strftime('%Y-%m-%dT%H:%M:%S.') + f"{utc.microsecond // 1000:03d}Z"
+
+
+# ==================== RESTAURACIÓN A UN MOMENTO ====================
+
+def _preparar_base(backup, destino):
+    """Deja en `destino` el archivo .db del backup (almacén o copia completa)"""
+    if backup['formato'] == 'almacen':
+        almacen_backups.reconstruir(backup['path'], destino)
+        return
+    origen = sqlite3.connect(f"file:{backup['path']}?mode=ro", uri=True)
+    copia = sqlite3.connect(destino)
+    try:
+        origen.backup(copia)
+    finally:
+        copia.close()
+        origen.close()
+
+
+def _misma_historia(conn_base, conn_actual):
+    """El diario de la base actual continúa al del backup (no viene de otra restauración)"""
+    if posicion(conn_base) is None:
+        return False  # Backup anterior al diario: no se sabe qué cambió después
+    seq, momento = posicion(conn_base)
+    if seq == 0:
+        primera = conn_actual.execute("SELECT MIN(seq) FROM diario_cambios").fetchone()[0]
+        return primera in (None, 1)
+    fila = conn_actual.execute("SELECT momento FROM diario_cambios WHERE seq = ?", (seq,)).fetchone()
+    return fila is not None and fila[0] == momento
+
+
+def _reproducir(conn, cambios):
+    """Aplica los cambios del diario sobre la base temporal y los copia a su diario"""
+    _quitar_triggers(conn)
+    # Con REPLACE, que también corran los triggers de baja (libro de stock)
+    conn.execute("PRAGMA recursive_triggers = ON")
+    conn.execute("BEGIN")
+    try:
+        for seq, momento, tabla, operacion, registro_id, datos in cambios:
+            if operacion == 'delete':
+                conn.execute(f"DELETE FROM {tabla} WHERE id = ?", (registro_id,))
+            elif operacion == 'update':
+                fila = json.loads(datos)
+                conn.execute(
+                    f"UPDATE {tabla} SET {', '.join(f'{col} = ?' for col in fila)} WHERE id = ?",
+                    list(fila.values()) + [registro_id]
+                )
+            else:
+                fila = json.loads(datos)
+                columnas = ['id'] + list(fila)
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {tabla} ({', '.join(columnas)}) "
+                    f"VALUES ({', '.join('?' * len(columnas))})",
+                    [registro_id] + list(fila.values())
+                )
+        conn.executemany(
+            "INSERT INTO diario_cambios (seq, momento, tabla, operacion, registro_id, datos) VALUES (?, ?, ?, ?, ?, ?)",
+            cambios
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    instalar(conn)
+
+
+def restaurar_a(momento, backup_dir, db_file=DB_FILE, antes_de_reemplazar=None):
+    """Lleva inventario.db al estado que tenía en `momento` (datetime en hora de Perú).
+
+    `antes_de_reemplazar` se llama justo antes de escribir sobre la base actual
+    (p. ej. para crear un backup de seguridad); si devuelve False se cancela.
+    Devuelve un resumen (dict) o lanza ValueError si no hay base utilizable.
+    """
+    inicio = time.perf_counter()
+    limite = _en_utc(momento)
+    # Las fechas del catálogo están en hora local del servidor
+    momento_servidor = momento.replace(tzinfo=ZONA_PERU).astimezone().replace(tzinfo=None)
+    candidatos = [b for b in catalogo_backups.listar(backup_dir) if b['fecha'] <= momento_servidor]
+    if not candidatos:
+        raise ValueError("No hay ningún backup anterior a ese momento")
+
+    actual = base_datos.conectar(db_file)
+    try:
+        with tempfile.TemporaryDirectory(dir=backup_dir) as tmp:
+            archivo = Path(tmp) / "punto_en_el_tiempo.db"
+            for backup in candidatos:
+                archivo.unlink(missing_ok=True)
+                _preparar_base(backup, archivo)
+                conn = sqlite3.connect(archivo, isolation_level=None)
+                if posicion(conn) is not None:
+                    pasar_a_utc(conn)  # Backup anterior a la migración 9
+                if _misma_historia(conn, actual):
+                    break
+                conn.close()
+            else:
+                raise ValueError("Ningún backup anterior comparte historia con el diario actual "
+                                 "(¿el diario fue podado o la base fue restaurada después?)")
+
+            try:
+                seq_base, _ = posicion(conn)
+                cambios = actual.execute(
+                    "SELECT seq, momento, tabla, operacion, registro_id, datos FROM diario_cambios "
+                    "WHERE seq > ? AND momento <= ? ORDER BY seq", (seq_base, limite)
+                ).fetchall()
+                _reproducir(conn, cambios)
+            finally:
+                conn.close()
+
+            valido, mensaje = respaldo.verificar_backup(archivo)
+            if not valido:
+                raise ValueError(f"La base reconstruida no es válida: {mensaje}")
+
+            if antes_de_reemplazar is not None and antes_de_reemplazar() is False:
+                return None
+
+            # Copia página a página sobre la base viva (respeta WAL y bloqueos)
+            origen = sqlite3.connect(archivo)
+            try:
+                origen.backup(actual)
+            finally:
+                origen.close()
+            cache_tablas.nueva_generacion(actual)
+    finally:
+        actual.close()
+
+    return {
+        'backup_base': backup['nombre'],
+        'fecha_base': backup['fecha'].astimezone(ZONA_PERU).replace(tzinfo=None),
+        'cambios_reproducidos': len(cambios),
+        'segundos': round(time.perf_counter() - inicio, 3)
+    }
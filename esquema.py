@@ -0,0 +1,255 @@
+"""
+ESQUEMA Y MIGRACIONES DE inventario.db
+======================================
+Definición única de las tablas entradas/salidas, usada por app.py e
+importar_datos.py, más una lista de migraciones numeradas.
+
+La versión del esquema se guarda en `PRAGMA user_version`. Al iniciar se
+aplican, en orden y cada una en su propia transacción, solo las migraciones
+con número mayor al de la base; ejecutarlo dos veces no cambia nada.
+
+Para agregar un cambio de esquema: escribir una función `_migracion_N(conn)`
+y añadirla al final de MIGRACIONES. Nunca modificar una migración ya publicada.
+"""
+
+from datetime import date, datetime
+from functools import lru_cache
+
+import cache_tablas
+import consumo_sitios
+import diario_cambios
+import libro_stock
+import rankings_stock
+import rollups_movimientos
+
+ESQUEMA_TABLAS = '''
+    CREATE TABLE IF NOT EXISTS entradas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        orden_compra TEXT,
+        fecha TEXT,
+        codigo TEXT,
+        producto TEXT,
+        cantidad REAL,
+        um TEXT,
+        sistema TEXT,
+        almacen_salida TEXT,
+        fecha_envio TEXT,
+        responsable_envio TEXT,
+        almacen_recepcion TEXT,
+        fecha_recepcion TEXT,
+        responsable_recepcion TEXT,
+        creado_por TEXT,
+        fecha_creacion TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS salidas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nro_guia TEXT,
+        nro_tarea TEXT,
+        fecha TEXT,
+        cod_sitio TEXT,
+        sitio TEXT,
+        departamento TEXT,
+        codigo TEXT,
+        producto TEXT,
+        code_indra TEXT,
+        descripcion TEXT,
+        cantidad REAL,
+        um TEXT,
+        sistema TEXT,
+        creado_por TEXT,
+        fecha_creacion TEXT
+    );
+'''
+
+# Columnas de fecha que se guardan como YYYY-MM-DD (ordenables como texto)
+COLUMNAS_FECHA = {
+    'entradas': ['fecha', 'fecha_envio', 'fecha_recepcion'],
+    'salidas': ['fecha']
+}
+
+FORMATOS_FECHA = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%Y/%m/%d']
+
+
+def fecha_iso(valor):
+    """Convierte una fecha (date, datetime o texto en formatos conocidos) a YYYY-MM-DD.
+
+    Si no se reconoce el formato devuelve el valor sin cambios.
+    """
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if not isinstance(valor, str):
+        return valor
+    return _texto_a_iso(valor)
+
+
+@lru_cache(maxsize=4096)
+def _texto_a_iso(valor):
+    # Caché: en cargas masivas las mismas fechas se repiten miles de veces
+    texto = valor.strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return valor
+
+
+def normalizar_fechas(df, tabla):
+    """Pasa a ISO las columnas de fecha de un DataFrame antes de insertarlo"""
+    for col in COLUMNAS_FECHA[tabla]:
+        if col in df.columns:
+            df[col] = df[col].map(fecha_iso)
+    return df
+
+
+# ==================== MIGRACIONES ====================
+
+def _migracion_1(conn):
+    """Fechas de movimientos a formato ISO (YYYY-MM-DD)"""
+    for tabla, columnas in COLUMNAS_FECHA.items():
+        for col in columnas:
+            filas = conn.execute(
+                f"SELECT id, {col} FROM {tabla} "
+                f"WHERE {col} IS NOT NULL AND {col} NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+            ).fetchall()
+            cambios = []
+            for registro_id, valor in filas:
+                nuevo = fecha_iso(valor)
+                if nuevo != valor:
+                    cambios.append((nuevo, registro_id))
+            if cambios:
+                conn.executemany(f"UPDATE {tabla} SET {col} = ? WHERE id = ?", cambios)
+
+
+INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_entradas_codigo ON entradas (codigo)",
+    "CREATE INDEX IF NOT EXISTS idx_entradas_fecha ON entradas (fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_entradas_producto ON entradas (producto)",
+    # NOCASE: permite que el filtro `LIKE 'texto%'` use el índice
+    "CREATE INDEX IF NOT EXISTS idx_entradas_orden_compra ON entradas (orden_compra COLLATE NOCASE)",
+
+    "CREATE INDEX IF NOT EXISTS idx_salidas_codigo ON salidas (codigo)",
+    "CREATE INDEX IF NOT EXISTS idx_salidas_fecha ON salidas (fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_salidas_producto ON salidas (producto)",
+    "CREATE INDEX IF NOT EXISTS idx_salidas_nro_guia ON salidas (nro_guia COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_salidas_cod_sitio ON salidas (cod_sitio COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_salidas_sitio ON salidas (sitio COLLATE NOCASE)",
+]
+
+
+def _migracion_2(conn):
+    """Índices para filtros de la lista y agregación por producto"""
+    # Sentencia por sentencia: executescript haría COMMIT de la transacción en curso
+    for sentencia in INDICES:
+        conn.execute(sentencia)
+
+
+def _migracion_3(conn):
+    """Diario de cambios con fecha y hora (restauración a un momento dado)"""
+    diario_cambios.instalar(conn)
+
+
+def _migracion_4(conn):
+    """Índices por clave natural (deduplicación en importaciones masivas)"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entradas_clave ON entradas (orden_compra, codigo, fecha)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salidas_clave ON salidas (nro_guia, codigo)")
+
+
+def _migracion_5(conn):
+    """Manifiesto de archivos importados (hash -> filas), para reanudar importaciones"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS importaciones (
+            sha256 TEXT PRIMARY KEY,
+            archivo TEXT NOT NULL,
+            tabla TEXT NOT NULL,
+            leidas INTEGER NOT NULL,
+            insertadas INTEGER NOT NULL,
+            duplicadas INTEGER NOT NULL,
+            rechazadas INTEGER NOT NULL,
+            fecha TEXT NOT NULL
+        )
+    ''')
+
+
+def _migracion_6(conn):
+    """Rankings de stock materializados (TOP, stock crítico y umbrales) sobre el libro de stock"""
+    rankings_stock.instalar(conn)
+
+
+def _migracion_7(conn):
+    """Acumulados diarios/semanales de movimientos, llenados una vez desde entradas y salidas"""
+    rollups_movimientos.instalar(conn)
+    rollups_movimientos.reconstruir(conn)
+
+
+def _migracion_8(conn):
+    """Consumo por departamento -> sitio -> producto, llenado una vez desde las salidas"""
+    consumo_sitios.instalar(conn)
+    consumo_sitios.reconstruir(conn)
+
+
+def _migracion_9(conn):
+    """Diario de cambios con la hora en UTC en lugar de la hora local del servidor"""
+    diario_cambios.actualizar(conn)
+
+
+# (versión, descripción, función) en orden estricto
+MIGRACIONES = [
+    (1, "Fechas en formato ISO", _migracion_1),
+    (2, "Índices de filtros y por producto", _migracion_2),
+    (3, "Diario de cambios", _migracion_3),
+    (4, "Índices por clave natural", _migracion_4),
+    (5, "Manifiesto de importaciones", _migracion_5),
+    (6, "Rankings de stock y umbrales críticos", _migracion_6),
+    (7, "Acumulados diarios y semanales de movimientos", _migracion_7),
+    (8, "Consumo por departamento y sitio", _migracion_8),
+    (9, "Diario de cambios en UTC", _migracion_9),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+
+def version_actual(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn):
+    """Aplica las migraciones pendientes; devuelve la lista de versiones aplicadas"""
+    aplicadas = []
+    for version, descripcion, funcion in MIGRACIONES:
+        if version <= version_actual(conn):
+            continue
+        # BEGIN IMMEDIATE: si dos procesos arrancan a la vez, el segundo espera
+        # y vuelve a leer la versión dentro de la transacción
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version_actual(conn) >= version:
+                conn.execute("COMMIT")
+                continue
+            funcion(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"🔧 Migración {version} aplicada: {descripcion}")
+        aplicadas.append(version)
+    return aplicadas
+
+
+def inicializar(conn):
+    """Crea las tablas si faltan, migra a la última versión e instala los triggers"""
+    conn.executescript(ESQUEMA_TABLAS)
+
+    # Libro de stock por producto (mantenido por triggers en cada movimiento).
+    # Antes de migrar: los triggers de los rankings (migración 6) se apoyan en él
+    libro_stock.instalar(conn)
+
+    migrar(conn)
+
+    # Contador de versión por tabla para actualizar las cachés por deltas
+    cache_tablas.instalar(conn)
+
@@ -0,0 +1,439 @@
+"""
+EXPORTACIÓN POR TRAMOS (EXCEL / CSV / PARQUET)
+==============================================
+Exporta entradas y salidas sin cargar las tablas completas en memoria: las
+filas se leen de SQLite con un cursor en tramos de FILAS_POR_TRAMO y se
+escriben directamente al archivo de salida.
+
+- Excel: libro openpyxl en modo `write_only` (cada fila se serializa al
+  disco al agregarla), con las mismas hojas y columnas de siempre.
+- CSV: un .zip con entradas.csv y salidas.csv (lo más rápido).
+- Parquet: un .zip con un .parquet por tabla (requiere pyarrow).
+
+Ambas tablas se leen dentro de una misma transacción de lectura, así que el
+archivo es una foto consistente aunque la app siga escribiendo (WAL).
+
+Cada archivo lleva en el nombre un sello de la versión de los datos (máximo
+id + contadores de version_tablas, ver cache_tablas.py). Si nada cambió desde
+la última exportación se entrega ese mismo archivo al instante; si cambió se
+genera uno nuevo. exports/ se mantiene bajo MAX_ARCHIVOS_EXPORTS archivos y
+MAX_MB_EXPORTS megas desalojando los menos usados.
+
+`TrabajoExportacion` corre la exportación en un hilo aparte y expone el
+avance para mostrarlo en la interfaz sin bloquearla.
+"""
+
+import csv
+import hashlib
+import io
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+from openpyxl import Workbook
+
+import base_datos
+from base_datos import DB_FILE
+
+# Configuración
+FILAS_POR_TRAMO = 5000
+MAX_FILAS_HOJA = 1_048_575     # Límite de Excel (sin contar el encabezado)
+EXPORTS_DIR = Path("exports")
+PREFIJO_EXPORTACION = "inventario_completo"
+MAX_ARCHIVOS_EXPORTS = 10      # Exportaciones que se conservan en exports/
+MAX_MB_EXPORTS = 500           # Tope de espacio de esas exportaciones
+
+# Columnas visibles (sin id ni auditoría) y nombre de la hoja de cada tabla
+COLUMNAS_EXPORTACION = {
+    'entradas': [
+        'orden_compra', 'fecha', 'codigo', 'producto', 'cantidad', 'um',
+        'sistema', 'almacen_salida', 'fecha_envio', 'responsable_envio',
+        'almacen_recepcion', 'fecha_recepcion', 'responsable_recepcion'
+    ],
+    'salidas': [
+        'nro_guia', 'nro_tarea', 'fecha', 'cod_sitio', 'sitio',
+        'departamento', 'codigo', 'producto', 'code_indra', 'descripcion',
+        'cantidad', 'um', 'sistema'
+    ]
+}
+HOJAS = {'entradas': 'Entradas', 'salidas': 'Salidas'}
+
+FORMATOS = {
+    'xlsx': ('.xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'csv': ('.csv.zip', "application/zip"),
+    'parquet': ('.parquet.zip', "application/zip"),
+}
+
+
+def hay_parquet():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def tipo_mime(formato):
+    return FORMATOS[formato][1]
+
+
+def nombre_archivo(formato, prefijo=PREFIJO_EXPORTACION):
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"{prefijo}_{timestamp}{FORMATOS[formato][0]}"
+
+
+def _columnas(conn, tabla):
+    existentes = {fila[1] for fila in conn.execute(f"PRAGMA table_info({tabla})")}
+    return [col for col in COLUMNAS_EXPORTACION[tabla] if col in existentes]
+
+
+def _tramos(conn, tabla, columnas, tamano):
+    """Filas de la tabla en orden de id, de a `tamano` por vez"""
+    cursor = conn.execute(f"SELECT {', '.join(columnas)} FROM {tabla} ORDER BY id")
+    while True:
+        filas = cursor.fetchmany(tamano)
+        if not filas:
+            break
+        yield filas
+
+
+# ==================== ESCRITORES ====================
+
+def _escribir_xlsx(destino, tablas, avanzar):
+    libro = Workbook(write_only=True)
+    for tabla, columnas, tramos in tablas:
+        hoja = libro.create_sheet(HOJAS[tabla])
+        hoja.append(columnas)
+        en_hoja = 0
+        numero = 1
+        for filas in tramos:
+            for fila in filas:
+                if en_hoja == MAX_FILAS_HOJA:
+                    # Tabla más grande que una hoja: sigue en "Salidas 2", "Salidas 3"...
+                    numero += 1
+                    hoja = libro.create_sheet(f"{HOJAS[tabla]} {numero}")
+                    hoja.append(columnas)
+                    en_hoja = 0
+                hoja.append(fila)
+                en_hoja += 1
+            avanzar(len(filas))
+    libro.save(destino)
+
+
+def _escribir_csv(destino, tablas, avanzar):
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for tabla, columnas, tramos in tablas:
+            # utf-8-sig: Excel abre bien tildes y ñ al hacer doble clic
+            with zf.open(f"{tabla}.csv", 'w') as binario, \
+                    io.TextIOWrapper(binario, encoding='utf-8-sig', newline='') as texto:
+                escritor = csv.writer(texto)
+                escritor.writerow(columnas)
+                for filas in tramos:
+                    escritor.writerows(filas)
+                    avanzar(len(filas))
+
+
+def _a_numero(valor):
+    try:
+        return None if valor in (None, '') else float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _a_texto(valor):
+    return None if valor is None else str(valor)
+
+
+def _escribir_parquet(destino, tablas, avanzar):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with tempfile.TemporaryDirectory(dir=Path(destino).parent) as tmp, \
+            zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for tabla, columnas, tramos in tablas:
+            archivo = Path(tmp) / f"{tabla}.parquet"
+            # Tipos fijos por columna: todo texto salvo la cantidad
+            esquema_pa = pa.schema([(col, pa.float64() if col == 'cantidad' else pa.string())
+                                    for col in columnas])
+            with pq.ParquetWriter(archivo, esquema_pa) as escritor:
+                for filas in tramos:
+                    datos = {col: [fila[i] for fila in filas] for i, col in enumerate(columnas)}
+                    for col in datos:
+                        convertir = _a_numero if col == 'cantidad' else _a_texto
+                        datos[col] = [convertir(v) for v in datos[col]]
+                    escritor.write_table(pa.table(datos, schema=esquema_pa))
+                    avanzar(len(filas))
+            zf.write(archivo, archivo.name)
+
+
+ESCRITORES = {'xlsx': _escribir_xlsx, 'csv': _escribir_csv, 'parquet': _escribir_parquet}
+
+
+def _validar_formato(formato):
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato no soportado: {formato}")
+    if formato == 'parquet' and not hay_parquet():
+        raise ValueError("Para exportar a Parquet instala pyarrow (pip install pyarrow)")
+
+
+def _conteos(conn):
+    return {tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+            for tabla in COLUMNAS_EXPORTACION}
+
+
+def _escribir(conn, tmp, formato, progreso, tamano):
+    """Escribe el archivo temporal; se llama dentro de la transacción de lectura"""
+    conteos = _conteos(conn)
+    total = sum(conteos.values())
+    escritas = 0
+
+    def avanzar(n):
+        nonlocal escritas
+        escritas += n
+        if progreso is not None:
+            progreso(escritas, total)
+
+    tablas = []
+    for tabla in COLUMNAS_EXPORTACION:
+        columnas = _columnas(conn, tabla)
+        tablas.append((tabla, columnas, _tramos(conn, tabla, columnas, tamano)))
+
+    try:
+        ESCRITORES[formato](tmp, tablas, avanzar)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+    return conteos
+
+
+def _resumen(archivo, formato, conteos, inicio, sello=None, desde_cache=False):
+    return {
+        'archivo': archivo,
+        'formato': formato,
+        'filas': conteos,
+        'bytes': archivo.stat().st_size,
+        'segundos': round(time.perf_counter() - inicio, 3),
+        'sello': sello,
+        'desde_cache': desde_cache
+    }
+
+
+def exportar(destino, formato='xlsx', db_file=DB_FILE, progreso=None, tamano=FILAS_POR_TRAMO):
+    """Exporta entradas y salidas a `destino` leyendo por tramos.
+
+    `progreso(escritas, total)` se llama después de cada tramo.
+    Devuelve un resumen (dict). El archivo se escribe primero como .tmp y se
+    renombra al terminar, así nunca queda uno a medias con el nombre final.
+    """
+    _validar_formato(formato)
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_name(destino.name + '.tmp')
+    inicio = time.perf_counter()
+
+    conn = base_datos.conectar(db_file)
+    try:
+        # Una sola transacción de lectura: ambas hojas ven el mismo momento
+        conn.execute("BEGIN")
+        conteos = _escribir(conn, tmp, formato, progreso, tamano)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    tmp.replace(destino)
+    return _resumen(destino, formato, conteos, inicio)
+
+
+# ==================== CACHÉ POR VERSIÓN DE LOS DATOS ====================
+
+def sello_datos(conn):
+    """Sello corto de la versión de los datos: cambia con cualquier alta, baja,
+    modificación o restauración (máximo id + contadores de version_tablas)"""
+    try:
+        versiones = dict(conn.execute("SELECT tabla, version FROM version_tablas").fetchall())
+    except sqlite3.OperationalError:
+        versiones = {}  # Base sin contadores: solo el máximo id y el conteo
+    partes = []
+    for tabla in COLUMNAS_EXPORTACION:
+        max_id, filas = conn.execute(f"SELECT MAX(id), COUNT(*) FROM {tabla}").fetchone()
+        partes.append((tabla, max_id, filas, versiones.get(tabla)))
+    partes.append(('generacion', versiones.get('generacion')))
+    return hashlib.sha1(repr(partes).encode()).hexdigest()[:12]
+
+
+def _buscar(exports_dir, formato, sello, prefijo=PREFIJO_EXPORTACION):
+    """Archivo ya exportado con ese sello (el más reciente), o None"""
+    candidatos = sorted(Path(exports_dir).glob(f"{prefijo}_*_{sello}{FORMATOS[formato][0]}"))
+    return candidatos[-1] if candidatos else None
+
+
+def exportacion_vigente(formato='xlsx', db_file=DB_FILE, exports_dir=EXPORTS_DIR):
+    """Resumen del archivo exportado que coincide con los datos actuales, o None"""
+    inicio = time.perf_counter()
+    conn = base_datos.conectar(db_file)
+    try:
+        conn.execute("BEGIN")
+        sello = sello_datos(conn)
+        archivo = _buscar(exports_dir, formato, sello)
+        conteos = _conteos(conn) if archivo else None
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    if archivo is None:
+        return None
+    archivo.touch()  # Usado recién: el último en desalojarse
+    return _resumen(archivo, formato, conteos, inicio, sello, desde_cache=True)
+
+
+def exportar_versionado(formato='xlsx', db_file=DB_FILE, exports_dir=EXPORTS_DIR,
+                        progreso=None, tamano=FILAS_POR_TRAMO):
+    """Como `exportar`, pero con el sello de los datos en el nombre del archivo.
+
+    Si ya existe un archivo con el sello actual se devuelve ese sin volver a
+    generarlo. Al terminar se desalojan las exportaciones más viejas.
+    """
+    _validar_formato(formato)
+    exports_dir = Path(exports_dir)
+    exports_dir.mkdir(parents=True, exist_ok=True)
+    inicio = time.perf_counter()
+
+    conn = base_datos.conectar(db_file)
+    try:
+        # El sello se lee en la misma transacción que las filas: describe el archivo exacto
+        conn.execute("BEGIN")
+        sello = sello_datos(conn)
+        archivo = _buscar(exports_dir, formato, sello)
+        if archivo is not None:
+            conteos = _conteos(conn)
+            conn.execute("COMMIT")
+            archivo.touch()
+            return _resumen(archivo, formato, conteos, inicio, sello, desde_cache=True)
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        destino = exports_dir / f"{PREFIJO_EXPORTACION}_{timestamp}_{sello}{FORMATOS[formato][0]}"
+        tmp = destino.with_name(destino.name + '.tmp')
+        conteos = _escribir(conn, tmp, formato, progreso, tamano)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    tmp.replace(destino)
+    desalojar(exports_dir, conservar=destino)
+    return _resumen(destino, formato, conteos, inicio, sello)
+
+
+def desalojar(exports_dir=EXPORTS_DIR, max_archivos=MAX_ARCHIVOS_EXPORTS, max_mb=MAX_MB_EXPORTS,
+              conservar=None):
+    """Borra las exportaciones menos usadas hasta quedar dentro de los límites.
+
+    Solo toca archivos `inventario_completo_*` (no lo que el usuario deje en
+    exports/). Devuelve cuántos borró.
+    """
+    archivos = [p for p in Path(exports_dir).glob(f"{PREFIJO_EXPORTACION}_*")
+                if p.is_file() and not p.name.endswith('.tmp')]
+    # Más reciente (modificado o servido) primero
+    archivos.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    limite_bytes = max_mb * 1024 * 1024
+    usados = 0
+    borrados = 0
+    for posicion, path in enumerate(archivos):
+        tamano = path.stat().st_size
+        if path != conservar and (posicion >= max_archivos or usados + tamano > limite_bytes):
+            try:
+                path.unlink()
+                borrados += 1
+            except OSError as e:
+                print(f"⚠️ No se pudo borrar {path.name}: {e}")
+            continue
+        usados += tamano
+    return borrados
+
+
+# ==================== EXPORTACIÓN EN SEGUNDO PLANO ====================
+
+class TrabajoExportacion:
+    """Exportación en un hilo aparte; la interfaz consulta `estado()` para mostrar el avance.
+
+    Si ya hay un archivo para la versión actual de los datos, el trabajo nace
+    terminado con ese archivo y no se lanza ningún hilo.
+    """
+
+    def __init__(self, formato='xlsx', db_file=DB_FILE, exports_dir=EXPORTS_DIR):
+        self.formato = formato
+        self.db_file = db_file
+        self.exports_dir = Path(exports_dir)
+
+        self._lock = threading.Lock()
+        self.escritas = 0
+        self.total = 0
+        self.resumen = None
+        self.error = None
+        self.inicio = time.time()
+        self.fin = None
+        self._hilo = None
+
+        self.resumen = exportacion_vigente(formato, db_file, exports_dir)
+        if self.resumen is not None:
+            self.fin = time.time()
+            return
+        self._hilo = threading.Thread(target=self._ejecutar, name="exportacion", daemon=True)
+        self._hilo.start()
+
+    def _progreso(self, escritas, total):
+        with self._lock:
+            self.escritas = escritas
+            self.total = total
+
+    def _ejecutar(self):
+        try:
+            resumen = exportar_versionado(self.formato, self.db_file, self.exports_dir, progreso=self._progreso)
+            with self._lock:
+                self.resumen = resumen
+        except Exception as e:
+            print(f"❌ Error al exportar: {e}")
+            with self._lock:
+                self.error = str(e)
+        finally:
+            with self._lock:
+                self.fin = time.time()
+
+    def en_curso(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def esperar(self, timeout=None):
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+        return self.resumen
+
+    def estado(self):
+        """Foto del avance para la interfaz"""
+        with self._lock:
+            return {
+                'formato': self.formato,
+                'en_curso': self.fin is None,
+                'escritas': self.escritas,
+                'total': self.total,
+                'fraccion': self.escritas / self.total if self.total else (0.0 if self.fin is None else 1.0),
+                'segundos': round((self.fin or time.time()) - self.inicio, 1),
+                'resumen': self.resumen,
+                'error': self.error
+            }
+
+
+_trabajos = {}
+_lock_trabajos = threading.Lock()
+
+
+def iniciar(formato='xlsx', db_file=DB_FILE, exports_dir=EXPORTS_DIR):
+    """Trabajo de exportación compartido por proceso: si ya hay uno en curso
+    para ese formato se reutiliza en lugar de generar el mismo archivo dos veces"""
+    clave = (formato, str(Path(db_file).resolve()), str(Path(exports_dir).resolve()))
+    with _lock_trabajos:
+        trabajo = _trabajos.get(clave)
+        if trabajo is None or not trabajo.en_curso():
+            trabajo = _trabajos[clave] = TrabajoExportacion(formato, db_file, exports_dir)
+        return trabajo
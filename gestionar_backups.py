@@ -2,26 +2,39 @@
 SISTEMA DE GESTIÓN DE BACKUPS
 ==============================
 Script para crear, listar, restaurar y gestionar backups de la base de datos.
+Los backups nuevos se guardan en el almacén deduplicado (almacen_backups.py):
+un manifiesto .json por backup y los bloques compartidos en backups/bloques/.
+Las copias .db completas del formato anterior se siguen listando y restaurando.
 
 USO:
   python gestionar_backups.py                    # Menú interactivo
   python gestionar_backups.py --crear            # Crear backup
   python gestionar_backups.py --listar           # Listar backups
+  python gestionar_backups.py --listar --tipo auto --desde 2026-01-01 --hasta 2026-01-31
+  python gestionar_backups.py --reindex          # Reconstruir el catálogo de backups
   python gestionar_backups.py --restaurar N      # Restaurar backup N
+  python gestionar_backups.py --restaurar-a "2026-02-04 15:30"   # Estado a esa fecha y hora (hora de Perú)
   python gestionar_backups.py --exportar         # Exportar a Excel
   python gestionar_backups.py --limpiar          # Limpiar backups antiguos
+  python gestionar_backups.py --gc               # Borrar bloques sin referencia del almacén
 """
 
 import sqlite3
-import pandas as pd
-import shutil
 from datetime import datetime, timedelta
 from pathlib import Path
 import argparse
 import sys
+import tempfile
+import almacen_backups
+import base_datos
+import cache_tablas
+import catalogo_backups
+import diario_cambios
+import exportador
+import respaldo
+from base_datos import DB_FILE
 
 # Configuración
-DB_FILE = "inventario.db"
 BACKUP_DIR = Path("backups")
 EXPORTS_DIR = Path("exports")
 
@@ -43,18 +56,23 @@ class GestorBackups:
                 return None
             
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_name = f"inventario_{tipo}_{timestamp}.db"
+            backup_name = f"inventario_{tipo}_{timestamp}.json"
             backup_path = self.backup_dir / backup_name
             
-            # Copiar archivo de base de datos
-            shutil.copy2(self.db_file, backup_path)
+            # Copia consistente (API de backup de SQLite) guardada como bloques deduplicados
+            manifiesto = almacen_backups.crear_backup(backup_path, db_file=self.db_file, tipo=tipo)
             
             # Obtener tamaño del archivo
-            size_mb = backup_path.stat().st_size / (1024 * 1024)
+            size_mb = manifiesto['bytes'] / (1024 * 1024)
+            nuevos_mb = manifiesto['bytes_nuevos'] / (1024 * 1024)
+            filas = manifiesto['filas']
             
             print(f"✅ Backup creado exitosamente:")
             print(f"   📁 Archivo: {backup_name}")
-            print(f"   📊 Tamaño: {size_mb:.2f} MB")
+            print(f"   📊 Tamaño: {size_mb:.2f} MB "
+                  f"({manifiesto['bloques_nuevos']} bloques nuevos, {nuevos_mb:.2f} MB en disco)")
+            print(f"   📦 Contenido: {filas.get('entradas', 0)} entradas, {filas.get('salidas', 0)} salidas")
+            print(f"   🔒 Integridad: {manifiesto['integridad']} | SHA-256 {manifiesto['sha256'][:12]}")
             print(f"   📅 Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
             
             return backup_path
@@ -63,9 +81,13 @@ class GestorBackups:
             print(f"❌ Error al crear backup: {str(e)}")
             return None
     
-    def listar_backups(self, detallado=False):
-        """Lista todos los backups disponibles"""
-        backups = sorted(self.backup_dir.glob("inventario_*.db"), reverse=True)
+    def _buscar_backups(self, tipo=None, desde=None, hasta=None):
+        """Backups registrados en el catálogo, más reciente primero"""
+        return catalogo_backups.listar(self.backup_dir, tipo=tipo, desde=desde, hasta=hasta)
+    
+    def listar_backups(self, detallado=False, tipo=None, desde=None, hasta=None):
+        """Lista los backups disponibles (desde el catálogo, sin abrir los archivos)"""
+        backups = self._buscar_backups(tipo, desde, hasta)
         
         if not backups:
             print("📦 No hay backups disponibles")
@@ -75,59 +97,61 @@ class GestorBackups:
         print("=" * 80)
         
         backups_info = []
+        ahora = datetime.now()
         for i, backup in enumerate(backups, 1):
-            # Obtener información del archivo
-            stat = backup.stat()
-            size_mb = stat.st_size / (1024 * 1024)
-            fecha_modificacion = datetime.fromtimestamp(stat.st_mtime)
-            antiguedad = datetime.now() - fecha_modificacion
+            size_mb = backup['bytes'] / (1024 * 1024)
+            antiguedad = ahora - backup['fecha']
             
             # Tipo de backup
-            if "manual" in backup.name:
-                tipo = "📌 Manual"
-            elif "auto" in backup.name:
-                tipo = "🤖 Auto"
+            if backup['tipo'] == "manual":
+                tipo_txt = "📌 Manual"
+            elif backup['tipo'] == "auto":
+                tipo_txt = "🤖 Auto"
+            elif backup['tipo'] == "pre_restauracion":
+                tipo_txt = "🛟 Pre-restauración"
             else:
-                tipo = "❓ Desconocido"
+                tipo_txt = "❓ Desconocido"
             
             info = {
                 'numero': i,
-                'nombre': backup.name,
-                'path': backup,
-                'tipo': tipo,
-                'fecha': fecha_modificacion,
+                'nombre': backup['nombre'],
+                'path': backup['path'],
+                'tipo': tipo_txt,
+                'fecha': backup['fecha'],
                 'size': size_mb,
                 'antiguedad_dias': antiguedad.days
             }
             backups_info.append(info)
             
             # Mostrar información
-            print(f"{i:3}. {tipo} | {backup.name}")
-            print(f"     📅 Fecha: {fecha_modificacion.strftime('%d/%m/%Y %H:%M:%S')}")
+            print(f"{i:3}. {tipo_txt} | {backup['nombre']}")
+            print(f"     📅 Fecha: {backup['fecha'].strftime('%d/%m/%Y %H:%M:%S')}")
             print(f"     📊 Tamaño: {size_mb:.2f} MB")
             print(f"     ⏰ Antigüedad: {antiguedad.days} días, {antiguedad.seconds // 3600} horas")
             
             if detallado:
-                # Mostrar contenido del backup
-                try:
-                    conn = sqlite3.connect(backup)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT COUNT(*) FROM entradas")
-                    entradas = cursor.fetchone()[0]
-                    cursor.execute("SELECT COUNT(*) FROM salidas")
-                    salidas = cursor.fetchone()[0]
-                    conn.close()
-                    print(f"     📦 Contenido: {entradas} entradas, {salidas} salidas")
-                except:
+                if backup['entradas'] is not None:
+                    print(f"     📦 Contenido: {backup['entradas']} entradas, {backup['salidas']} salidas")
+                else:
                     print(f"     ⚠️  No se pudo leer el contenido")
+                if backup['sha256']:
+                    print(f"     🔒 SHA-256: {backup['sha256'][:16]}")
+                if backup['bytes_nuevos'] is not None:
+                    print(f"     💽 En disco (bloques nuevos): {backup['bytes_nuevos'] / (1024 * 1024):.2f} MB")
             
             print("-" * 80)
         
         return backups_info
     
+    def reindexar(self):
+        """Reconstruye el catálogo leyendo los archivos de la carpeta de backups"""
+        total = catalogo_backups.reindexar(self.backup_dir)
+        print(f"✅ Catálogo reconstruido: {total} backups")
+        return total
+    
     def restaurar_backup(self, numero_backup):
         """Restaura un backup específico"""
-        backups = sorted(self.backup_dir.glob("inventario_*.db"), reverse=True)
+        backups = self._buscar_backups()
         
         if not backups:
             print("❌ No hay backups disponibles para restaurar")
@@ -137,11 +161,14 @@ class GestorBackups:
             print(f"❌ Número de backup inválido. Debe ser entre 1 y {len(backups)}")
             return False
         
-        backup_seleccionado = backups[numero_backup - 1]
+        backup_seleccionado = backups[numero_backup - 1]['path']
+        if not backup_seleccionado.exists():
+            print(f"❌ No se encontró {backup_seleccionado.name}. Ejecuta: python gestionar_backups.py --reindex")
+            return False
         
         print(f"\n⚠️  ADVERTENCIA: Vas a restaurar el siguiente backup:")
         print(f"   📁 {backup_seleccionado.name}")
-        print(f"   📅 {datetime.fromtimestamp(backup_seleccionado.stat().st_mtime).strftime('%d/%m/%Y %H:%M:%S')}")
+        print(f"   📅 {backups[numero_backup - 1]['fecha'].strftime('%d/%m/%Y %H:%M:%S')}")
         print(f"\n   Esto SOBRESCRIBIRÁ la base de datos actual.")
         
         respuesta = input("\n¿Estás seguro? Escribe 'SI' para confirmar: ")
@@ -151,26 +178,47 @@ class GestorBackups:
             return False
         
         try:
-            # Crear backup de seguridad antes de restaurar
-            print("\n📦 Creando backup de seguridad de la BD actual...")
-            backup_seguridad = self.crear_backup(tipo="pre_restauracion")
-            
-            if backup_seguridad:
-                # Restaurar el backup seleccionado
-                print(f"\n🔄 Restaurando backup...")
-                shutil.copy2(backup_seleccionado, self.db_file)
+            with tempfile.TemporaryDirectory(dir=self.backup_dir) as tmp:
+                # Los backups del almacén se arman primero desde sus bloques
+                if almacen_backups.es_manifiesto_almacen(backup_seleccionado):
+                    archivo = Path(tmp) / "restaurar.db"
+                    almacen_backups.reconstruir(backup_seleccionado, archivo)
+                else:
+                    archivo = backup_seleccionado
                 
-                print(f"\n✅ Backup restaurado exitosamente")
-                print(f"   📁 Base de datos actualizada: {self.db_file}")
-                print(f"   💾 Backup de seguridad guardado: {backup_seguridad.name}")
+                valido, mensaje = respaldo.verificar_backup(archivo)
+                if not valido:
+                    print(f"❌ El backup no es válido ({mensaje}). Restauración cancelada.")
+                    return False
                 
-                # Mostrar contenido restaurado
-                self.mostrar_estadisticas()
+                # Crear backup de seguridad antes de restaurar
+                print("\n📦 Creando backup de seguridad de la BD actual...")
+                backup_seguridad = self.crear_backup(tipo="pre_restauracion")
+                if not backup_seguridad:
+                    print("❌ No se pudo crear backup de seguridad. Restauración cancelada.")
+                    return False
                 
-                return True
-            else:
-                print("❌ No se pudo crear backup de seguridad. Restauración cancelada.")
-                return False
+                # Restaurar el backup seleccionado
+                print(f"\n🔄 Restaurando backup...")
+                # Copia página a página a través de SQLite: respeta el WAL y
+                # los bloqueos de las sesiones abiertas (copy2 encima no)
+                origen = sqlite3.connect(archivo)
+                destino = base_datos.conectar(self.db_file)
+                try:
+                    origen.backup(destino)
+                    cache_tablas.nueva_generacion(destino)
+                finally:
+                    origen.close()
+                    destino.close()
+            
+            print(f"\n✅ Backup restaurado exitosamente")
+            print(f"   📁 Base de datos actualizada: {self.db_file}")
+            print(f"   💾 Backup de seguridad guardado: {backup_seguridad.name}")
+            
+            # Mostrar contenido restaurado
+            self.mostrar_estadisticas()
+            
+            return True
                 
         except Exception as e:
             print(f"❌ Error al restaurar backup: {str(e)}")
@@ -185,40 +233,20 @@ class GestorBackups:
             
             print("\n📥 Exportando a Excel...")
             
-            conn = sqlite3.connect(self.db_file)
-            entradas = pd.read_sql_query("SELECT * FROM entradas", conn)
-            salidas = pd.read_sql_query("SELECT * FROM salidas", conn)
-            conn.close()
-            
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = self.exports_dir / f"inventario_completo_{timestamp}.xlsx"
-            
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-                # Exportar entradas (sin columnas internas)
-                columnas_entradas = [
-                    'orden_compra', 'fecha', 'codigo', 'producto', 'cantidad', 'um', 
-                    'sistema', 'almacen_salida', 'fecha_envio', 'responsable_envio',
-                    'almacen_recepcion', 'fecha_recepcion', 'responsable_recepcion'
-                ]
-                df_entradas = entradas[[col for col in columnas_entradas if col in entradas.columns]]
-                df_entradas.to_excel(writer, sheet_name='Entradas', index=False)
-                
-                # Exportar salidas (sin columnas internas)
-                columnas_salidas = [
-                    'nro_guia', 'nro_tarea', 'fecha', 'cod_sitio', 'sitio', 
-                    'departamento', 'codigo', 'producto', 'code_indra', 'descripcion',
-                    'cantidad', 'um', 'sistema'
-                ]
-                df_salidas = salidas[[col for col in columnas_salidas if col in salidas.columns]]
-                df_salidas.to_excel(writer, sheet_name='Salidas', index=False)
+            # Por tramos; si los datos no cambiaron se reutiliza la última exportación
+            resumen = exportador.exportar_versionado('xlsx', self.db_file, self.exports_dir)
+            filename = resumen['archivo']
             
             size_mb = filename.stat().st_size / (1024 * 1024)
             
+            if resumen['desde_cache']:
+                print("♻️  Sin cambios desde la última exportación: se reutiliza el archivo")
             print(f"✅ Excel exportado exitosamente:")
             print(f"   📁 Archivo: {filename.name}")
             print(f"   📊 Tamaño: {size_mb:.2f} MB")
-            print(f"   📥 Entradas: {len(entradas)} registros")
-            print(f"   📤 Salidas: {len(salidas)} registros")
+            print(f"   📥 Entradas: {resumen['filas']['entradas']} registros")
+            print(f"   📤 Salidas: {resumen['filas']['salidas']} registros")
+            print(f"   ⏱️  Tiempo: {resumen['segundos']} s")
             
             return filename
             
@@ -228,7 +256,7 @@ class GestorBackups:
     
     def limpiar_backups_antiguos(self, dias=30, mantener_minimo=10):
         """Elimina backups más antiguos que X días, manteniendo al menos Y backups"""
-        backups = sorted(self.backup_dir.glob("inventario_*.db"), reverse=True)
+        backups = self._buscar_backups()
         
         if not backups:
             print("📦 No hay backups para limpiar")
@@ -245,11 +273,11 @@ class GestorBackups:
         backups_a_revisar = backups[mantener_minimo:]
         
         for backup in backups_a_revisar:
-            fecha_backup = datetime.fromtimestamp(backup.stat().st_mtime)
+            fecha_backup = backup['fecha']
             
             if fecha_backup < fecha_limite:
-                print(f"   🗑️  Eliminando: {backup.name} ({fecha_backup.strftime('%d/%m/%Y')})")
-                backup.unlink()
+                print(f"   🗑️  Eliminando: {backup['nombre']} ({fecha_backup.strftime('%d/%m/%Y')})")
+                self._eliminar(backup['path'])
                 eliminados += 1
         
         if eliminados > 0:
@@ -258,8 +286,84 @@ class GestorBackups:
         else:
             print(f"\n✅ No hay backups antiguos para eliminar")
         
+        self.recolectar_basura()
+        self.podar_diario()
         return eliminados
     
+    def podar_diario(self):
+        """Quita del diario los cambios anteriores al backup más antiguo que sirve de base"""
+        posiciones = []
+        for backup in self._buscar_backups():
+            manifiesto = (almacen_backups.leer(backup['path']) if backup['formato'] == 'almacen'
+                          else respaldo.leer_manifiesto(backup['path']))
+            if manifiesto and manifiesto.get('diario'):
+                posiciones.append(manifiesto['diario']['seq'])
+        if not posiciones:
+            return 0
+        conn = base_datos.conectar(self.db_file)
+        try:
+            borrados = diario_cambios.podar(conn, min(posiciones))
+        finally:
+            conn.close()
+        if borrados:
+            print(f"📜 Diario de cambios: {borrados} cambios anteriores al backup más antiguo eliminados")
+        return borrados
+    
+    def restaurar_a_momento(self, texto_momento):
+        """Restaura la base al estado de una fecha y hora (backup base + diario de cambios)"""
+        try:
+            momento = diario_cambios.interpretar_momento(texto_momento)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return False
+        
+        print(f"\n⚠️  ADVERTENCIA: Vas a restaurar la base al {momento.strftime('%d/%m/%Y %H:%M:%S')} (hora de Perú)")
+        print(f"   Esto SOBRESCRIBIRÁ la base de datos actual (antes se guarda un backup de seguridad).")
+        
+        respuesta = input("\n¿Estás seguro? Escribe 'SI' para confirmar: ")
+        if respuesta.upper() != 'SI':
+            print("❌ Restauración cancelada")
+            return False
+        
+        def backup_de_seguridad():
+            print("\n📦 Creando backup de seguridad de la BD actual...")
+            return self.crear_backup(tipo="pre_restauracion") is not None
+        
+        try:
+            print("\n🔄 Reconstruyendo la base a ese momento...")
+            resumen = diario_cambios.restaurar_a(momento, self.backup_dir, self.db_file,
+                                                 antes_de_reemplazar=backup_de_seguridad)
+        except Exception as e:
+            print(f"❌ Error al restaurar: {str(e)}")
+            return False
+        
+        if resumen is None:
+            print("❌ No se pudo crear backup de seguridad. Restauración cancelada.")
+            return False
+        
+        print(f"\n✅ Base restaurada al {momento.strftime('%d/%m/%Y %H:%M:%S')}")
+        print(f"   📁 Backup base: {resumen['backup_base']} ({resumen['fecha_base'].strftime('%d/%m/%Y %H:%M:%S')})")
+        print(f"   📜 Cambios reproducidos: {resumen['cambios_reproducidos']}")
+        print(f"   ⏱️  Tiempo: {resumen['segundos']:.2f} s")
+        self.mostrar_estadisticas()
+        return True
+    
+    def _eliminar(self, backup):
+        if backup.suffix == '.json':
+            almacen_backups.eliminar(backup)
+        else:
+            respaldo.eliminar_backup(backup)
+            catalogo_backups.quitar(self.backup_dir, backup.name)
+    
+    def recolectar_basura(self):
+        """Borra del almacén los bloques que ya no usa ningún backup"""
+        borrados, liberados = almacen_backups.recolectar_basura(self.backup_dir)
+        logico, fisico = almacen_backups.uso_disco(self.backup_dir)
+        print(f"♻️  Bloques sin referencia eliminados: {borrados} ({liberados / (1024 * 1024):.2f} MB liberados)")
+        print(f"   Almacén: {fisico / (1024 * 1024):.2f} MB en disco para "
+              f"{logico / (1024 * 1024):.2f} MB de backups")
+        return borrados
+    
     def mostrar_estadisticas(self):
         """Muestra estadísticas de la base de datos actual"""
         try:
@@ -267,7 +371,7 @@ class GestorBackups:
                 print(f"❌ No se encontró la base de datos: {self.db_file}")
                 return
             
-            conn = sqlite3.connect(self.db_file)
+            conn = base_datos.conectar(self.db_file)
             cursor = conn.cursor()
             
             # Contar registros
@@ -317,6 +421,7 @@ def menu_interactivo():
         print("4. 🔄 Restaurar backup")
         print("5. 📥 Exportar a Excel")
         print("6. 🧹 Limpiar backups antiguos")
+        print("7. 🗂️  Reconstruir catálogo de backups")
         print("0. ❌ Salir")
         
         try:
@@ -352,6 +457,9 @@ def menu_interactivo():
                 except ValueError:
                     print("❌ Valores inválidos")
             
+            elif opcion == "7":
+                gestor.reindexar()
+            
             elif opcion == "0":
                 print("\n👋 ¡Hasta luego!")
                 break
@@ -371,10 +479,17 @@ def main():
     parser.add_argument('--crear', action='store_true', help='Crear backup manual')
     parser.add_argument('--listar', action='store_true', help='Listar backups disponibles')
     parser.add_argument('--restaurar', type=int, metavar='N', help='Restaurar backup número N')
+    parser.add_argument('--restaurar-a', metavar='"AAAA-MM-DD HH:MM"',
+                        help='Restaurar la base al estado de esa fecha y hora (hora de Perú)')
     parser.add_argument('--exportar', action='store_true', help='Exportar a Excel')
     parser.add_argument('--limpiar', action='store_true', help='Limpiar backups antiguos')
+    parser.add_argument('--gc', action='store_true', help='Borrar bloques sin referencia del almacén')
     parser.add_argument('--estadisticas', action='store_true', help='Mostrar estadísticas')
     parser.add_argument('--detallado', action='store_true', help='Información detallada (con --listar)')
+    parser.add_argument('--tipo', help='Filtrar por tipo: manual, auto, pre_restauracion (con --listar)')
+    parser.add_argument('--desde', help='Desde la fecha AAAA-MM-DD (con --listar)')
+    parser.add_argument('--hasta', help='Hasta la fecha AAAA-MM-DD inclusive (con --listar)')
+    parser.add_argument('--reindex', action='store_true', help='Reconstruir el catálogo de backups')
     
     args = parser.parse_args()
     gestor = GestorBackups()
@@ -385,21 +500,30 @@ def main():
         return
     
     # Procesar argumentos
+    if args.reindex:
+        gestor.reindexar()
+    
     if args.crear:
         gestor.crear_backup("manual")
     
     if args.listar:
-        gestor.listar_backups(args.detallado)
+        gestor.listar_backups(args.detallado, args.tipo, args.desde, args.hasta)
     
     if args.restaurar:
         gestor.restaurar_backup(args.restaurar)
     
+    if args.restaurar_a:
+        gestor.restaurar_a_momento(args.restaurar_a)
+    
     if args.exportar:
         gestor.exportar_excel()
     
     if args.limpiar:
         gestor.limpiar_backups_antiguos()
     
+    if args.gc:
+        gestor.recolectar_basura()
+    
     if args.estadisticas:
         gestor.mostrar_estadisticas()
 
@@ -0,0 +1,218 @@
+"""
+IMAGEN COMPRIMIDA DE LA BASE (ARRANQUE EN FRÍO)
+===============================================
+Alternativa binaria a los snapshots JSON (<tabla>_persist.json): una copia de
+inventario.db comprimida con gzip en backups_sistema/inventario_imagen.bin.
+
+Formato del archivo:
+- Primera línea: cabecera JSON con el formato, su versión, la versión del
+  esquema, el conteo de filas, el tamaño y el SHA-256 de la base sin comprimir.
+- Resto: la base SQLite (journal DELETE) comprimida con gzip.
+
+Restaurar ya no reinserta fila por fila: se descomprime, se verifica el
+checksum (la copia pasó integrity_check al crearse), se reproducen sobre ella las bitácoras (tras la
+compactación solo traen los cambios posteriores a la imagen) y se copia página
+a página sobre la base vacía con la API de backup.
+
+La imagen no incluye el diario de cambios ni el registro de ids modificados:
+son historia de la sesión anterior y no hacen falta para arrancar.
+"""
+
+import gzip
+import hashlib
+import json
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import base_datos
+import bitacora
+import cache_tablas
+import diario_cambios
+import esquema
+import respaldo
+from base_datos import COLUMNAS, DB_FILE
+
+# Configuración
+FORMATO_IMAGEN = "inventario-sqlite-gzip"
+VERSION_IMAGEN = 1
+NIVEL_COMPRESION = 6
+TAMANO_BLOQUE = 1024 * 1024
+TABLAS_SIN_HISTORIA = ('diario_cambios', 'registros_modificados')
+
+
+def _snapshot_con_datos(destino):
+    """True si el snapshot vigente (imagen o, sin ella, los JSON) tiene más filas de las que borran las bitácoras"""
+    borrados = sum(c.get('op') == 'delete' for t in bitacora.TABLAS for c in bitacora.leer_bitacora(t))
+    if destino.exists():
+        try:
+            return sum(leer_cabecera(destino)['filas'].get(t, 0) for t in bitacora.TABLAS) > borrados
+        except ValueError:
+            # Imagen ilegible: puede ser lo único que tiene los datos, no se reemplaza
+            return True
+    # Un snapshot JSON vacío es "[]"; sin imagen basta con saber que hay algo
+    return not borrados and any(
+        bitacora.archivo_snapshot(t).exists() and bitacora.archivo_snapshot(t).stat().st_size > 4
+        for t in bitacora.TABLAS
+    )
+
+
+def crear(destino=None, db_file=DB_FILE):
+    """Escribe la imagen comprimida de la base y devuelve su cabecera (dict).
+
+    Lanza RuntimeError si la base está vacía pero el snapshot actual no (p. ej.
+    la restauración al iniciar falló): vaciar las bitácoras perdería datos.
+    """
+    destino = Path(destino or bitacora.archivo_imagen())
+    destino.parent.mkdir(exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=destino.parent) as tmp:
+        copia = Path(tmp) / "imagen.db"
+        manifiesto = respaldo.crear_backup(copia, db_file, tipo="imagen")
+        if not sum(manifiesto['filas'].get(t, 0) for t in bitacora.TABLAS) and _snapshot_con_datos(destino):
+            raise RuntimeError("La base está vacía y el snapshot no: no se reemplaza la imagen")
+
+        conn = sqlite3.connect(copia, isolation_level=None)
+        try:
+            existentes = {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for tabla in TABLAS_SIN_HISTORIA:
+                if tabla in existentes:
+                    conn.execute(f"DELETE FROM {tabla}")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+        datos = copia.read_bytes()
+        cabecera = {
+            'formato': FORMATO_IMAGEN,
+            'version': VERSION_IMAGEN,
+            'version_esquema': manifiesto['version_esquema'],
+            'filas': manifiesto['filas'],
+            'bytes': len(datos),
+            'sha256': hashlib.sha256(datos).hexdigest(),
+            'fecha': datetime.now().isoformat(timespec='seconds')
+        }
+        # mtime=0: la misma base produce los mismos bytes comprimidos
+        comprimido = gzip.compress(datos, compresslevel=NIVEL_COMPRESION, mtime=0)
+
+    tmp = destino.with_name(destino.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(json.dumps(cabecera, ensure_ascii=False).encode('utf-8') + b"\n")
+        f.write(comprimido)
+    tmp.replace(destino)
+    return cabecera
+
+
+def leer_cabecera(path=None):
+    """Cabecera de la imagen; lanza ValueError si el archivo no es una imagen válida"""
+    path = Path(path or bitacora.archivo_imagen())
+    with open(path, 'rb') as f:
+        linea = f.readline()
+    try:
+        cabecera = json.loads(linea)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError(f"{path.name} no tiene una cabecera válida")
+    if not isinstance(cabecera, dict) or cabecera.get('formato') != FORMATO_IMAGEN:
+        raise ValueError(f"{path.name} no es una imagen de inventario")
+    if cabecera.get('version', 0) > VERSION_IMAGEN:
+        raise ValueError(f"Imagen en formato {cabecera.get('version')}, "
+                         f"esta versión de la app solo lee hasta el {VERSION_IMAGEN}")
+    if cabecera.get('version_esquema', 0) > esquema.VERSION_ESQUEMA:
+        raise ValueError(f"Imagen con esquema {cabecera.get('version_esquema')}, "
+                         f"más nuevo que el de la app ({esquema.VERSION_ESQUEMA})")
+    return cabecera
+
+
+def extraer(path, destino):
+    """Descomprime la imagen en `destino` verificando tamaño y checksum; devuelve la cabecera"""
+    path = Path(path)
+    cabecera = leer_cabecera(path)
+    h = hashlib.sha256()
+    total = 0
+    with open(path, 'rb') as f:
+        f.readline()
+        try:
+            with gzip.GzipFile(fileobj=f, mode='rb') as gz, open(destino, 'wb') as salida:
+                for bloque in iter(lambda: gz.read(TAMANO_BLOQUE), b''):
+                    h.update(bloque)
+                    total += len(bloque)
+                    salida.write(bloque)
+        except (OSError, EOFError) as e:
+            raise ValueError(f"{path.name} está dañado: {e}")
+    # La copia pasó integrity_check al crear la imagen: basta con que los bytes sean los mismos
+    if total != cabecera.get('bytes') or h.hexdigest() != cabecera.get('sha256'):
+        raise ValueError(f"El checksum de {path.name} no coincide con su cabecera")
+    return cabecera
+
+
+def _aplicar_bitacora(conn, tabla):
+    """Reproduce la bitácora de la tabla sobre la base (cambios posteriores a la imagen)"""
+    columnas = ['id'] + COLUMNAS[tabla]
+    fechas = set(esquema.COLUMNAS_FECHA[tabla])
+    insertar = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})"
+    cambios = bitacora.leer_bitacora(tabla)
+    for cambio in cambios:
+        if cambio.get('op') == 'insert':
+            fila = cambio['row']
+            # DELETE + INSERT en vez de REPLACE: así corren los triggers del libro de stock
+            conn.execute(f"DELETE FROM {tabla} WHERE id = ?", (int(fila['id']),))
+            conn.execute(insertar, tuple(
+                esquema.fecha_iso(fila.get(col)) if col in fechas else fila.get(col) for col in columnas
+            ))
+        elif cambio.get('op') == 'delete':
+            conn.execute(f"DELETE FROM {tabla} WHERE id = ?", (int(cambio['id']),))
+    return len(cambios)
+
+
+def restaurar(tablas, path=None, db_file=DB_FILE):
+    """Vuelca la imagen (más las bitácoras) en las tablas vacías indicadas.
+
+    Si son todas las tablas, las bitácoras se aplican sobre la imagen
+    descomprimida y esta reemplaza la base entera con la API de backup; si no,
+    las filas se copian con INSERT ... SELECT desde la imagen adjunta.
+    Devuelve {tabla: filas} o lanza ValueError si la imagen no sirve.
+    """
+    path = Path(path or bitacora.archivo_imagen())
+    completa = set(tablas) == set(bitacora.TABLAS)
+    inicio = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=path.parent) as tmp:
+        archivo = Path(tmp) / "imagen.db"
+        cabecera = extraer(path, archivo)
+
+        if completa:
+            conn = sqlite3.connect(archivo, isolation_level=None)
+            # Imagen de un esquema anterior: migrar y reponer triggers
+            esquema.inicializar(conn)
+        else:
+            conn = base_datos.conectar(db_file)
+            # ATTACH no se permite dentro de una transacción
+            conn.execute("ATTACH DATABASE ? AS imagen", (str(archivo),))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                with diario_cambios.sin_registrar(conn):
+                    for tabla in tablas:
+                        if not completa:
+                            columnas = ', '.join(['id'] + COLUMNAS[tabla])
+                            conn.execute(f"INSERT INTO {tabla} ({columnas}) SELECT {columnas} FROM imagen.{tabla}")
+                        _aplicar_bitacora(conn, tabla)
+                    cache_tablas.nueva_generacion(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            restauradas = {tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0] for tabla in tablas}
+
+            if completa:
+                # Copia página a página sobre la base viva (un único paso al final)
+                actual = base_datos.conectar(db_file)
+                try:
+                    conn.backup(actual)
+                finally:
+                    actual.close()
+        finally:
+            conn.close()
+
+    print(f"📦 Imagen del {cabecera['fecha']} restaurada en {time.perf_counter() - inicio:.2f} s")
+    return restauradas
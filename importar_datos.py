@@ -8,23 +8,62 @@ INSTRUCCIONES DE USO:
 2. Ejecuta: python importar_datos.py
 3. Verifica que los datos se importaron correctamente
 
+MODO MASIVO (sin preguntas, para cargas históricas grandes):
+  python importar_datos.py --si
+  python importar_datos.py --si --entradas historico_entradas.xlsx --salidas historico_salidas.xlsx
+
+El Excel se lee por tramos en modo solo lectura, cada tramo se valida y
+normaliza por columnas y se junta en una tabla TEMP sin bloquear la base; al
+terminar el archivo, sus filas pasan a la tabla con un INSERT ... SELECT en
+una transacción corta. Las filas repetidas (misma orden_compra + codigo +
+fecha en entradas, mismo nro_guia + codigo en salidas) se omiten, así que
+volver a importar el mismo archivo no duplica nada.
+
+VARIOS ARCHIVOS (p. ej. los Excel mensuales de cada almacén):
+  python importar_datos.py --varios data/mensual
+  python importar_datos.py --varios "data/mensual/2025-*.xlsx" --procesos 4
+
+Los archivos se leen en paralelo y se anotan (por su SHA-256) en la tabla
+`importaciones`; al repetir el comando solo se cargan los nuevos o los que
+quedaron a medias.
+
 IMPORTANTE: Guarda un backup de tus archivos Excel antes de ejecutar este script.
 """
 
+import argparse
+import glob
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
 import pandas as pd
-import sqlite3
 from pathlib import Path
 from datetime import datetime
+from itertools import islice
 import shutil
+import time
+from openpyxl import load_workbook
+import base_datos
+import esquema
+import respaldo
+from base_datos import DB_FILE
 
 # Configuración
-DB_FILE = "inventario.db"
 DATA_DIR = Path("data")
 BACKUP_DIR = Path("backups_importacion")
 ENTRADAS_FILE = DATA_DIR / "entradas.xlsx"
 SALIDAS_FILE = DATA_DIR / "salidas.xlsx"
+FILAS_POR_TRAMO = 10000
+MAX_RECHAZOS_REPORTADOS = 20
+FILA_EXCEL = '_fila_excel'
 
-def crear_backup_excel():
+# Una fila se considera repetida si ya existe otra con la misma clave natural
+CLAVES_NATURALES = {
+    'entradas': ['orden_compra', 'codigo', 'fecha'],
+    'salidas': ['nro_guia', 'codigo']
+}
+
+def crear_backup_excel(archivos=(ENTRADAS_FILE, SALIDAS_FILE)):
     """Crea un backup de los archivos Excel antes de importar"""
     print("\n📦 Creando backup de seguridad de archivos Excel...")
     
@@ -35,17 +74,11 @@ def crear_backup_excel():
     
     archivos_respaldados = []
     
-    if ENTRADAS_FILE.exists():
-        destino = backup_folder / "entradas.xlsx"
-        shutil.copy2(ENTRADAS_FILE, destino)
-        archivos_respaldados.append("entradas.xlsx")
-        print(f"  ✅ Respaldado: entradas.xlsx")
-    
-    if SALIDAS_FILE.exists():
-        destino = backup_folder / "salidas.xlsx"
-        shutil.copy2(SALIDAS_FILE, destino)
-        archivos_respaldados.append("salidas.xlsx")
-        print(f"  ✅ Respaldado: salidas.xlsx")
+    for archivo in map(Path, archivos):
+        if archivo.exists():
+            shutil.copy2(archivo, backup_folder / archivo.name)
+            archivos_respaldados.append(archivo.name)
+            print(f"  ✅ Respaldado: {archivo.name}")
     
     if archivos_respaldados:
         print(f"\n✅ Backup creado en: {backup_folder}")
@@ -59,204 +92,435 @@ def inicializar_base_datos():
     """Inicializa la base de datos SQLite con las tablas necesarias"""
     print("\n🔧 Inicializando base de datos SQLite...")
     
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Tabla de ENTRADAS
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS entradas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            orden_compra TEXT,
-            fecha TEXT,
-            codigo TEXT,
-            producto TEXT,
-            cantidad REAL,
-            um TEXT,
-            sistema TEXT,
-            almacen_salida TEXT,
-            fecha_envio TEXT,
-            responsable_envio TEXT,
-            almacen_recepcion TEXT,
-            fecha_recepcion TEXT,
-            responsable_recepcion TEXT,
-            creado_por TEXT,
-            fecha_creacion TEXT
-        )
-    ''')
-    
-    # Tabla de SALIDAS
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS salidas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nro_guia TEXT,
-            nro_tarea TEXT,
-            fecha TEXT,
-            cod_sitio TEXT,
-            sitio TEXT,
-            departamento TEXT,
-            codigo TEXT,
-            producto TEXT,
-            code_indra TEXT,
-            descripcion TEXT,
-            cantidad REAL,
-            um TEXT,
-            sistema TEXT,
-            creado_por TEXT,
-            fecha_creacion TEXT
-        )
-    ''')
-    
-    conn.commit()
+    # Mismo esquema y migraciones que app.py (incluye libro de stock y versiones)
+    conn = base_datos.conectar(DB_FILE)
+    esquema.inicializar(conn)
     conn.close()
     
     print("✅ Base de datos inicializada correctamente")
 
-def importar_entradas():
-    """Importa entradas desde Excel a SQLite"""
-    print("\n📥 Importando ENTRADAS...")
-    
-    if not ENTRADAS_FILE.exists():
-        print(f"⚠️  No se encontró el archivo: {ENTRADAS_FILE}")
-        print("   Creando tabla vacía...")
-        return 0
-    
+# ==================== IMPORTACIÓN MASIVA ====================
+
+def _nombre_columna(encabezado):
+    """'Orden Compra ' -> 'orden_compra'"""
+    return str(encabezado).strip().lower().replace(' ', '_') if encabezado is not None else None
+
+
+def leer_tramos(archivo, tamano=FILAS_POR_TRAMO):
+    """Lee el Excel en modo solo lectura y devuelve DataFrames de `tamano` filas.
+
+    Cada DataFrame trae la columna FILA_EXCEL con el número de fila original
+    (para reportar rechazos). Nunca hay más de un tramo en memoria.
+    """
+    libro = load_workbook(archivo, read_only=True, data_only=True)
     try:
-        # Leer Excel
-        df = pd.read_excel(ENTRADAS_FILE)
-        print(f"  📊 Registros encontrados en Excel: {len(df)}")
-        
-        # Mapear columnas (ajustar según tu estructura)
-        columnas_requeridas = [
-            'orden_compra', 'fecha', 'codigo', 'producto', 'cantidad', 'um', 
-            'sistema', 'almacen_salida', 'fecha_envio', 'responsable_envio',
-            'almacen_recepcion', 'fecha_recepcion', 'responsable_recepcion'
-        ]
-        
-        # Asegurar que todas las columnas existan
-        for col in columnas_requeridas:
-            if col not in df.columns:
-                df[col] = ''
-        
-        # Agregar metadatos si no existen
-        if 'creado_por' not in df.columns:
-            df['creado_por'] = 'Importado'
-        if 'fecha_creacion' not in df.columns:
-            df['fecha_creacion'] = datetime.now().strftime('%d/%m/%Y %I:%M %p')
-        
-        # Remover la columna 'id' si existe (se autogenerará)
-        if 'id' in df.columns:
-            df = df.drop('id', axis=1)
-        
-        # Importar a SQLite
-        conn = sqlite3.connect(DB_FILE)
-        
-        # Verificar si ya hay datos
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM entradas")
-        count_existente = cursor.fetchone()[0]
-        
-        if count_existente > 0:
-            print(f"  ⚠️  La tabla ya tiene {count_existente} registros")
-            respuesta = input("  ¿Deseas agregar los nuevos registros? (s/n): ")
-            if respuesta.lower() != 's':
-                conn.close()
-                print("  ❌ Importación de entradas cancelada")
-                return 0
-        
-        # Importar datos
-        registros_antes = count_existente
-        df.to_sql('entradas', conn, if_exists='append', index=False)
-        
-        # Verificar importación
-        cursor.execute("SELECT COUNT(*) FROM entradas")
-        registros_despues = cursor.fetchone()[0]
-        
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return
+        columnas = [_nombre_columna(c) for c in encabezado]
+        numero = 2
+        while True:
+            lote = list(islice(filas, tamano))
+            if not lote:
+                break
+            ancho = max(len(f) for f in lote)
+            # Celdas sin encabezado: nombre provisional y se descartan
+            nombres = [columnas[i] if i < len(columnas) and columnas[i] else f"_sin_nombre_{i}"
+                       for i in range(ancho)]
+            df = pd.DataFrame.from_records(lote, columns=nombres)
+            df = df.loc[:, ~df.columns.duplicated() & ~df.columns.str.startswith('_sin_nombre_')]
+            df[FILA_EXCEL] = range(numero, numero + len(lote))
+            numero += len(lote)
+            yield df
+    finally:
+        libro.close()
+
+
+def _texto(serie):
+    """Texto sin espacios sobrantes; vacíos como '' y 4500123.0 -> '4500123'"""
+    texto = serie.astype(object).where(serie.notna(), '').astype(str).str.strip()
+    return texto.str.replace(r'^(-?\d+)\.0$', r'\1', regex=True)
+
+
+def _fechas_iso(serie):
+    """Versión vectorizada de esquema.fecha_iso para una columna completa"""
+    texto = _texto(serie)
+    resultado = texto.copy()
+    pendiente = texto.ne('')
+    for formato in esquema.FORMATOS_FECHA:
+        if not pendiente.any():
+            break
+        fechas = pd.to_datetime(texto[pendiente], format=formato, errors='coerce')
+        reconocidas = fechas.index[fechas.notna()]
+        resultado.loc[reconocidas] = fechas.loc[reconocidas].dt.strftime('%Y-%m-%d')
+        pendiente.loc[reconocidas] = False
+    return resultado
+
+
+def normalizar_tramo(df, tabla):
+    """Valida y normaliza un tramo completo con operaciones por columna.
+
+    Devuelve (DataFrame con las columnas de la tabla en orden, rechazos) donde
+    rechazos es una lista de (fila de Excel, motivo).
+    """
+    columnas = base_datos.COLUMNAS[tabla]
+    vacio = pd.Series('', index=df.index, dtype=object)
+    limpio = pd.DataFrame(index=df.index)
+    for col in columnas:
+        serie = df[col] if col in df.columns else vacio
+        if col in esquema.COLUMNAS_FECHA[tabla]:
+            limpio[col] = _fechas_iso(serie)
+        elif col != 'cantidad':
+            limpio[col] = _texto(serie)
+
+    # Filas totalmente vacías (formato sobrante al final de la hoja): se ignoran
+    texto_cantidad = _texto(df['cantidad']) if 'cantidad' in df.columns else vacio
+    con_datos = limpio.ne('').any(axis=1) | texto_cantidad.ne('')
+    limpio = limpio[con_datos]
+    texto_cantidad = texto_cantidad[con_datos]
+    filas_excel = df.loc[con_datos, FILA_EXCEL]
+
+    cantidad = pd.to_numeric(texto_cantidad, errors='coerce')
+    cantidad_invalida = cantidad.isna() & texto_cantidad.ne('')
+    sin_producto = limpio['codigo'].eq('') & limpio['producto'].eq('')
+    limpio['cantidad'] = cantidad.fillna(base_datos.VALORES_POR_DEFECTO['cantidad'])
+
+    rechazos = (
+        [(fila, "cantidad no numérica") for fila in filas_excel[cantidad_invalida]] +
+        [(fila, "sin código ni producto") for fila in filas_excel[sin_producto & ~cantidad_invalida]]
+    )
+    limpio = limpio[~(cantidad_invalida | sin_producto)]
+
+    limpio['creado_por'] = limpio['creado_por'].mask(limpio['creado_por'].eq(''), 'Importado')
+    limpio['fecha_creacion'] = limpio['fecha_creacion'].mask(
+        limpio['fecha_creacion'].eq(''), datetime.now().strftime('%d/%m/%Y %I:%M %p'))
+    return limpio[columnas], rechazos
+
+
+def filas_tramo(limpio):
+    """Tuplas listas para executemany (en el orden de base_datos.COLUMNAS)"""
+    return list(limpio.astype(object).itertuples(index=False, name=None))
+
+
+def _crear_preparacion(conn, nombre, tabla):
+    """Tabla TEMP donde se juntan los tramos de un archivo hasta que termina de leerse.
+
+    Es propia de la conexión y no toma el bloqueo de escritura de la base: la
+    app puede seguir registrando movimientos mientras el archivo se lee.
+    """
+    conn.execute(f"CREATE TEMP TABLE {nombre} (orden INTEGER PRIMARY KEY, {', '.join(base_datos.COLUMNAS[tabla])})")
+
+
+def preparar_tramo(conn, nombre, tabla, filas):
+    """Agrega filas ya normalizadas a la tabla de preparación del archivo"""
+    columnas = base_datos.COLUMNAS[tabla]
+    conn.executemany(
+        f"INSERT INTO {nombre} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})", filas
+    )
+
+
+def confirmar_preparacion(conn, nombre, tabla):
+    """Pasa las filas preparadas a `tabla` con un INSERT ... SELECT; devuelve cuántas entraron.
+
+    Va dentro de la transacción del llamador. Omite las filas cuya clave
+    natural ya existe y, entre las repetidas del propio archivo, todas menos
+    la primera.
+    """
+    columnas = ', '.join(base_datos.COLUMNAS[tabla])
+    claves = ', '.join(CLAVES_NATURALES[tabla])
+    condicion = ' AND '.join(f"t.{col} IS p.{col}" for col in CLAVES_NATURALES[tabla])
+    cursor = conn.execute(
+        f"INSERT INTO {tabla} ({columnas}) "
+        f"SELECT {columnas} FROM {nombre} p "
+        f"WHERE p.orden IN (SELECT MIN(orden) FROM {nombre} GROUP BY {claves}) "
+        f"AND NOT EXISTS (SELECT 1 FROM {tabla} t WHERE {condicion}) "
+        f"ORDER BY p.orden"
+    )
+    return cursor.rowcount
+
+
+def _descartar_preparacion(conn, nombre):
+    conn.execute(f"DROP TABLE IF EXISTS temp.{nombre}")
+
+
+def _resumen_vacio(archivo, tabla):
+    return {'archivo': Path(archivo).name, 'tabla': tabla, 'leidas': 0,
+            'insertadas': 0, 'duplicadas': 0, 'rechazadas': 0, 'rechazos': []}
+
+
+def _sumar_tramo(resumen, leidas, validas, insertadas, rechazos):
+    resumen['leidas'] += leidas
+    resumen['insertadas'] += insertadas
+    resumen['duplicadas'] += validas - insertadas
+    resumen['rechazadas'] += len(rechazos)
+    resumen['rechazos'].extend(rechazos[:MAX_RECHAZOS_REPORTADOS - len(resumen['rechazos'])])
+
+
+def registrar_importacion(conn, resumen, sha256):
+    """Anota el archivo en el manifiesto, en la misma transacción que sus filas"""
+    conn.execute(
+        "INSERT OR REPLACE INTO importaciones "
+        "(sha256, archivo, tabla, leidas, insertadas, duplicadas, rechazadas, fecha) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (sha256, resumen['archivo'], resumen['tabla'], resumen['leidas'], resumen['insertadas'],
+         resumen['duplicadas'], resumen['rechazadas'], datetime.now().isoformat(timespec='seconds'))
+    )
+
+
+def importar_excel(archivo, tabla, db_file=DB_FILE, tamano=FILAS_POR_TRAMO):
+    """Importa un Excel completo a `tabla` sin preguntas.
+
+    Lee por tramos (memoria acotada) y junta las filas normalizadas en una
+    tabla TEMP, sin tomar el bloqueo de escritura: la app sigue registrando
+    movimientos mientras el archivo se lee. Al final, una transacción corta
+    pasa las filas con un INSERT ... SELECT (omitiendo las que ya existen) y
+    anota el archivo en `importaciones`.
+    Devuelve un resumen (dict); ante un error no queda nada a medias.
+    """
+    inicio = time.perf_counter()
+    resumen = _resumen_vacio(archivo, tabla)
+    nombre = "preparacion_excel"
+
+    conn = base_datos.conectar(db_file)
+    try:
+        # La tabla de preparación puede ser grande: en disco, no en memoria
+        conn.execute("PRAGMA temp_store = FILE")
+        _crear_preparacion(conn, nombre, tabla)
+        validas = 0
+        for df in leer_tramos(archivo, tamano):
+            limpio, rechazos = normalizar_tramo(df, tabla)
+            preparar_tramo(conn, nombre, tabla, filas_tramo(limpio))
+            validas += len(limpio)
+            _sumar_tramo(resumen, len(df), 0, 0, rechazos)
+        sha = respaldo.sha256_archivo(archivo)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _sumar_tramo(resumen, 0, validas, confirmar_preparacion(conn, nombre, tabla), [])
+            registrar_importacion(conn, resumen, sha)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        # Cerrar la conexión descarta la tabla TEMP
         conn.close()
-        
-        registros_importados = registros_despues - registros_antes
-        print(f"  ✅ Entradas importadas: {registros_importados}")
-        return registros_importados
-        
+
+    resumen['segundos'] = round(time.perf_counter() - inicio, 2)
+    return resumen
+
+
+def _mostrar_resumen(resumen):
+    print(f"  📊 Filas leídas del Excel: {resumen['leidas']}")
+    print(f"  ✅ Insertadas: {resumen['insertadas']}")
+    if resumen['duplicadas']:
+        print(f"  ♻️  Omitidas por estar repetidas ({' + '.join(CLAVES_NATURALES[resumen['tabla']])}): "
+              f"{resumen['duplicadas']}")
+    if resumen['rechazadas']:
+        print(f"  ⚠️  Rechazadas: {resumen['rechazadas']}")
+        for fila, motivo in resumen['rechazos']:
+            print(f"     - fila {fila}: {motivo}")
+    print(f"  ⏱️  Tiempo: {resumen['segundos']} s")
+
+
+# ==================== IMPORTACIÓN DE VARIOS ARCHIVOS ====================
+
+def buscar_archivos(patron):
+    """Carpeta (todos sus .xlsx) o patrón glob -> lista ordenada de archivos"""
+    path = Path(patron)
+    archivos = path.glob('*.xlsx') if path.is_dir() else map(Path, glob.glob(str(patron), recursive=True))
+    # ~$nombre.xlsx es el archivo de bloqueo que deja Excel abierto
+    return sorted(p for p in archivos if p.is_file() and not p.name.startswith('~$'))
+
+
+def detectar_tabla(columnas):
+    """Tabla destino según los encabezados del Excel"""
+    if 'nro_guia' in columnas:
+        return 'salidas'
+    if 'orden_compra' in columnas:
+        return 'entradas'
+    return None
+
+
+def _parsear_archivo(indice, archivo, tabla, tamano, cola):
+    """Corre en un proceso del pool: lee y normaliza el Excel y manda cada tramo a la cola.
+
+    La cola tiene tamaño fijo: si el escritor va atrasado, el proceso espera
+    en lugar de acumular tramos en memoria.
+    """
+    try:
+        for df in leer_tramos(archivo, tamano):
+            if tabla is None:
+                tabla = detectar_tabla(df.columns)
+                if tabla is None:
+                    raise ValueError("no se reconoce la tabla (faltan las columnas nro_guia u orden_compra)")
+            limpio, rechazos = normalizar_tramo(df, tabla)
+            cola.put(('tramo', indice, tabla, len(df), filas_tramo(limpio), rechazos))
+        cola.put(('fin', indice, tabla))
     except Exception as e:
-        print(f"  ❌ Error al importar entradas: {str(e)}")
-        return 0
+        cola.put(('error', indice, f"{type(e).__name__}: {e}"))
 
-def importar_salidas():
-    """Importa salidas desde Excel a SQLite"""
-    print("\n📤 Importando SALIDAS...")
-    
-    if not SALIDAS_FILE.exists():
-        print(f"⚠️  No se encontró el archivo: {SALIDAS_FILE}")
-        print("   Creando tabla vacía...")
-        return 0
-    
+
+def importar_varios(patron, tabla=None, db_file=DB_FILE, procesos=None, reimportar=False,
+                    tamano=FILAS_POR_TRAMO):
+    """Importa todos los Excel de una carpeta o patrón glob.
+
+    - Los archivos se leen y normalizan en paralelo en un pool de procesos
+      (openpyxl usa CPU); un único escritor, este proceso, inserta los tramos.
+    - Los tramos de cada archivo se juntan en una tabla TEMP propia, sin tomar
+      el bloqueo de escritura. Cuando el archivo termina, sus filas pasan a
+      entradas/salidas con un INSERT ... SELECT en una transacción corta, junto
+      con su fila en la tabla `importaciones` (sha256 -> filas). Un archivo con
+      error no deja ninguna fila. Al volver a ejecutar se omiten los archivos
+      ya registrados y se reintentan los demás.
+    - `tabla=None` detecta entradas/salidas por los encabezados de cada archivo.
+
+    Devuelve la lista de resúmenes por archivo.
+    """
+    inicio = time.perf_counter()
+    archivos = buscar_archivos(patron)
+    if not archivos:
+        print(f"⚠️  No se encontraron archivos .xlsx en: {patron}")
+        return []
+
+    conn = base_datos.conectar(db_file)
     try:
-        # Leer Excel
-        df = pd.read_excel(SALIDAS_FILE)
-        print(f"  📊 Registros encontrados en Excel: {len(df)}")
-        
-        # Mapear columnas
-        columnas_requeridas = [
-            'nro_guia', 'nro_tarea', 'fecha', 'cod_sitio', 'sitio', 
-            'departamento', 'codigo', 'producto', 'code_indra', 'descripcion',
-            'cantidad', 'um', 'sistema'
-        ]
-        
-        # Asegurar que todas las columnas existan
-        for col in columnas_requeridas:
-            if col not in df.columns:
-                df[col] = ''
-        
-        # Agregar metadatos
-        if 'creado_por' not in df.columns:
-            df['creado_por'] = 'Importado'
-        if 'fecha_creacion' not in df.columns:
-            df['fecha_creacion'] = datetime.now().strftime('%d/%m/%Y %I:%M %p')
-        
-        # Remover la columna 'id' si existe
-        if 'id' in df.columns:
-            df = df.drop('id', axis=1)
-        
-        # Importar a SQLite
-        conn = sqlite3.connect(DB_FILE)
-        
-        # Verificar si ya hay datos
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM salidas")
-        count_existente = cursor.fetchone()[0]
-        
-        if count_existente > 0:
-            print(f"  ⚠️  La tabla ya tiene {count_existente} registros")
-            respuesta = input("  ¿Deseas agregar los nuevos registros? (s/n): ")
-            if respuesta.lower() != 's':
-                conn.close()
-                print("  ❌ Importación de salidas cancelada")
-                return 0
-        
-        # Importar datos
-        registros_antes = count_existente
-        df.to_sql('salidas', conn, if_exists='append', index=False)
-        
-        # Verificar importación
-        cursor.execute("SELECT COUNT(*) FROM salidas")
-        registros_despues = cursor.fetchone()[0]
-        
+        importados = {fila[0] for fila in conn.execute("SELECT sha256 FROM importaciones")}
+        pendientes = []
+        for archivo in archivos:
+            sha = respaldo.sha256_archivo(archivo)
+            if sha in importados and not reimportar:
+                print(f"  ⏭️  {archivo.name}: ya importado (se omite)")
+                continue
+            if any(sha == otro for _, otro in pendientes):
+                print(f"  ⏭️  {archivo.name}: mismo contenido que otro archivo de la lista (se omite)")
+                continue
+            pendientes.append((archivo, sha))
+        if not pendientes:
+            print("✅ No hay archivos nuevos para importar")
+            return []
+
+        procesos = procesos or max(1, min(len(pendientes), (os.cpu_count() or 2) - 1))
+        print(f"\n📚 Importando {len(pendientes)} archivos con {procesos} procesos...")
+        resumenes = {i: _resumen_vacio(archivo, tabla) for i, (archivo, _) in enumerate(pendientes)}
+        terminados = set()
+
+        # Las tablas de preparación pueden ser grandes: en disco, no en memoria
+        conn.execute("PRAGMA temp_store = FILE")
+        with Manager() as manager, ProcessPoolExecutor(max_workers=procesos) as pool:
+            cola = manager.Queue(maxsize=procesos * 2)
+            futuros = {pool.submit(_parsear_archivo, i, str(archivo), tabla, tamano, cola): i
+                       for i, (archivo, _) in enumerate(pendientes)}
+            preparadas = {}    # índice -> filas válidas en su tabla de preparación
+            while len(terminados) < len(pendientes):
+                try:
+                    mensaje = cola.get(timeout=1)
+                except queue.Empty:
+                    # Un proceso que murió sin avisar (p. ej. sin memoria) no manda 'fin'
+                    for futuro, i in futuros.items():
+                        if i not in terminados and futuro.done() and futuro.exception() is not None:
+                            resumenes[i]['error'] = str(futuro.exception())
+                            _descartar_preparacion(conn, f"preparacion_{i}")
+                            terminados.add(i)
+                            print(f"  ❌ {resumenes[i]['archivo']}: {resumenes[i]['error']}")
+                    continue
+
+                tipo, i = mensaje[0], mensaje[1]
+                resumen = resumenes[i]
+                nombre = f"preparacion_{i}"
+                if tipo == 'tramo':
+                    _, _, tabla_archivo, leidas, filas, rechazos = mensaje
+                    resumen['tabla'] = tabla_archivo
+                    if i not in preparadas:
+                        _crear_preparacion(conn, nombre, tabla_archivo)
+                        preparadas[i] = 0
+                    preparar_tramo(conn, nombre, tabla_archivo, filas)
+                    preparadas[i] += len(filas)
+                    _sumar_tramo(resumen, leidas, 0, 0, rechazos)
+                    print(f"  ⏳ {resumen['archivo']}: {resumen['leidas']} filas leídas")
+                elif tipo == 'fin':
+                    resumen['tabla'] = mensaje[2] or resumen['tabla'] or '-'
+                    # Transacción corta: las filas del archivo y su fila en el
+                    # manifiesto entran juntas (punto de reanudación)
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        insertadas = confirmar_preparacion(conn, nombre, resumen['tabla']) if i in preparadas else 0
+                        _sumar_tramo(resumen, 0, preparadas.get(i, 0), insertadas, [])
+                        registrar_importacion(conn, resumen, pendientes[i][1])
+                        conn.execute("COMMIT")
+                    except BaseException:
+                        conn.execute("ROLLBACK")
+                        raise
+                    _descartar_preparacion(conn, nombre)
+                    terminados.add(i)
+                    print(f"  ✅ {resumen['archivo']} ({resumen['tabla']}): "
+                          f"{resumen['insertadas']} insertadas, {resumen['duplicadas']} repetidas, "
+                          f"{resumen['rechazadas']} rechazadas")
+                else:
+                    # Nada del archivo llegó a entradas/salidas: se descarta lo preparado
+                    resumen['error'] = mensaje[2]
+                    _descartar_preparacion(conn, nombre)
+                    terminados.add(i)
+                    print(f"  ❌ {resumen['archivo']}: {resumen['error']}")
+    finally:
         conn.close()
-        
-        registros_importados = registros_despues - registros_antes
-        print(f"  ✅ Salidas importadas: {registros_importados}")
-        return registros_importados
-        
+
+    segundos = round(time.perf_counter() - inicio, 2)
+    lista = [resumenes[i] for i in range(len(pendientes))]
+    for resumen in lista:
+        if resumen['rechazos']:
+            print(f"\n  ⚠️  Rechazos en {resumen['archivo']}:")
+            for fila, motivo in resumen['rechazos']:
+                print(f"     - fila {fila}: {motivo}")
+    errores = sum(1 for r in lista if 'error' in r)
+    print(f"\n📊 {sum(r['insertadas'] for r in lista)} filas insertadas de {len(lista)} archivos "
+          f"en {segundos} s" + (f" ({errores} con error, se reintentan en la próxima ejecución)" if errores else ""))
+    return lista
+
+
+def _importar(archivo, tabla, interactivo):
+    archivo = Path(archivo)
+    if not archivo.exists():
+        print(f"⚠️  No se encontró el archivo: {archivo}")
+        return 0
+
+    try:
+        if interactivo:
+            conn = base_datos.conectar(DB_FILE)
+            count_existente = conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+            conn.close()
+            if count_existente > 0:
+                print(f"  ⚠️  La tabla ya tiene {count_existente} registros (los repetidos se omiten)")
+                respuesta = input("  ¿Deseas agregar los nuevos registros? (s/n): ")
+                if respuesta.lower() != 's':
+                    print(f"  ❌ Importación de {tabla} cancelada")
+                    return 0
+
+        resumen = importar_excel(archivo, tabla)
+        _mostrar_resumen(resumen)
+        return resumen['insertadas']
+
     except Exception as e:
-        print(f"  ❌ Error al importar salidas: {str(e)}")
+        print(f"  ❌ Error al importar {tabla}: {str(e)}")
         return 0
 
+def importar_entradas(archivo=ENTRADAS_FILE, interactivo=True):
+    """Importa entradas desde Excel a SQLite"""
+    print("\n📥 Importando ENTRADAS...")
+    return _importar(archivo, 'entradas', interactivo)
+
+def importar_salidas(archivo=SALIDAS_FILE, interactivo=True):
+    """Importa salidas desde Excel a SQLite"""
+    print("\n📤 Importando SALIDAS...")
+    return _importar(archivo, 'salidas', interactivo)
+
 def verificar_importacion():
     """Verifica que los datos se importaron correctamente"""
     print("\n🔍 Verificando importación...")
     
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = base_datos.conectar(DB_FILE)
         cursor = conn.cursor()
         
         # Contar entradas
@@ -285,7 +549,7 @@ def mostrar_ejemplos():
     print("\n📋 Ejemplos de datos importados:")
     
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = base_datos.conectar(DB_FILE)
         
         print("\n  📥 ÚLTIMAS 3 ENTRADAS:")
         entradas = pd.read_sql_query("SELECT orden_compra, fecha, producto, cantidad, um FROM entradas ORDER BY id DESC LIMIT 3", conn)
@@ -310,20 +574,41 @@ def mostrar_ejemplos():
 
 def main():
     """Función principal de importación"""
+    parser = argparse.ArgumentParser(description='Importar Excel de entradas y salidas a SQLite')
+    parser.add_argument('--si', '-y', action='store_true', help='No preguntar nada (modo masivo)')
+    parser.add_argument('--entradas', default=ENTRADAS_FILE, help='Excel de entradas')
+    parser.add_argument('--salidas', default=SALIDAS_FILE, help='Excel de salidas')
+    parser.add_argument('--varios', metavar='CARPETA_O_PATRON',
+                        help='Importar todos los Excel de una carpeta o patrón (ej. "data/mensual/*.xlsx")')
+    parser.add_argument('--tabla', choices=['entradas', 'salidas'],
+                        help='Con --varios: tabla destino (por defecto se detecta por los encabezados)')
+    parser.add_argument('--procesos', type=int, help='Con --varios: procesos de lectura en paralelo')
+    parser.add_argument('--reimportar', action='store_true',
+                        help='Con --varios: importar también los archivos ya registrados')
+    args = parser.parse_args()
+    interactivo = not args.si
+    
     print("=" * 70)
     print("  SCRIPT DE IMPORTACIÓN DE DATOS A SQLite")
     print("  Sistema de Gestión de Consumibles y Stock")
     print("=" * 70)
     
+    if args.varios:
+        # Los archivos de origen no se modifican: no hace falta copiarlos antes
+        inicializar_base_datos()
+        importar_varios(args.varios, args.tabla, procesos=args.procesos, reimportar=args.reimportar)
+        verificar_importacion()
+        return
+    
     # Crear backup de seguridad
-    backup_folder = crear_backup_excel()
+    backup_folder = crear_backup_excel((args.entradas, args.salidas))
     
     # Inicializar base de datos
     inicializar_base_datos()
     
     # Importar datos
-    entradas_importadas = importar_entradas()
-    salidas_importadas = importar_salidas()
+    entradas_importadas = importar_entradas(args.entradas, interactivo)
+    salidas_importadas = importar_salidas(args.salidas, interactivo)
     
     # Verificar
     total_entradas, total_salidas = verificar_importacion()
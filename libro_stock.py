@@ -0,0 +1,163 @@
+"""
+LIBRO DE STOCK (TOTALES POR PRODUCTO)
+=====================================
+Tabla `stock_totales` con el total de entradas y salidas por código, mantenida
+por triggers de SQLite: se actualiza en la misma transacción que cada INSERT,
+UPDATE o DELETE sobre entradas/salidas, venga de la app, de una importación o
+de una restauración.
+
+Así el stock actual se lee en O(productos) en lugar de agrupar todos los
+movimientos en cada recarga.
+
+USO:
+  python libro_stock.py --verificar      # Compara el libro con los movimientos
+  python libro_stock.py --reconstruir    # Recalcula el libro desde cero
+"""
+
+import argparse
+import sys
+
+import base_datos
+from base_datos import DB_FILE
+
+TOLERANCIA = 1e-6
+
+ESQUEMA_LIBRO = '''
+    CREATE TABLE IF NOT EXISTS stock_totales (
+        codigo TEXT PRIMARY KEY,
+        total_entradas REAL NOT NULL DEFAULT 0,
+        total_salidas REAL NOT NULL DEFAULT 0
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_entradas_insert AFTER INSERT ON entradas BEGIN
+        INSERT INTO stock_totales (codigo, total_entradas) VALUES (COALESCE(NEW.codigo, ''), COALESCE(NEW.cantidad, 0))
+        ON CONFLICT(codigo) DO UPDATE SET total_entradas = total_entradas + excluded.total_entradas;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_entradas_delete AFTER DELETE ON entradas BEGIN
+        UPDATE stock_totales SET total_entradas = total_entradas - COALESCE(OLD.cantidad, 0)
+        WHERE codigo = COALESCE(OLD.codigo, '');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_entradas_update AFTER UPDATE OF codigo, cantidad ON entradas BEGIN
+        UPDATE stock_totales SET total_entradas = total_entradas - COALESCE(OLD.cantidad, 0)
+        WHERE codigo = COALESCE(OLD.codigo, '');
+        INSERT INTO stock_totales (codigo, total_entradas) VALUES (COALESCE(NEW.codigo, ''), COALESCE(NEW.cantidad, 0))
+        ON CONFLICT(codigo) DO UPDATE SET total_entradas = total_entradas + excluded.total_entradas;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_salidas_insert AFTER INSERT ON salidas BEGIN
+        INSERT INTO stock_totales (codigo, total_salidas) VALUES (COALESCE(NEW.codigo, ''), COALESCE(NEW.cantidad, 0))
+        ON CONFLICT(codigo) DO UPDATE SET total_salidas = total_salidas + excluded.total_salidas;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_salidas_delete AFTER DELETE ON salidas BEGIN
+        UPDATE stock_totales SET total_salidas = total_salidas - COALESCE(OLD.cantidad, 0)
+        WHERE codigo = COALESCE(OLD.codigo, '');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_salidas_update AFTER UPDATE OF codigo, cantidad ON salidas BEGIN
+        UPDATE stock_totales SET total_salidas = total_salidas - COALESCE(OLD.cantidad, 0)
+        WHERE codigo = COALESCE(OLD.codigo, '');
+        INSERT INTO stock_totales (codigo, total_salidas) VALUES (COALESCE(NEW.codigo, ''), COALESCE(NEW.cantidad, 0))
+        ON CONFLICT(codigo) DO UPDATE SET total_salidas = total_salidas + excluded.total_salidas;
+    END;
+'''
+
+CONSULTA_MOVIMIENTOS = '''
+    SELECT codigo, SUM(total_entradas), SUM(total_salidas) FROM (
+        SELECT COALESCE(codigo, '') AS codigo, COALESCE(cantidad, 0) AS total_entradas, 0 AS total_salidas FROM entradas
+        UNION ALL
+        SELECT COALESCE(codigo, '') AS codigo, 0, COALESCE(cantidad, 0) FROM salidas
+    ) GROUP BY codigo
+'''
+
+
+def instalar(conn):
+    """Crea la tabla y los triggers; si el libro es nuevo, lo llena desde los movimientos"""
+    existia = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stock_totales'"
+    ).fetchone()
+    conn.executescript(ESQUEMA_LIBRO)
+    if not existia:
+        reconstruir(conn)
+
+
+def reconstruir(conn):
+    """Recalcula el libro completo a partir de entradas y salidas"""
+    # SAVEPOINT: atómico tanto en modo autocommit como dentro de otra transacción
+    conn.execute("SAVEPOINT reconstruir_libro")
+    try:
+        conn.execute("DELETE FROM stock_totales")
+        conn.execute(f"INSERT INTO stock_totales (codigo, total_entradas, total_salidas) {CONSULTA_MOVIMIENTOS}")
+    except Exception:
+        conn.execute("ROLLBACK TO reconstruir_libro")
+        raise
+    finally:
+        conn.execute("RELEASE reconstruir_libro")
+    return conn.execute("SELECT COUNT(*) FROM stock_totales").fetchone()[0]
+
+
+def verificar(conn):
+    """Compara el libro con los movimientos; devuelve la lista de diferencias"""
+    esperado = {cod: (ent, sal) for cod, ent, sal in conn.execute(CONSULTA_MOVIMIENTOS)}
+    libro = {cod: (ent, sal) for cod, ent, sal in
+             conn.execute("SELECT codigo, total_entradas, total_salidas FROM stock_totales")}
+
+    diferencias = []
+    for codigo in sorted(set(esperado) | set(libro)):
+        ent_esp, sal_esp = esperado.get(codigo, (0, 0))
+        ent_lib, sal_lib = libro.get(codigo, (0, 0))
+        if abs(ent_esp - ent_lib) > TOLERANCIA or abs(sal_esp - sal_lib) > TOLERANCIA:
+            diferencias.append({
+                'codigo': codigo,
+                'entradas_libro': ent_lib, 'entradas_reales': ent_esp,
+                'salidas_libro': sal_lib, 'salidas_reales': sal_esp
+            })
+    return diferencias
+
+
+def leer_totales(conn):
+    """Devuelve {codigo: (total_entradas, total_salidas)} desde el libro"""
+    return {cod: (ent, sal) for cod, ent, sal in
+            conn.execute("SELECT codigo, total_entradas, total_salidas FROM stock_totales")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Libro de stock por producto')
+    parser.add_argument('--verificar', action='store_true', help='Comparar el libro con los movimientos')
+    parser.add_argument('--reconstruir', action='store_true', help='Recalcular el libro desde cero')
+    args = parser.parse_args()
+
+    if not (args.verificar or args.reconstruir):
+        parser.print_help()
+        return 0
+
+    conn = base_datos.conectar(DB_FILE)
+    try:
+        instalar(conn)
+
+        if args.verificar:
+            diferencias = verificar(conn)
+            if not diferencias:
+                print("✅ Libro de stock consistente con entradas y salidas")
+            else:
+                print(f"⚠️  {len(diferencias)} productos con diferencias:")
+                for d in diferencias:
+                    print(f"   • {d['codigo'] or '(sin código)'}: "
+                          f"entradas {d['entradas_libro']} ≠ {d['entradas_reales']}, "
+                          f"salidas {d['salidas_libro']} ≠ {d['salidas_reales']}")
+                if not args.reconstruir:
+                    print("   Ejecuta: python libro_stock.py --reconstruir")
+                    return 1
+
+        if args.reconstruir:
+            productos = reconstruir(conn)
+            print(f"✅ Libro de stock reconstruido: {productos} productos")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+PRONÓSTICO DE CONSUMO Y PUNTO DE REPOSICIÓN
+===========================================
+Para cada producto, a partir de las salidas de los últimos N días:
+
+- consumo diario promedio (días sin salidas cuentan como cero),
+- desviación estándar del consumo diario,
+- días de cobertura = stock actual / consumo diario,
+- fecha estimada de ruptura = fecha de referencia + días de cobertura,
+- punto de reposición = consumo diario × días de reposición
+                        + Z × desviación × √días de reposición (stock de seguridad).
+
+Los totales por producto salen de los acumulados diarios (`rollup_movimientos`)
+con un solo GROUP BY; el stock actual, de `ranking_stock`. Todo el cálculo es
+una pasada vectorizada de pandas/NumPy sobre una fila por producto.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Configuración
+VENTANA_DIAS = 90          # Días de historia para el consumo promedio
+DIAS_REPOSICION = 14       # Tiempo desde que se pide hasta que llega
+NIVEL_SERVICIO_Z = 1.65    # ~95 % de los periodos de reposición sin ruptura
+
+CONSULTA_CONSUMO = '''
+    SELECT valor AS Codigo, SUM(salidas) AS total, SUM(salidas * salidas) AS cuadrados
+    FROM rollup_movimientos
+    WHERE periodo = 'dia' AND dimension = 'codigo' AND fecha > ? AND fecha <= ?
+    GROUP BY valor
+'''
+
+CONSULTA_STOCK = '''
+    SELECT codigo AS Codigo, producto AS Producto, um AS UM, sistema AS SISTEMA, stock_actual
+    FROM ranking_stock
+'''
+
+
+def calcular(conn, referencia=None, ventana=VENTANA_DIAS, reposicion=DIAS_REPOSICION, z=NIVEL_SERVICIO_Z):
+    """DataFrame con una fila por producto de Stock.xlsx y sus indicadores de consumo.
+
+    Los productos sin salidas en la ventana quedan con consumo 0 y sin fecha de
+    ruptura (cobertura infinita).
+    """
+    referencia = referencia or date.today()
+    desde = referencia - timedelta(days=ventana)
+    consumo = pd.read_sql_query(CONSULTA_CONSUMO, conn, params=(desde.isoformat(), referencia.isoformat()))
+    df = pd.read_sql_query(CONSULTA_STOCK, conn).merge(consumo, on='Codigo', how='left')
+
+    total = df['total'].fillna(0).to_numpy(dtype=float)
+    cuadrados = df['cuadrados'].fillna(0).to_numpy(dtype=float)
+    stock = df['stock_actual'].to_numpy(dtype=float)
+
+    media = total / ventana
+    varianza = (cuadrados - total * total / ventana) / max(ventana - 1, 1)
+    desviacion = np.sqrt(np.clip(varianza, 0, None))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cobertura = np.where(media > 0, np.clip(stock, 0, None) / media, np.inf)
+
+    df['consumo_diario'] = media.round(3)
+    df['desviacion_diaria'] = desviacion.round(3)
+    df['dias_cobertura'] = cobertura.round(1)
+    df['stock_seguridad'] = (z * desviacion * np.sqrt(reposicion)).round(2)
+    df['punto_reposicion'] = (media * reposicion + df['stock_seguridad']).round(2)
+    df['reponer'] = (media > 0) & (stock <= df['punto_reposicion'].to_numpy())
+
+    finitos = np.isfinite(cobertura)
+    df['fecha_ruptura'] = pd.NaT
+    df.loc[finitos, 'fecha_ruptura'] = pd.Timestamp(referencia) + pd.to_timedelta(np.floor(cobertura[finitos]), unit='D')
+    return df.drop(columns=['total', 'cuadrados'])
+
+
+def ranking_ruptura(pronostico, k=10):
+    """Los k productos que se quedarán sin stock antes (solo los que tienen consumo)"""
+    con_consumo = pronostico[np.isfinite(pronostico['dias_cobertura'])]
+    return con_consumo.nsmallest(k, 'dias_cobertura')
@@ -0,0 +1,234 @@
+"""
+RANKINGS DE STOCK (VISTAS MATERIALIZADAS)
+=========================================
+Tabla `ranking_stock` con una fila por producto de Stock.xlsx: stock inicial,
+totales de entradas y salidas, stock actual, rotación, umbral crítico y si
+está por debajo de él. Cada columna de orden tiene su índice, así los TOP 10
+del dashboard y la lista de stock crítico se leen con `ORDER BY ... LIMIT k`
+recorriendo solo k filas del índice.
+
+Se mantiene por triggers sobre `stock_totales` (el libro de stock): cuando un
+movimiento cambia los totales de un código, solo se recalcula la fila de ese
+producto. `ranking_sistemas` lleva el stock actual sumado por SISTEMA con el
+mismo mecanismo.
+
+El catálogo (producto, UM, SISTEMA, stock inicial) se vuelve a cargar solo
+cuando cambia el hash de Stock.xlsx.
+
+Umbral crítico: por código, si no por SISTEMA, si no UMBRAL_CRITICO_DEFECTO.
+Se configuran en la tabla `umbrales_stock` (ver fijar_umbral).
+"""
+
+import math
+
+import pandas as pd
+
+# Configuración
+UMBRAL_CRITICO_DEFECTO = 100
+AMBITOS = ('codigo', 'sistema')
+TOP_DEFECTO = 10
+
+ESQUEMA_RANKING = [
+    '''CREATE TABLE IF NOT EXISTS ranking_stock (
+        codigo TEXT PRIMARY KEY,
+        producto TEXT,
+        um TEXT,
+        sistema TEXT,
+        stock_inicial REAL NOT NULL DEFAULT 0,
+        total_entradas REAL NOT NULL DEFAULT 0,
+        total_salidas REAL NOT NULL DEFAULT 0,
+        stock_actual REAL NOT NULL DEFAULT 0,
+        rotacion REAL NOT NULL DEFAULT 0,
+        umbral REAL NOT NULL DEFAULT 0,
+        critico INTEGER NOT NULL DEFAULT 0
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_ranking_stock_actual ON ranking_stock (stock_actual)",
+    "CREATE INDEX IF NOT EXISTS idx_ranking_total_salidas ON ranking_stock (total_salidas)",
+    "CREATE INDEX IF NOT EXISTS idx_ranking_rotacion ON ranking_stock (rotacion)",
+    "CREATE INDEX IF NOT EXISTS idx_ranking_critico ON ranking_stock (critico, stock_actual)",
+
+    '''CREATE TABLE IF NOT EXISTS ranking_sistemas (
+        sistema TEXT PRIMARY KEY,
+        stock_actual REAL NOT NULL DEFAULT 0
+    )''',
+
+    '''CREATE TABLE IF NOT EXISTS umbrales_stock (
+        ambito TEXT NOT NULL,
+        valor TEXT NOT NULL,
+        umbral REAL NOT NULL,
+        PRIMARY KEY (ambito, valor)
+    )''',
+
+    '''CREATE TABLE IF NOT EXISTS catalogo_stock (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version TEXT
+    )''',
+]
+
+# Columnas derivadas a partir de los totales `te` y `ts` (el stock inicial y el umbral no cambian aquí)
+RECALCULO = '''
+    total_entradas = {te}, total_salidas = {ts},
+    stock_actual = stock_inicial + {te} - {ts},
+    rotacion = CASE WHEN 2 * stock_inicial + {te} - {ts} = 0 THEN 0
+                    ELSE ROUND({ts} * 2.0 / (2 * stock_inicial + {te} - {ts}), 2) END,
+    critico = (stock_inicial + {te} - {ts}) < umbral
+'''
+
+TRIGGERS_RANKING = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_ranking_totales_insert AFTER INSERT ON stock_totales BEGIN
+        UPDATE ranking_stock SET {RECALCULO.format(te='NEW.total_entradas', ts='NEW.total_salidas')}
+        WHERE codigo = NEW.codigo;
+    END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_ranking_totales_update AFTER UPDATE ON stock_totales BEGIN
+        UPDATE ranking_stock SET {RECALCULO.format(te='NEW.total_entradas', ts='NEW.total_salidas')}
+        WHERE codigo = NEW.codigo;
+    END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_ranking_totales_delete AFTER DELETE ON stock_totales BEGIN
+        UPDATE ranking_stock SET {RECALCULO.format(te='0', ts='0')}
+        WHERE codigo = OLD.codigo;
+    END''',
+
+    '''CREATE TRIGGER IF NOT EXISTS trg_ranking_sistemas AFTER UPDATE OF stock_actual ON ranking_stock BEGIN
+        UPDATE ranking_sistemas SET stock_actual = stock_actual + NEW.stock_actual - OLD.stock_actual
+        WHERE sistema = NEW.sistema;
+    END''',
+]
+
+# Mismos nombres de columna que calcular_stock_actual() en app.py
+COLUMNAS_LECTURA = '''
+    codigo AS Codigo, producto AS Producto, um AS UM, sistema AS SISTEMA,
+    stock_inicial AS "Stock inicial", total_entradas, total_salidas, stock_actual,
+    rotacion AS rotacion_inventario, umbral
+'''
+
+ORDENES = {'stock_actual': 'stock_actual', 'total_salidas': 'total_salidas', 'rotacion_inventario': 'rotacion'}
+
+
+def instalar(conn):
+    """Crea las tablas, índices y triggers (migración 6, con el libro de stock ya instalado).
+
+    Sentencia por sentencia: sirve dentro de la transacción de la migración.
+    """
+    for sentencia in ESQUEMA_RANKING + TRIGGERS_RANKING:
+        conn.execute(sentencia)
+
+
+def _marcar_cambio(conn):
+    # Las cachés del dashboard incluyen version_tablas en su clave
+    conn.execute("INSERT INTO version_tablas (tabla, version) VALUES ('rankings', 1) "
+                 "ON CONFLICT(tabla) DO UPDATE SET version = version + 1")
+
+
+def _recalcular_umbrales(conn):
+    conn.execute('''
+        UPDATE ranking_stock SET umbral = COALESCE(
+            (SELECT umbral FROM umbrales_stock WHERE ambito = 'codigo' AND valor = ranking_stock.codigo),
+            (SELECT umbral FROM umbrales_stock WHERE ambito = 'sistema' AND valor = ranking_stock.sistema),
+            ?
+        )
+    ''', (UMBRAL_CRITICO_DEFECTO,))
+    conn.execute("UPDATE ranking_stock SET critico = stock_actual < umbral")
+
+
+def _numero(valor):
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(numero) else numero
+
+
+def _texto(valor):
+    return None if valor is None or (isinstance(valor, float) and math.isnan(valor)) else str(valor)
+
+
+def version_catalogo(conn):
+    """Hash de Stock.xlsx con que se cargó el catálogo (None si nunca se cargó)"""
+    fila = conn.execute("SELECT version FROM catalogo_stock WHERE id = 1").fetchone()
+    return fila[0] if fila else None
+
+
+def cargar_catalogo(conn, stock_df, version):
+    """Carga productos y stock inicial de Stock.xlsx si `version` (su hash) cambió.
+
+    Devuelve True si recargó. Corre dentro de la transacción del llamador.
+    """
+    if conn.execute("SELECT 1 FROM catalogo_stock WHERE id = 1 AND version IS ?", (version,)).fetchone():
+        return False
+
+    conn.execute("DELETE FROM ranking_stock")
+    if not stock_df.empty:
+        conn.executemany(
+            "INSERT OR REPLACE INTO ranking_stock (codigo, producto, um, sistema, stock_inicial) VALUES (?, ?, ?, ?, ?)",
+            (
+                (str(codigo), _texto(producto), _texto(um), _texto(sistema), _numero(inicial))
+                for codigo, producto, um, sistema, inicial in zip(
+                    stock_df['Codigo'], stock_df['Producto'], stock_df['UM'],
+                    stock_df['SISTEMA'], stock_df['Stock inicial']
+                )
+            )
+        )
+    conn.execute('''
+        UPDATE ranking_stock SET
+            total_entradas = COALESCE((SELECT total_entradas FROM stock_totales t WHERE t.codigo = ranking_stock.codigo), 0),
+            total_salidas = COALESCE((SELECT total_salidas FROM stock_totales t WHERE t.codigo = ranking_stock.codigo), 0)
+    ''')
+    _recalcular_umbrales(conn)
+    conn.execute(f"UPDATE ranking_stock SET {RECALCULO.format(te='total_entradas', ts='total_salidas')}")
+
+    conn.execute("DELETE FROM ranking_sistemas")
+    conn.execute("INSERT INTO ranking_sistemas (sistema, stock_actual) "
+                 "SELECT sistema, SUM(stock_actual) FROM ranking_stock WHERE sistema IS NOT NULL GROUP BY sistema")
+    conn.execute("INSERT OR REPLACE INTO catalogo_stock (id, version) VALUES (1, ?)", (version,))
+    _marcar_cambio(conn)
+    return True
+
+
+# ==================== LECTURAS (O(k) POR ÍNDICE) ====================
+
+def top(conn, columna, k=TOP_DEFECTO):
+    """Los k productos con mayor `columna` (stock_actual, total_salidas o rotacion_inventario)"""
+    orden = ORDENES[columna]
+    return pd.read_sql_query(
+        f"SELECT {COLUMNAS_LECTURA} FROM ranking_stock ORDER BY {orden} DESC LIMIT ?", conn, params=(k,)
+    )
+
+
+def criticos(conn, k=TOP_DEFECTO):
+    """Los k productos con menos stock entre los que están bajo su umbral"""
+    return pd.read_sql_query(
+        f"SELECT {COLUMNAS_LECTURA} FROM ranking_stock WHERE critico = 1 ORDER BY stock_actual LIMIT ?",
+        conn, params=(k,)
+    )
+
+
+def contar_criticos(conn):
+    return conn.execute("SELECT COUNT(*) FROM ranking_stock WHERE critico = 1").fetchone()[0]
+
+
+def por_sistema(conn):
+    """Stock actual sumado por SISTEMA"""
+    return pd.read_sql_query(
+        "SELECT sistema AS SISTEMA, stock_actual FROM ranking_sistemas ORDER BY sistema", conn
+    )
+
+
+# ==================== UMBRALES CRÍTICOS ====================
+
+def listar_umbrales(conn):
+    return pd.read_sql_query("SELECT ambito, valor, umbral FROM umbrales_stock ORDER BY ambito, valor", conn)
+
+
+def fijar_umbral(conn, ambito, valor, umbral):
+    """Umbral crítico para un código o un SISTEMA; `umbral=None` lo quita. Dentro de una transacción."""
+    if ambito not in AMBITOS:
+        raise ValueError(f"Ámbito desconocido: {ambito}. Usa {', '.join(AMBITOS)}")
+    if umbral is None:
+        conn.execute("DELETE FROM umbrales_stock WHERE ambito = ? AND valor = ?", (ambito, str(valor)))
+    else:
+        conn.execute("INSERT OR REPLACE INTO umbrales_stock (ambito, valor, umbral) VALUES (?, ?, ?)",
+                     (ambito, str(valor), float(umbral)))
+    _recalcular_umbrales(conn)
+    _marcar_cambio(conn)
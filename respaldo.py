@@ -0,0 +1,149 @@
+"""
+MOTOR DE BACKUPS (API DE BACKUP DE SQLite)
+==========================================
+Copia consistente de inventario.db mientras la app sigue escribiendo, sin
+copiar el archivo a mano (shutil.copy2 sobre una base viva puede dejar una
+copia a medio escribir o sin lo que aún está en el WAL).
+
+- La copia se hace con `sqlite3.Connection.backup` en un solo paso, dentro de
+  una única transacción de lectura. Con WAL los lectores no bloquean a los
+  escritores: la app sigue escribiendo y la copia es la foto del momento en
+  que empezó. (Una copia por tramos se reinicia desde el principio cada vez
+  que otra conexión escribe; con escrituras continuas no terminaría nunca.)
+- El archivo resultante se pasa a journal DELETE (un solo archivo, sin -wal),
+  se valida con `PRAGMA integrity_check` y recién entonces se renombra a su
+  nombre final.
+- Junto a cada backup queda un manifiesto JSON (mismo nombre, extensión .json)
+  con el conteo de filas, el SHA-256 del archivo y el resultado de la validación.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+import base_datos
+from base_datos import DB_FILE
+
+# Configuración
+FORMATO_MANIFIESTO = 1
+TABLAS_CONTEO = ('entradas', 'salidas', 'stock_totales')
+
+
+def ruta_manifiesto(backup_path):
+    return Path(backup_path).with_suffix('.json')
+
+
+def sha256_archivo(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _contar_filas(conn):
+    existentes = {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return {tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+            for tabla in TABLAS_CONTEO if tabla in existentes}
+
+
+def _integridad(conn):
+    resultado = conn.execute("PRAGMA integrity_check").fetchall()
+    return 'ok' if resultado == [('ok',)] else '; '.join(fila[0] for fila in resultado[:5])
+
+
+def _posicion_diario(conn):
+    """Último cambio del diario incluido en la copia (base para restaurar a un momento)"""
+    try:
+        fila = conn.execute("SELECT seq, momento FROM diario_cambios ORDER BY seq DESC LIMIT 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return {'seq': fila[0], 'momento': fila[1]} if fila else {'seq': 0, 'momento': None}
+
+
+def crear_backup(destino, db_file=DB_FILE, tipo="manual"):
+    """Copia la base a `destino` y escribe su manifiesto.
+
+    Devuelve el manifiesto (dict). Si la copia no pasa la validación de
+    integridad se borra y se lanza RuntimeError.
+    """
+    destino = Path(destino)
+    tmp = destino.with_name(destino.name + '.tmp')
+    inicio = time.perf_counter()
+
+    origen = base_datos.conectar(db_file)
+    copia = sqlite3.connect(tmp)
+    try:
+        # pages=-1: todas las páginas en un paso, sin reinicios por escrituras ajenas
+        origen.backup(copia, pages=-1)
+        copia.execute("PRAGMA journal_mode = DELETE")
+        integridad = _integridad(copia)
+        filas = _contar_filas(copia)
+        user_version = copia.execute("PRAGMA user_version").fetchone()[0]
+        diario = _posicion_diario(copia)
+    finally:
+        copia.close()
+        origen.close()
+
+    if integridad != 'ok':
+        tmp.unlink(missing_ok=True)
+        raise RuntimeError(f"El backup no pasó integrity_check: {integridad}")
+
+    tmp.replace(destino)
+    manifiesto = {
+        'formato': FORMATO_MANIFIESTO,
+        'archivo': destino.name,
+        'tipo': tipo,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'bytes': destino.stat().st_size,
+        'sha256': sha256_archivo(destino),
+        'integridad': integridad,
+        'filas': filas,
+        'version_esquema': user_version,
+        'diario': diario,
+        'segundos': round(time.perf_counter() - inicio, 3)
+    }
+    with open(ruta_manifiesto(destino), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    return manifiesto
+
+
+def leer_manifiesto(backup_path):
+    """Manifiesto de un backup, o None si no tiene (backups anteriores a este formato)"""
+    path = ruta_manifiesto(backup_path)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Manifiesto inválido {path.name}: {e}")
+        return None
+
+
+def verificar_backup(backup_path):
+    """Comprueba checksum (si hay manifiesto) e integridad del archivo.
+
+    Devuelve (ok, mensaje).
+    """
+    backup_path = Path(backup_path)
+    manifiesto = leer_manifiesto(backup_path)
+    if manifiesto and sha256_archivo(backup_path) != manifiesto.get('sha256'):
+        return False, "El checksum no coincide con el manifiesto"
+    conn = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+    try:
+        integridad = _integridad(conn)
+    finally:
+        conn.close()
+    if integridad != 'ok':
+        return False, f"integrity_check: {integridad}"
+    return True, "ok" if manifiesto else "ok (sin manifiesto)"
+
+
+def eliminar_backup(backup_path):
+    """Borra el backup y su manifiesto"""
+    Path(backup_path).unlink(missing_ok=True)
+    ruta_manifiesto(backup_path).unlink(missing_ok=True)
@@ -0,0 +1,199 @@
+"""
+ACUMULADOS DIARIOS Y SEMANALES DE MOVIMIENTOS
+=============================================
+Tabla `rollup_movimientos` con la cantidad que entró y salió por día y por
+semana (lunes a domingo), desglosada por código, por SISTEMA y, en salidas,
+por departamento. La mantienen triggers de SQLite en la misma transacción que
+cada alta, baja o modificación, como el libro de stock.
+
+Las series de tiempo del dashboard (tendencias, stock a lo largo del tiempo)
+leen estos acumulados: un año de un código son 365 filas aunque tenga miles
+de salidas.
+
+Solo se acumulan movimientos con fecha ISO (YYYY-MM-DD); los demás no tienen
+día al que sumarse.
+
+USO:
+  python rollups_movimientos.py --reconstruir    # Recalcula los acumulados desde cero
+"""
+
+import argparse
+import sys
+
+import pandas as pd
+
+import base_datos
+from base_datos import DB_FILE
+
+# Configuración
+PERIODOS = ('dia', 'semana')
+
+# Dimensiones por tabla de movimientos (las entradas no tienen departamento)
+DIMENSIONES = {
+    'entradas': ('codigo', 'sistema'),
+    'salidas': ('codigo', 'sistema', 'departamento'),
+}
+
+ESQUEMA_ROLLUPS = [
+    '''CREATE TABLE IF NOT EXISTS rollup_movimientos (
+        periodo TEXT NOT NULL,
+        dimension TEXT NOT NULL,
+        valor TEXT NOT NULL,
+        fecha TEXT NOT NULL,
+        entradas REAL NOT NULL DEFAULT 0,
+        salidas REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (periodo, dimension, valor, fecha)
+    ) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS idx_rollup_fecha ON rollup_movimientos (periodo, dimension, fecha)",
+]
+
+FECHA_ISO = "'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'"
+
+
+def _fechas(fila):
+    """Expresiones SQL (periodo, fecha del periodo) para la fila NEW/OLD o una columna"""
+    dia = f"substr({fila}fecha, 1, 10)"
+    # Lunes de la semana: retroceder 6 días y avanzar al próximo lunes
+    return [('dia', dia), ('semana', f"date({dia}, '-6 days', 'weekday 1')")]
+
+
+def _acumular(tabla, fila, signo):
+    """INSERT ... ON CONFLICT que suma (o resta) la fila a todos sus acumulados"""
+    valores = ', '.join(
+        f"('{periodo}', '{dimension}', COALESCE({fila}.{dimension}, ''), {fecha}, "
+        f"{signo}COALESCE({fila}.cantidad, 0))"
+        for periodo, fecha in _fechas(f"{fila}.")
+        for dimension in DIMENSIONES[tabla]
+    )
+    return (
+        f"INSERT INTO rollup_movimientos (periodo, dimension, valor, fecha, {tabla}) "
+        f"SELECT * FROM (VALUES {valores}) WHERE {fila}.fecha GLOB {FECHA_ISO} "
+        f"ON CONFLICT(periodo, dimension, valor, fecha) DO UPDATE SET {tabla} = {tabla} + excluded.{tabla};"
+    )
+
+
+def _triggers(tabla):
+    columnas = ', '.join(('fecha', 'cantidad') + DIMENSIONES[tabla])
+    return [
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_rollup_insert AFTER INSERT ON {tabla} BEGIN
+            {_acumular(tabla, 'NEW', '')}
+        END''',
+
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_rollup_delete AFTER DELETE ON {tabla} BEGIN
+            {_acumular(tabla, 'OLD', '-')}
+        END''',
+
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_rollup_update AFTER UPDATE OF {columnas} ON {tabla} BEGIN
+            {_acumular(tabla, 'OLD', '-')}
+            {_acumular(tabla, 'NEW', '')}
+        END''',
+    ]
+
+
+def instalar(conn):
+    """Crea la tabla y los triggers (migración 7, que además la llena con reconstruir).
+
+    Sentencia por sentencia: sirve dentro de la transacción de la migración.
+    """
+    for sentencia in ESQUEMA_ROLLUPS + [s for tabla in DIMENSIONES for s in _triggers(tabla)]:
+        conn.execute(sentencia)
+
+
+def reconstruir(conn):
+    """Recalcula todos los acumulados agrupando entradas y salidas"""
+    conn.execute("SAVEPOINT reconstruir_rollups")
+    try:
+        conn.execute("DELETE FROM rollup_movimientos")
+        for tabla, dimensiones in DIMENSIONES.items():
+            for periodo, fecha in _fechas(''):
+                for dimension in dimensiones:
+                    conn.execute(f'''
+                        INSERT INTO rollup_movimientos (periodo, dimension, valor, fecha, {tabla})
+                        SELECT '{periodo}', '{dimension}', COALESCE({dimension}, ''), {fecha}, SUM(COALESCE(cantidad, 0))
+                        FROM {tabla} WHERE fecha GLOB {FECHA_ISO}
+                        GROUP BY 3, 4
+                        ON CONFLICT(periodo, dimension, valor, fecha) DO UPDATE SET {tabla} = {tabla} + excluded.{tabla}
+                    ''')
+    except Exception:
+        conn.execute("ROLLBACK TO reconstruir_rollups")
+        raise
+    finally:
+        conn.execute("RELEASE reconstruir_rollups")
+    return conn.execute("SELECT COUNT(*) FROM rollup_movimientos").fetchone()[0]
+
+
+# ==================== CONSULTAS ====================
+
+def rango_fechas(conn):
+    """(primer día, último día) con movimientos, o (None, None)"""
+    return conn.execute(
+        "SELECT MIN(fecha), MAX(fecha) FROM rollup_movimientos WHERE periodo = 'dia' AND dimension = 'codigo'"
+    ).fetchone()
+
+
+def serie(conn, dimension, periodo='dia', desde=None, hasta=None, valores=None):
+    """Entradas y salidas por periodo y valor de la dimensión, entre `desde` y `hasta` (ISO, inclusive)"""
+    condiciones = ["periodo = ?", "dimension = ?"]
+    params = [periodo, dimension]
+    if desde:
+        condiciones.append("fecha >= ?")
+        params.append(desde)
+    if hasta:
+        condiciones.append("fecha <= ?")
+        params.append(hasta)
+    if valores is not None:
+        condiciones.append(f"valor IN ({', '.join('?' * len(valores))})")
+        params.extend(valores)
+    return pd.read_sql_query(
+        f"SELECT fecha, valor, entradas, salidas FROM rollup_movimientos "
+        f"WHERE {' AND '.join(condiciones)} ORDER BY fecha",
+        conn, params=params
+    )
+
+
+def principales(conn, dimension, desde=None, hasta=None, k=10, columna='salidas'):
+    """Los k valores de la dimensión con más `columna` en el rango (desde los acumulados semanales)"""
+    condiciones = ["periodo = 'semana'", "dimension = ?"]
+    params = [dimension]
+    # Semanas que empiezan dentro del rango (aproximación suficiente para elegir qué graficar)
+    if desde:
+        condiciones.append("fecha >= date(?, '-6 days')")
+        params.append(desde)
+    if hasta:
+        condiciones.append("fecha <= ?")
+        params.append(hasta)
+    filas = conn.execute(
+        f"SELECT valor FROM rollup_movimientos WHERE {' AND '.join(condiciones)} "
+        f"GROUP BY valor ORDER BY SUM({columna}) DESC LIMIT ?", params + [k]
+    ).fetchall()
+    return [fila[0] for fila in filas]
+
+
+def stock_en_el_tiempo(conn, codigo, stock_inicial=0):
+    """Stock del código al cierre de cada día con movimientos: inicial + entradas - salidas acumuladas"""
+    df = serie(conn, 'codigo', 'dia', valores=[codigo])
+    df['stock'] = stock_inicial + (df['entradas'] - df['salidas']).cumsum()
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Acumulados diarios y semanales de movimientos')
+    parser.add_argument('--reconstruir', action='store_true', help='Recalcular los acumulados desde cero')
+    args = parser.parse_args()
+
+    if not args.reconstruir:
+        parser.print_help()
+        return 0
+
+    conn = base_datos.conectar(DB_FILE)
+    try:
+        instalar(conn)
+        filas = reconstruir(conn)
+        print(f"✅ Acumulados reconstruidos: {filas} filas")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
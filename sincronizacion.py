@@ -0,0 +1,324 @@
+"""
+SINCRONIZACIÓN CON GITHUB EN SEGUNDO PLANO
+==========================================
+Cola persistente (outbox) de cambios pendientes y un worker que los agrupa
+en una sola sincronización, con reintentos y backoff exponencial.
+
+El formulario solo agrega una línea al outbox (milisegundos); el worker se
+encarga de volcar los JSON y subirlos a GitHub fuera del hilo de la petición.
+
+La subida usa la Git Data API: todos los archivos van en un solo commit
+(árbol -> commit -> actualizar rama) sobre una sesión HTTP reutilizada,
+con los SHA de la rama y del árbol cacheados entre sincronizaciones.
+"""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configuración
+OUTBOX_FILE = Path("backups_sistema") / "sync_outbox.jsonl"
+VENTANA_AGRUPACION = 60      # Máximo de segundos que un cambio espera en la cola
+TIEMPO_QUIETUD = 10          # Sincronizar si no hubo cambios nuevos en este tiempo
+BACKOFF_INICIAL = 15         # Segundos de espera tras el primer fallo
+BACKOFF_MAXIMO = 900         # Tope de espera entre reintentos (15 minutos)
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_TIMEOUT = 30
+
+
+class ColaSincronizacion:
+    """Outbox persistente en disco + worker que sincroniza en segundo plano"""
+
+    def __init__(self, funcion_sync, outbox_file=OUTBOX_FILE,
+                 ventana=VENTANA_AGRUPACION, quietud=TIEMPO_QUIETUD):
+        self.funcion_sync = funcion_sync
+        self.outbox_file = Path(outbox_file)
+        self.outbox_file.parent.mkdir(exist_ok=True)
+        self.ventana = ventana
+        self.quietud = quietud
+
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+
+        self.primer_pendiente = None
+        self.ultimo_cambio = None
+        self.sincronizando = False
+        self.intentos = 0
+        self.proximo_intento = None
+        self.ultimo_exito = None
+        self.ultimo_error = None
+        self.total_sincronizaciones = 0
+
+        # Cambios que quedaron pendientes de una ejecución anterior
+        if self._leer_outbox():
+            self.primer_pendiente = self.ultimo_cambio = time.time() - self.ventana
+            self._evento.set()
+
+        self._hilo = threading.Thread(target=self._bucle, name="sync-github", daemon=True)
+        self._hilo.start()
+
+    # ==================== OUTBOX ====================
+
+    def _leer_outbox(self):
+        """Devuelve la lista de cambios pendientes guardados en disco"""
+        if not self.outbox_file.exists():
+            return []
+        cambios = []
+        with open(self.outbox_file, 'r', encoding='utf-8') as f:
+            for linea in f:
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    cambios.append(json.loads(linea))
+                except json.JSONDecodeError:
+                    # Línea truncada por un corte abrupto: se descarta
+                    continue
+        return cambios
+
+    def _descartar_procesados(self, cantidad):
+        """Quita del outbox los primeros N cambios ya sincronizados"""
+        restantes = self._leer_outbox()[cantidad:]
+        tmp = self.outbox_file.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for cambio in restantes:
+                f.write(json.dumps(cambio, ensure_ascii=False) + "\n")
+        tmp.replace(self.outbox_file)
+        return len(restantes)
+
+    def registrar(self, tabla, operacion, registro_id=None):
+        """Agrega un cambio al outbox y despierta al worker (no bloquea)"""
+        cambio = {
+            'tabla': tabla,
+            'operacion': operacion,
+            'id': registro_id,
+            'timestamp': datetime.now().isoformat(timespec='seconds')
+        }
+        ahora = time.time()
+        with self._lock:
+            with open(self.outbox_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(cambio, ensure_ascii=False) + "\n")
+            if self.primer_pendiente is None:
+                self.primer_pendiente = ahora
+            self.ultimo_cambio = ahora
+        self._evento.set()
+
+    def forzar(self):
+        """Sincroniza lo antes posible, sin esperar la ventana ni el backoff"""
+        with self._lock:
+            vencido = time.time() - max(self.ventana, self.quietud)
+            self.primer_pendiente = self.ultimo_cambio = vencido
+            self.proximo_intento = None
+        self._evento.set()
+
+    # ==================== WORKER ====================
+
+    def _segundos_para_sincronizar(self):
+        """Segundos que faltan para la próxima sincronización (None = nada pendiente)"""
+        with self._lock:
+            if self.primer_pendiente is None:
+                return None
+            ahora = time.time()
+            espera = min(
+                self.primer_pendiente + self.ventana - ahora,
+                self.ultimo_cambio + self.quietud - ahora
+            )
+            if self.proximo_intento is not None:
+                espera = max(espera, self.proximo_intento - ahora)
+            return max(espera, 0)
+
+    def _bucle(self):
+        while True:
+            espera = self._segundos_para_sincronizar()
+            if espera is None:
+                self._evento.wait()
+                self._evento.clear()
+                continue
+            if espera > 0:
+                self._evento.wait(timeout=espera)
+                self._evento.clear()
+                continue
+            self._sincronizar()
+
+    def _sincronizar(self):
+        """Ejecuta una sincronización que cubre todos los cambios en cola"""
+        with self._lock:
+            procesados = len(self._leer_outbox())
+            self.sincronizando = True
+            self.primer_pendiente = None
+
+        try:
+            exito = self.funcion_sync()
+            error = None if exito else "La sincronización devolvió un error"
+        except Exception as e:
+            exito = False
+            error = str(e)
+
+        with self._lock:
+            self.sincronizando = False
+            if exito:
+                restantes = self._descartar_procesados(procesados)
+                self.intentos = 0
+                self.proximo_intento = None
+                self.ultimo_exito = datetime.now()
+                self.ultimo_error = None
+                self.total_sincronizaciones += 1
+                print(f"✅ Sync GitHub: {procesados} cambios en una sincronización")
+                if restantes and self.primer_pendiente is None:
+                    # Llegaron cambios mientras se sincronizaba
+                    self.primer_pendiente = self.ultimo_cambio = time.time()
+            else:
+                self.intentos += 1
+                backoff = min(BACKOFF_INICIAL * 2 ** (self.intentos - 1), BACKOFF_MAXIMO)
+                self.proximo_intento = time.time() + backoff
+                self.ultimo_error = error
+                if self.primer_pendiente is None:
+                    self.primer_pendiente = self.ultimo_cambio = time.time()
+                print(f"❌ Sync GitHub falló (intento {self.intentos}), reintento en {backoff}s: {error}")
+
+    # ==================== ESTADO ====================
+
+    def estado(self):
+        """Resumen del estado de la cola para mostrar en la interfaz"""
+        with self._lock:
+            pendientes = len(self._leer_outbox())
+            return {
+                'pendientes': pendientes,
+                'sincronizando': self.sincronizando,
+                'intentos': self.intentos,
+                'proximo_intento': (datetime.fromtimestamp(self.proximo_intento)
+                                    if self.proximo_intento else None),
+                'ultimo_exito': self.ultimo_exito,
+                'ultimo_error': self.ultimo_error,
+                'total_sincronizaciones': self.total_sincronizaciones
+            }
+
+
+# ==================== CLIENTE GIT DATA API ====================
+
+class ErrorGitHub(Exception):
+    """Respuesta de error de la API de GitHub"""
+
+    def __init__(self, status_code, mensaje):
+        super().__init__(f"GitHub {status_code}: {mensaje[:200]}")
+        self.status_code = status_code
+
+
+def sha_blob(contenido):
+    """SHA que Git asigna a un blob con este contenido"""
+    return hashlib.sha1(b"blob %d\0" % len(contenido) + contenido).hexdigest()
+
+
+class ClienteGitHub:
+    """Sube varios archivos en un solo commit mediante la Git Data API"""
+
+    def __init__(self, token, repo, branch="main", api_url=GITHUB_API_URL):
+        self.repo = repo
+        self.branch = branch
+        self.api_url = api_url.rstrip('/')
+
+        # Sesión con conexiones reutilizables (keep-alive) para todas las llamadas
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.headers.update({
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github.v3+json"
+        })
+
+        # SHA conocidos del último commit propio (evitan los GET de consulta)
+        self.head_sha = None
+        self.tree_sha = None
+        self.blobs = {}
+
+    def _llamar(self, metodo, ruta, **kwargs):
+        url = f"{self.api_url}/repos/{self.repo}/{ruta}"
+        response = self.session.request(metodo, url, timeout=GITHUB_TIMEOUT, **kwargs)
+        if response.status_code >= 400:
+            raise ErrorGitHub(response.status_code, response.text)
+        return response.json()
+
+    def _cargar_head(self):
+        """Consulta el último commit de la rama y su árbol"""
+        ref = self._llamar("GET", f"git/ref/heads/{self.branch}")
+        self.head_sha = ref["object"]["sha"]
+        commit = self._llamar("GET", f"git/commits/{self.head_sha}")
+        self.tree_sha = commit["tree"]["sha"]
+        self.blobs = {}
+
+    def _entrada_arbol(self, path, contenido):
+        """Entrada del árbol: texto en línea, binarios como blob aparte"""
+        entrada = {"path": path, "mode": "100644", "type": "blob"}
+        try:
+            entrada["content"] = contenido.decode('utf-8')
+        except UnicodeDecodeError:
+            blob = self._llamar("POST", "git/blobs", json={
+                "content": base64.b64encode(contenido).decode('ascii'),
+                "encoding": "base64"
+            })
+            entrada["sha"] = blob["sha"]
+        return entrada
+
+    def commit_archivos(self, archivos, mensaje):
+        """Crea un único commit con los archivos {path: contenido}.
+
+        Devuelve el SHA del commit, o None si ningún archivo cambió.
+        """
+        contenidos = {}
+        for path, contenido in archivos.items():
+            contenido = contenido.encode('utf-8') if isinstance(contenido, str) else contenido
+            if self.blobs.get(path) != sha_blob(contenido):
+                contenidos[path] = contenido
+        if not contenidos:
+            return None
+
+        for intento in range(2):
+            if self.head_sha is None:
+                self._cargar_head()
+
+            arbol = self._llamar("POST", "git/trees", json={
+                "base_tree": self.tree_sha,
+                "tree": [self._entrada_arbol(p, c) for p, c in contenidos.items()]
+            })
+            commit = self._llamar("POST", "git/commits", json={
+                "message": mensaje,
+                "tree": arbol["sha"],
+                "parents": [self.head_sha]
+            })
+            try:
+                self._llamar("PATCH", f"git/refs/heads/{self.branch}", json={
+                    "sha": commit["sha"],
+                    "force": False
+                })
+            except ErrorGitHub as e:
+                # Alguien más actualizó la rama: releer la cabeza y reintentar una vez
+                if e.status_code == 422 and intento == 0:
+                    self.head_sha = None
+                    continue
+                raise
+
+            self.head_sha = commit["sha"]
+            self.tree_sha = arbol["sha"]
+            for path, contenido in contenidos.items():
+                self.blobs[path] = sha_blob(contenido)
+            return self.head_sha
+
+
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+
+def obtener_cliente_github(token, repo, branch="main"):
+    """Cliente compartido por proceso (conserva sesión y SHA cacheados)"""
+    clave = (token, repo, branch)
+    with _clientes_lock:
+        if clave not in _clientes:
+            _clientes[clave] = ClienteGitHub(token, repo, branch)
+        return _clientes[clave]
@@ -0,0 +1,64 @@
+"""Almacén de backups deduplicado: reutilización de bloques y recolección de basura"""
+
+import os
+import time
+
+import base_datos
+import esquema
+import almacen_backups
+import respaldo
+
+
+def _base(path, filas):
+    conn = base_datos.conectar(path)
+    esquema.inicializar(conn)
+    conn.executemany("INSERT INTO entradas (codigo, cantidad) VALUES (?, 1)", [(f"C{i}",) for i in range(filas)])
+    conn.close()
+
+
+def _envejecer(backup_dir, segundos):
+    antiguo = time.time() - segundos
+    for ruta in (backup_dir / almacen_backups.CARPETA_BLOQUES).glob("*/*"):
+        os.utime(ruta, (antiguo, antiguo))
+
+
+def test_bloque_reutilizado_no_lo_borra_la_recoleccion(tmp_path):
+    db_file = tmp_path / "inventario.db"
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    _base(db_file, 2000)
+
+    primero = backup_dir / "inventario_manual_1.json"
+    almacen_backups.crear_backup(primero, db_file)
+    # Se poda el backup: sus bloques quedan sin referencia y más viejos que la gracia
+    almacen_backups.eliminar(primero)
+    _envejecer(backup_dir, almacen_backups.GRACIA_GC * 2)
+
+    # Un backup nuevo de la misma base reutiliza esos bloques...
+    copia = tmp_path / "copia.db"
+    respaldo.crear_backup(copia, db_file)
+    digests, nuevos, _ = almacen_backups._guardar_bloques(backup_dir, copia)
+    assert nuevos == 0
+    # ...y una recolección antes de que escriba su manifiesto no debe borrarlos
+    borrados, _ = almacen_backups.recolectar_basura(backup_dir)
+    assert borrados == 0
+    assert all(almacen_backups._ruta_bloque(backup_dir, d).exists() for d in digests)
+
+
+def test_backup_se_reconstruye_despues_de_recolectar(tmp_path):
+    db_file = tmp_path / "inventario.db"
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    _base(db_file, 2000)
+
+    viejo = backup_dir / "inventario_manual_1.json"
+    almacen_backups.crear_backup(viejo, db_file)
+    almacen_backups.eliminar(viejo)
+    _envejecer(backup_dir, almacen_backups.GRACIA_GC * 2)
+
+    nuevo = backup_dir / "inventario_manual_2.json"
+    manifiesto = almacen_backups.crear_backup(nuevo, db_file)
+    almacen_backups.recolectar_basura(backup_dir)
+
+    restaurado = tmp_path / "restaurado.db"
+    assert almacen_backups.reconstruir(nuevo, restaurado)['sha256'] == manifiesto['sha256']
@@ -0,0 +1,70 @@
+"""Cachés por sesión de entradas/salidas actualizadas por deltas"""
+
+import pytest
+
+import base_datos
+import esquema
+from cache_tablas import CacheTabla
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = tmp_path / "inventario.db"
+    conn = base_datos.conectar(path)
+    esquema.inicializar(conn)
+    conn.close()
+    yield path
+    base_datos.cerrar_conexiones()
+
+
+def _insertar(db_file, cache, codigo):
+    """Como la app: INSERT en la base y la fila agregada a la caché de la sesión"""
+    conn = base_datos.obtener_conexion(db_file)
+    registro_id = conn.execute(
+        "INSERT INTO entradas (codigo, cantidad) VALUES (?, 1)", (codigo,)
+    ).lastrowid
+    registro = dict(zip(
+        [d[0] for d in conn.execute("SELECT * FROM entradas LIMIT 0").description],
+        conn.execute("SELECT * FROM entradas WHERE id = ?", (registro_id,)).fetchone()
+    ))
+    cache.aplicar_insert(registro)
+    return registro_id
+
+
+def test_inserts_intercalados_de_dos_sesiones(db_file):
+    sesion_a = CacheTabla('entradas', db_file)
+    sesion_b = CacheTabla('entradas', db_file)
+    _insertar(db_file, sesion_a, 'A0')
+    sesion_a.actualizar()
+    sesion_b.actualizar()
+
+    # B inserta N+1 después del último actualizar() de A; luego A inserta N+2
+    id_b = _insertar(db_file, sesion_b, 'B1')
+    id_a = _insertar(db_file, sesion_a, 'A2')
+    assert id_a > id_b
+
+    assert sesion_a.actualizar()
+    ids = sesion_a.df['id'].tolist()
+    assert ids == sorted(ids, reverse=True)
+    assert ids.count(id_b) == 1 and ids.count(id_a) == 1
+    assert sesion_a.df['codigo'].tolist() == ['A2', 'B1', 'A0']
+
+    sesion_b.actualizar()
+    assert sesion_b.df['id'].tolist() == ids
+
+
+def test_delete_de_otra_sesion_se_aplica_por_delta(db_file):
+    sesion_a = CacheTabla('entradas', db_file)
+    sesion_b = CacheTabla('entradas', db_file)
+    primero = _insertar(db_file, sesion_a, 'A0')
+    _insertar(db_file, sesion_a, 'A1')
+    sesion_a.actualizar()
+    sesion_b.actualizar()
+
+    base_datos.obtener_conexion(db_file).execute("DELETE FROM entradas WHERE id = ?", (primero,))
+    sesion_b.aplicar_delete(primero)
+
+    assert sesion_a.actualizar()
+    assert sesion_a.df['codigo'].tolist() == ['A1']
+    sesion_b.actualizar()
+    assert sesion_b.df['codigo'].tolist() == ['A1']
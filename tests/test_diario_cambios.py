@@ -0,0 +1,89 @@
+"""Diario de cambios: hora en UTC y restauración a un momento en hora de Perú"""
+
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import almacen_backups
+import base_datos
+import diario_cambios
+import esquema
+
+
+@pytest.fixture
+def zona_servidor():
+    """Servidor en una zona distinta de UTC y de Perú (UTC+9)"""
+    anterior = os.environ.get('TZ')
+    os.environ['TZ'] = 'Asia/Tokyo'
+    time.tzset()
+    yield
+    if anterior is None:
+        del os.environ['TZ']
+    else:
+        os.environ['TZ'] = anterior
+    time.tzset()
+
+
+def _base(path):
+    conn = base_datos.conectar(path)
+    esquema.inicializar(conn)
+    return conn
+
+
+def _hora_peru():
+    return datetime.now(base_datos.ZONA_PERU).replace(tzinfo=None)
+
+
+def test_momento_en_utc(tmp_path, zona_servidor):
+    conn = _base(tmp_path / "inventario.db")
+    conn.execute("INSERT INTO entradas (codigo, cantidad) VALUES ('A', 1)")
+    momento = conn.execute("SELECT momento FROM diario_cambios").fetchone()[0]
+    conn.close()
+
+    assert momento.endswith('Z')
+    guardado = datetime.strptime(momento, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
+    assert abs(guardado - datetime.now(timezone.utc)) < timedelta(minutes=1)
+
+
+def test_restaurar_a_hora_de_peru(tmp_path, zona_servidor):
+    db_file = tmp_path / "inventario.db"
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    conn = _base(db_file)
+    conn.execute("INSERT INTO entradas (codigo, cantidad) VALUES ('BASE', 1)")
+    conn.close()
+    time.sleep(1)  # La fecha del catálogo va al segundo
+    almacen_backups.crear_backup(backup_dir / "inventario_manual_1.json", db_file)
+
+    conn = base_datos.conectar(db_file)
+    conn.execute("INSERT INTO entradas (codigo, cantidad) VALUES ('ANTES', 1)")
+    time.sleep(0.05)
+    momento = _hora_peru()
+    time.sleep(0.05)
+    conn.execute("INSERT INTO entradas (codigo, cantidad) VALUES ('DESPUES', 1)")
+    conn.close()
+
+    resumen = diario_cambios.restaurar_a(momento, backup_dir, db_file)
+
+    conn = base_datos.conectar(db_file)
+    codigos = [fila[0] for fila in conn.execute("SELECT codigo FROM entradas ORDER BY id")]
+    conn.close()
+    assert codigos == ['BASE', 'ANTES']
+    assert resumen['cambios_reproducidos'] == 1
+    assert resumen['fecha_base'] <= momento
+
+
+def test_migracion_pasa_el_diario_a_utc(tmp_path, zona_servidor):
+    conn = _base(tmp_path / "inventario.db")
+    # Diario escrito antes de la migración 9: hora local del servidor, sin 'Z'
+    conn.execute(
+        "INSERT INTO diario_cambios (momento, tabla, operacion, registro_id) "
+        "VALUES ('2026-02-04T15:30:00.000', 'entradas', 'delete', 1)"
+    )
+    assert diario_cambios.actualizar(conn) == 1
+    assert diario_cambios.pasar_a_utc(conn) == 0
+    momento = conn.execute("SELECT momento FROM diario_cambios").fetchone()[0]
+    conn.close()
+    assert momento == '2026-02-04T06:30:00.000Z'
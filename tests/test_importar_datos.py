@@ -0,0 +1,96 @@
+"""Importación de un Excel: lectura fuera del bloqueo de escritura y confirmación corta"""
+
+import sqlite3
+
+import pytest
+from openpyxl import Workbook
+
+import base_datos
+import esquema
+import importar_datos
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = tmp_path / "inventario.db"
+    conn = base_datos.conectar(path)
+    esquema.inicializar(conn)
+    conn.execute("INSERT INTO entradas (orden_compra, codigo, fecha, cantidad) VALUES ('OC1', 'A', '2025-01-02', 1)")
+    conn.close()
+    return path
+
+
+def _excel(path, filas):
+    libro = Workbook()
+    hoja = libro.active
+    hoja.append(['Orden Compra', 'Fecha', 'Codigo', 'Producto', 'Cantidad'])
+    for fila in filas:
+        hoja.append(fila)
+    libro.save(path)
+    return path
+
+
+FILAS = [
+    ['OC1', '2025-01-02', 'A', 'Ya en la base', 1],
+    ['OC2', '2025-01-03', 'B', 'Nueva', 2],
+    ['OC2', '2025-01-03', 'B', 'Repetida en el archivo', 3],
+    ['OC3', '2025-01-04', 'C', 'Nueva', 'x'],
+    ['OC4', '2025-01-05', 'D', 'Nueva', 4],
+]
+
+
+def _entradas(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return [fila for fila in conn.execute("SELECT orden_compra, producto, cantidad FROM entradas ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def test_otro_escritor_no_espera_mientras_se_lee(db_file, tmp_path, monkeypatch):
+    archivo = _excel(tmp_path / "entradas.xlsx", FILAS)
+    normalizar = importar_datos.normalizar_tramo
+
+    def normalizar_y_escribir(df, tabla):
+        # Mientras se lee el archivo, la app registra un movimiento (sin esperar el bloqueo)
+        otro = sqlite3.connect(db_file, timeout=0, isolation_level=None)
+        try:
+            otro.execute("BEGIN IMMEDIATE")
+            otro.execute(f"INSERT INTO entradas (orden_compra, codigo, fecha, cantidad) "
+                         f"VALUES ('APP{df[importar_datos.FILA_EXCEL].iloc[0]}', 'Z', '2025-02-01', 1)")
+            otro.execute("COMMIT")
+        finally:
+            otro.close()
+        return normalizar(df, tabla)
+
+    monkeypatch.setattr(importar_datos, 'normalizar_tramo', normalizar_y_escribir)
+    resumen = importar_datos.importar_excel(archivo, 'entradas', db_file, tamano=2)
+
+    assert (resumen['leidas'], resumen['insertadas'], resumen['duplicadas'], resumen['rechazadas']) == (5, 2, 2, 1)
+    assert [fila[0] for fila in _entradas(db_file)] == ['OC1', 'APP2', 'APP4', 'APP6', 'OC2', 'OC4']
+    assert ('OC2', 'Nueva', 2.0) in _entradas(db_file)
+
+    conn = sqlite3.connect(db_file)
+    sha, insertadas = conn.execute("SELECT sha256, insertadas FROM importaciones").fetchone()
+    conn.close()
+    assert insertadas == 2
+    assert sha == importar_datos.respaldo.sha256_archivo(archivo)
+
+
+def test_error_a_mitad_del_archivo_no_deja_nada(db_file, tmp_path, monkeypatch):
+    archivo = _excel(tmp_path / "entradas.xlsx", FILAS)
+    normalizar = importar_datos.normalizar_tramo
+
+    def fallar_en_el_segundo_tramo(df, tabla):
+        if df[importar_datos.FILA_EXCEL].iloc[0] > 2:
+            raise ValueError("archivo dañado")
+        return normalizar(df, tabla)
+
+    monkeypatch.setattr(importar_datos, 'normalizar_tramo', fallar_en_el_segundo_tramo)
+    with pytest.raises(ValueError):
+        importar_datos.importar_excel(archivo, 'entradas', db_file, tamano=2)
+
+    assert _entradas(db_file) == [('OC1', None, 1.0)]
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT COUNT(*) FROM importaciones").fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,185 @@
+"""Cliente de la Git Data API contra un servidor HTTP local y outbox persistente"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sincronizacion import ClienteGitHub, ColaSincronizacion, ErrorGitHub
+
+REPO = "dueno/inventario"
+
+
+class GitHubFalso:
+    """Estado mínimo de un repositorio: cabeza de la rama, commits y árboles"""
+
+    def __init__(self):
+        self.head = "c0"
+        self.commits = {"c0": {"tree": "t0", "parents": []}}
+        self.arboles = {"t0": {}}
+        self.llamadas = []
+        self.rechazos_patch = 0    # PATCH que responden 422 (otro commit movió la rama antes)
+        self._n = 0
+
+    def nuevo_sha(self, prefijo):
+        self._n += 1
+        return f"{prefijo}{self._n}"
+
+    def responder(self, metodo, ruta, cuerpo):
+        self.llamadas.append((metodo, ruta))
+        base = f"/repos/{REPO}/"
+        ruta = ruta[len(base):]
+        if metodo == "GET" and ruta == "git/ref/heads/main":
+            return 200, {"object": {"sha": self.head}}
+        if metodo == "GET" and ruta.startswith("git/commits/"):
+            return 200, {"tree": {"sha": self.commits[ruta.split('/')[-1]]["tree"]}}
+        if metodo == "POST" and ruta == "git/blobs":
+            return 201, {"sha": self.nuevo_sha("b")}
+        if metodo == "POST" and ruta == "git/trees":
+            archivos = dict(self.arboles[cuerpo["base_tree"]])
+            for entrada in cuerpo["tree"]:
+                archivos[entrada["path"]] = entrada.get("content", entrada.get("sha"))
+            sha = self.nuevo_sha("t")
+            self.arboles[sha] = archivos
+            return 201, {"sha": sha}
+        if metodo == "POST" and ruta == "git/commits":
+            sha = self.nuevo_sha("c")
+            self.commits[sha] = {"tree": cuerpo["tree"], "parents": cuerpo["parents"]}
+            return 201, {"sha": sha}
+        if metodo == "PATCH" and ruta == "git/refs/heads/main":
+            if self.rechazos_patch:
+                self.rechazos_patch -= 1
+                # Otro cliente empujó un commit: la rama ya no apunta al padre usado
+                otro = self.nuevo_sha("c")
+                self.commits[otro] = {"tree": self.commits[self.head]["tree"], "parents": [self.head]}
+                self.head = otro
+                return 422, {"message": "Update is not a fast forward"}
+            if self.commits[cuerpo["sha"]]["parents"] != [self.head]:
+                return 422, {"message": "Update is not a fast forward"}
+            self.head = cuerpo["sha"]
+            return 200, {"object": {"sha": self.head}}
+        return 404, {"message": "Not Found"}
+
+    def archivos(self):
+        return self.arboles[self.commits[self.head]["tree"]]
+
+
+@pytest.fixture
+def github():
+    falso = GitHubFalso()
+
+    class Manejador(BaseHTTPRequestHandler):
+        def _atender(self):
+            largo = int(self.headers.get("Content-Length") or 0)
+            cuerpo = json.loads(self.rfile.read(largo)) if largo else None
+            estado, respuesta = falso.responder(self.command, self.path, cuerpo)
+            datos = json.dumps(respuesta).encode()
+            self.send_response(estado)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        do_GET = do_POST = do_PATCH = _atender
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    falso.url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    yield falso
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _cliente(github):
+    return ClienteGitHub("token", REPO, "main", api_url=github.url)
+
+
+def test_commit_arbol_commit_y_rama_en_orden(github):
+    cliente = _cliente(github)
+    sha = cliente.commit_archivos({"data/a.json": "[1]", "data/b.bin": b"\xff\x00"}, "sync")
+
+    assert github.head == sha
+    assert github.archivos()["data/a.json"] == "[1]"
+    assert [m for m, _ in github.llamadas] == ["GET", "GET", "POST", "POST", "POST", "PATCH"]
+    assert [r.rsplit('/', 1)[-1] for _, r in github.llamadas[2:]] == ["blobs", "trees", "commits", "main"]
+
+    # Segundo commit: usa la cabeza cacheada, sin volver a consultar la rama
+    github.llamadas.clear()
+    cliente.commit_archivos({"data/a.json": "[1, 2]"}, "sync")
+    assert [m for m, _ in github.llamadas] == ["POST", "POST", "PATCH"]
+    assert github.archivos()["data/a.json"] == "[1, 2]"
+    assert github.archivos()["data/b.bin"]
+
+
+def test_sin_cambios_no_llama_a_la_api(github):
+    cliente = _cliente(github)
+    cliente.commit_archivos({"data/a.json": "[1]"}, "sync")
+    github.llamadas.clear()
+    assert cliente.commit_archivos({"data/a.json": "[1]"}, "sync") is None
+    assert github.llamadas == []
+
+
+def test_422_relee_la_cabeza_y_reintenta(github):
+    cliente = _cliente(github)
+    cliente.commit_archivos({"data/a.json": "[1]"}, "sync")
+    github.rechazos_patch = 1
+    github.llamadas.clear()
+
+    sha = cliente.commit_archivos({"data/a.json": "[1, 2]"}, "sync")
+
+    assert github.head == sha
+    # Primer intento rechazado, luego GET de la rama y su commit y un segundo intento
+    assert [m for m, _ in github.llamadas] == ["POST", "POST", "PATCH", "GET", "GET", "POST", "POST", "PATCH"]
+    padre = github.commits[sha]["parents"][0]
+    assert github.commits[padre]["parents"]    # el commit ajeno quedó en la historia
+
+
+def test_422_repetido_se_propaga(github):
+    cliente = _cliente(github)
+    github.rechazos_patch = 2
+    with pytest.raises(ErrorGitHub) as error:
+        cliente.commit_archivos({"data/a.json": "[1]"}, "sync")
+    assert error.value.status_code == 422
+
+
+def _esperar(condicion, segundos=5):
+    limite = time.time() + segundos
+    while time.time() < limite:
+        if condicion():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_outbox_sobrevive_a_un_reinicio(tmp_path):
+    outbox = tmp_path / "sync_outbox.jsonl"
+    # Primera ejecución: los cambios se registran pero el proceso termina antes de sincronizar
+    cola = ColaSincronizacion(lambda: False, outbox_file=outbox, ventana=3600, quietud=3600)
+    cola.registrar('entradas', 'insert', 1)
+    cola.registrar('salidas', 'delete', 7)
+    assert cola.estado()['pendientes'] == 2
+
+    # Reinicio: la nueva cola encuentra el outbox y sincroniza sin esperar la ventana
+    llamadas = []
+    nueva = ColaSincronizacion(lambda: llamadas.append(1) or True, outbox_file=outbox, ventana=3600, quietud=3600)
+    assert _esperar(lambda: nueva.estado()['total_sincronizaciones'] == 1)
+    assert llamadas == [1]
+    assert nueva.estado()['pendientes'] == 0
+    assert outbox.read_text(encoding='utf-8') == ""
+
+
+def test_fallo_conserva_el_outbox_y_programa_reintento(tmp_path):
+    outbox = tmp_path / "sync_outbox.jsonl"
+    cola = ColaSincronizacion(lambda: False, outbox_file=outbox, ventana=0, quietud=0)
+    cola.registrar('entradas', 'insert', 1)
+    assert _esperar(lambda: cola.estado()['intentos'] == 1)
+    estado = cola.estado()
+    assert estado['pendientes'] == 1
+    assert estado['proximo_intento'] is not None
+    assert len(outbox.read_text(encoding='utf-8').splitlines()) == 1